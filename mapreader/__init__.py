@@ -17,6 +17,7 @@ from mapreader.classify.load_annotations import AnnotationsLoader
 from mapreader.classify.datasets import PatchDataset
 from mapreader.classify.datasets import PatchContextDataset
 from mapreader.classify.classifier import ClassifierContainer
+from mapreader.classify.neighbours import NearestNeighbourIndex
 from mapreader.classify import custom_models
 
 # spot_text
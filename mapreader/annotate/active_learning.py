@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+_METHODS = ["entropy", "margin", "least_confidence"]
+
+
+def uncertainty_scores(probs, method: str = "entropy") -> np.ndarray:
+    """
+    Score how uncertain a classifier is about each patch.
+
+    Parameters
+    ----------
+    probs : array-like
+        The predicted probabilities, of shape ``(n_patches, n_labels)``.
+    method : str, optional
+        How to score uncertainty. Options are:
+
+        - ``"entropy"``: the entropy of the predicted probabilities.
+        - ``"margin"``: one minus the difference between the two highest
+          probabilities.
+        - ``"least_confidence"``: one minus the highest probability.
+
+        By default ``"entropy"``.
+
+    Returns
+    -------
+    numpy.ndarray
+        The uncertainty of each patch (higher is more uncertain).
+
+    Raises
+    ------
+    ValueError
+        If ``method`` is not one of the options above or ``probs`` is not
+        two-dimensional.
+    """
+    if method not in _METHODS:
+        raise ValueError(f"[ERROR] ``method`` must be one of {_METHODS}.")
+    probs = np.asarray(probs, dtype=np.float64)
+    if probs.ndim != 2:
+        raise ValueError("[ERROR] ``probs`` must be of shape (n_patches, n_labels).")
+
+    if method == "entropy":
+        with np.errstate(divide="ignore", invalid="ignore"):
+            logs = np.where(probs > 0, np.log(probs), 0.0)
+        return -(probs * logs).sum(axis=1)
+    if method == "margin":
+        if probs.shape[1] < 2:
+            return np.zeros(len(probs))
+        top2 = np.partition(probs, -2, axis=1)[:, -2:]
+        return 1.0 - (top2[:, 1] - top2[:, 0])
+    return 1.0 - probs.max(axis=1)
+
+
+def diverse_order(embeddings, n_select: int) -> np.ndarray:
+    """
+    Choose a diverse subset of patches by greedy k-center selection on their
+    embeddings (cosine distance).
+
+    The first patch is always chosen first, so pass embeddings sorted by
+    uncertainty to start from the most uncertain patch. Each following patch
+    is the one furthest from all patches chosen so far.
+
+    Parameters
+    ----------
+    embeddings : array-like
+        The embeddings, of shape ``(n_patches, dim)``.
+    n_select : int
+        The number of patches to choose.
+
+    Returns
+    -------
+    numpy.ndarray
+        The positions of all patches: the ``n_select`` chosen patches (in
+        the order they were chosen) followed by the rest (in their original
+        order).
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    n = len(embeddings)
+    n_select = min(n_select, n)
+    if n_select <= 1:
+        return np.arange(n)
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = embeddings / np.maximum(norms, 1e-12)
+
+    chosen = np.zeros(n, dtype=bool)
+    order = [0]
+    chosen[0] = True
+    min_dist = 1.0 - embeddings @ embeddings[0]
+    for _ in range(n_select - 1):
+        min_dist[chosen] = -np.inf
+        nxt = int(np.argmax(min_dist))
+        order.append(nxt)
+        chosen[nxt] = True
+        min_dist = np.minimum(min_dist, 1.0 - embeddings @ embeddings[nxt])
+
+    return np.concatenate([order, np.flatnonzero(~chosen)])
+
+
+def predict_unlabelled(
+    classifier,
+    patch_df: pd.DataFrame,
+    patch_paths_col: str = "image_path",
+    batch_size: int = 64,
+    num_workers: int = 0,
+    set_name: str = "active_learning",
+    transform=None,
+) -> pd.DataFrame:
+    """
+    Predict the label probabilities of a set of patches with a classifier.
+
+    Parameters
+    ----------
+    classifier : ClassifierContainer
+        The classifier to use.
+    patch_df : pandas.DataFrame
+        The patches to predict (e.g. the unlabelled patches).
+    patch_paths_col : str, optional
+        The name of the column containing the patch image paths, by default
+        ``"image_path"``.
+    batch_size : int, optional
+        The batch size, by default ``64``.
+    num_workers : int, optional
+        The number of DataLoader workers, by default ``0``.
+    set_name : str, optional
+        The name under which the (temporary) dataset is added to the
+        classifier's ``dataloaders``, by default ``"active_learning"``.
+    transform : str, callable or None, optional
+        The transform to use on the patches (see ``PatchDataset``). If
+        ``None``, uses the transform of the classifier's ``"val"`` (or
+        ``"test"``) dataset, or the default ``"val"`` transform if it has
+        neither. By default ``None``.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The predicted probabilities, indexed like ``patch_df``, with one
+        column per label index.
+    """
+    from ..classify.datasets import PatchDataset
+
+    if not len(patch_df):
+        return pd.DataFrame(index=patch_df.index, dtype=float)
+
+    if transform is None:
+        transform = _classifier_transform(classifier)
+    dataset = PatchDataset(
+        patch_df[[patch_paths_col]],
+        transform=transform,
+        patch_paths_col=patch_paths_col,
+    )
+    classifier.load_dataset(
+        dataset, set_name, batch_size=batch_size, num_workers=num_workers
+    )
+    try:
+        classifier.inference(set_name)
+    finally:
+        del classifier.dataloaders[set_name]
+    return pd.DataFrame(np.array(classifier.pred_conf), index=patch_df.index)
+
+
+def _classifier_transform(classifier):
+    """
+    Get the transform of a classifier's validation (or test) dataset, or
+    ``"val"`` (the default transform) if it has neither.
+    """
+    dataloaders = getattr(classifier, "dataloaders", None) or {}
+    for set_name in ["val", "test"]:
+        if set_name not in dataloaders:
+            continue
+        dataset = dataloaders[set_name].dataset
+        transform = getattr(dataset, "transform", None)
+        # fused transforms also need the dataset's batch transform
+        if transform is not None and not getattr(dataset, "fused_transform", False):
+            return transform
+    return "val"
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import copy
 import functools
 import hashlib
 import json
@@ -9,6 +10,8 @@ import random
 import re
 import string
 import warnings
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from itertools import product
 from pathlib import Path
 
@@ -17,15 +20,30 @@ import ipywidgets as widgets
 import numpy as np
 import pandas as pd
 from IPython.display import clear_output, display
-from numpy import array_split
 from PIL import Image, ImageOps
 
-from mapreader.utils.load_frames import load_from_csv, load_from_geojson
+from mapreader.utils.load_frames import (
+    get_load_function,
+    load_from_csv,
+    load_from_feather,
+    load_from_geojson,
+    load_from_parquet,
+    save_to_feather,
+    save_to_parquet,
+)
 
 from ..load.loader import load_patches
+from ..utils.thumbnails import get_thumbnail_cache
+from .active_learning import diverse_order, predict_unlabelled, uncertainty_scores
+from .journal import AnnotationJournal
+from .server import AnnotationServer
+from .store import AnnotationStore
 
 warnings.filterwarnings("ignore", category=UserWarning)
 
+# annotations file format -> file extension
+_ANNOTATIONS_FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
 _CENTER_LAYOUT = widgets.Layout(
     display="flex", flex_flow="column", align_items="center"
 )
@@ -62,7 +80,10 @@ class Annotator:
     border : bool, optional
         Whether to add a border around the central patch when showing context, by default False
     auto_save : bool, optional
-        Whether to automatically save annotations, by default True
+        Whether to automatically save annotations, by default True.
+        Each annotation is appended to a journal file (see ``journal_file``)
+        and the journal is compacted into the annotations file when all
+        patches are annotated or when ``save_annotations`` is called.
     delimiter : str, optional
         Delimiter used in CSV files, by default ","
     sortby : str or None, optional
@@ -87,6 +108,16 @@ class Annotator:
         The size in pixels for the longest side to which constrain each patch image, by default 1000.
     resize_to : int or None, optional
         The size in pixels for the longest side to which resize each patch image, by default None.
+    prefetch : int, optional
+        The number of upcoming patches in the queue for which to build
+        context images in background threads (when ``show_context`` is
+        True), by default 4. Set to 0 to disable prefetching.
+    annotations_format : str, optional
+        The format of the annotations file: ``"csv"``, ``"parquet"`` or
+        ``"arrow"`` (Arrow IPC/feather), by default ``"csv"``. Parquet and
+        Arrow files store labels as categories and pixel bounds as integer
+        lists, so they load much faster than CSV files. They need
+        ``pyarrow`` to be installed.
 
     Raises
     ------
@@ -127,7 +158,13 @@ class Annotator:
         surrounding: int = 1,
         max_size: int = 1000,
         resize_to: int | None = None,
+        prefetch: int = 4,
+        annotations_format: str = "csv",
     ):
+        if annotations_format not in _ANNOTATIONS_FORMATS:
+            raise ValueError(
+                f"[ERROR] ``annotations_format`` must be one of {list(_ANNOTATIONS_FORMATS)}."
+            )
         if labels is None:
             labels = []
         if patch_df is not None:
@@ -139,6 +176,10 @@ class Annotator:
                     )
                 elif re.search(r"\..*?json$", str(patch_df)):
                     patch_df = load_from_geojson(patch_df)
+                elif re.search(r"\.(geo)?parquet$", str(patch_df)):
+                    patch_df = load_from_parquet(patch_df)
+                elif re.search(r"\.(arrow|feather|ipc)$", str(patch_df)):
+                    patch_df = load_from_feather(patch_df)
                 else:
                     raise ValueError(
                         "[ERROR] ``patch_df`` must be a path to a CSV/TSV/etc or geojson file or a pandas DataFrame or a geopandas GeoDataFrame."
@@ -157,6 +198,10 @@ class Annotator:
                     )
                 elif re.search(r"\..*?json$", str(parent_df)):
                     parent_df = load_from_geojson(parent_df)
+                elif re.search(r"\.(geo)?parquet$", str(parent_df)):
+                    parent_df = load_from_parquet(parent_df)
+                elif re.search(r"\.(arrow|feather|ipc)$", str(parent_df)):
+                    parent_df = load_from_feather(parent_df)
                 else:
                     raise ValueError(
                         "[ERROR] ``parent_df`` must be a path to a CSV/TSV/etc or geojson file or a pandas DataFrame or a geopandas GeoDataFrame."
@@ -217,8 +262,16 @@ class Annotator:
             task_name = "task"
         id = hashlib.md5(image_list.encode("utf-8")).hexdigest()
 
-        annotations_file = task_name.replace(" ", "_") + f"_#{username}#-{id}.csv"
+        annotations_file = (
+            task_name.replace(" ", "_")
+            + f"_#{username}#-{id}"
+            + _ANNOTATIONS_FORMATS[annotations_format]
+        )
         annotations_file = os.path.join(annotations_dir, annotations_file)
+        journal_file = os.path.splitext(annotations_file)[0] + "_journal.jsonl"
+        store_file = os.path.join(
+            annotations_dir, task_name.replace(" ", "_") + f"-{id}.sqlite"
+        )
 
         # Ensure labels are of type list
         if not isinstance(labels, list):
@@ -227,8 +280,8 @@ class Annotator:
         # Ensure unique values in list
         labels = sorted(set(labels), key=labels.index)
 
-        # Test for existing patch annotation file
-        if os.path.exists(annotations_file):
+        # Test for existing patch annotation file (or journal)
+        if os.path.exists(annotations_file) or os.path.exists(journal_file):
             print("[INFO] Loading existing patch annotations.")
             patch_df = self._load_annotations(
                 patch_df=patch_df,
@@ -236,6 +289,7 @@ class Annotator:
                 labels=labels,
                 label_col=label_col,
                 delimiter=delimiter,
+                journal_file=journal_file,
             )
 
         ## pixel_bounds = x0, y0, x1, y1
@@ -265,6 +319,10 @@ class Annotator:
         self.label_col = label_col
         self.patch_paths_col = patch_paths_col
         self.annotations_file = annotations_file
+        self.annotations_format = annotations_format
+        self.journal_file = journal_file
+        self.store_file = store_file
+        self._journal = AnnotationJournal(journal_file)
         self.show_context = show_context
         self.border = border
         self.auto_save = auto_save
@@ -284,6 +342,20 @@ class Annotator:
         self.max_size = max_size
         self.resize_to = resize_to
 
+        # Set up neighbour lookup and prefetching for context display
+        self.prefetch = prefetch
+        self._context_index = None
+        self._context_futures = OrderedDict()
+        self._executor = None
+
+        # Set up active learning (see ``set_active_learning``)
+        self._active_learning = None
+        self._uncertainty = None
+        self._refresh_future = None
+        self._refresh_executor = None
+        self._refresh_classifier = None
+        self._labels_since_refresh = 0
+
         # set up buttons
         self._buttons = []
 
@@ -369,9 +441,13 @@ class Annotator:
         labels: list,
         label_col: str,
         delimiter: str,
+        journal_file: str | None = None,
     ):
         """Load existing annotations from file.
 
+        Annotations in the journal file (if any) are replayed on top of
+        those in the annotations file.
+
         Parameters
         ----------
         patch_df : pd.DataFrame or gpd.GeoDataFrame
@@ -384,11 +460,39 @@ class Annotator:
             Name of the column in which labels are stored in annotations file
         delimiter : str
             Delimiter used in CSV files
+        journal_file : str or None, optional
+            Name of the journal file, by default None
 
         """
-        existing_annotations = load_from_csv(
-            annotations_file, index_col=0, sep=delimiter
-        )
+        if os.path.exists(annotations_file):
+            patch_df = Annotator._load_annotations_file(
+                patch_df, annotations_file, labels, label_col, delimiter
+            )
+
+        if journal_file is not None:
+            journal_labels = AnnotationJournal(journal_file).replay()
+            journal_labels = journal_labels[journal_labels.index.isin(patch_df.index)]
+            if len(journal_labels):
+                patch_df[label_col] = patch_df[label_col].astype(object)
+                patch_df.loc[journal_labels.index, label_col] = journal_labels
+
+        return patch_df
+
+    @staticmethod
+    def _load_annotations_file(
+        patch_df: pd.DataFrame | gpd.GeoDataFrame,
+        annotations_file: str,
+        labels: list,
+        label_col: str,
+        delimiter: str,
+    ):
+        """Load existing annotations from the annotations (CSV/Parquet/Arrow) file."""
+        if annotations_file.endswith(".csv"):
+            existing_annotations = load_from_csv(
+                annotations_file, index_col=0, sep=delimiter
+            )
+        else:
+            existing_annotations = get_load_function(annotations_file)(annotations_file)
 
         if label_col not in existing_annotations.columns:
             raise ValueError(
@@ -475,108 +579,422 @@ class Annotator:
         List[int] or pandas.Index or pandas.Series
             Depending on "as_type", returns either a list of indices, a
             pd.Index object, or a pd.Series of legible rows.
-        """
-
-        def check_eligibility(row):
-            if row.label not in [np.NaN, None]:
-                return False
-
-            if self._filter_for is None:
-                test = [
-                    row[col] >= min_value for col, min_value in self._min_values.items()
-                ] + [
-                    row[col] <= max_value for col, max_value in self._max_values.items()
-                ]
-            else:
-                test = (
-                    [
-                        row[col] >= min_value
-                        for col, min_value in self._min_values.items()
-                    ]
-                    + [
-                        row[col] <= max_value
-                        for col, max_value in self._max_values.items()
-                    ]
-                    + [
-                        row[col] == filter_for
-                        for col, filter_for in self._filter_for.items()
-                    ]
-                )
 
-            if not all(test):
-                return False
+        Notes
+        -----
+        Eligibility (unlabelled and within ``min_values``, ``max_values`` and
+        ``filter_for``) is computed as a vectorised boolean mask and only the
+        positions of eligible rows are sorted or shuffled, so the patch
+        DataFrame is not copied.
+
+        If active learning is set up (see ``set_active_learning``), eligible
+        rows are then ordered by the classifier's uncertainty, most uncertain
+        first.
+        """
 
-            return True
+        patch_df = self.patch_df
 
-        queue_df = self.patch_df.copy(deep=True)
-        queue_df = queue_df[queue_df[self.label_col].isna()]  # only unlabelled
-        queue_df["eligible"] = queue_df.apply(check_eligibility, axis=1)
+        # boolean mask of eligible rows, built column by column
+        eligible = patch_df[self.label_col].isna().to_numpy()  # only unlabelled
+        for col, min_value in self._min_values.items():
+            eligible &= (patch_df[col] >= min_value).to_numpy()
+        for col, max_value in self._max_values.items():
+            eligible &= (patch_df[col] <= max_value).to_numpy()
+        for col, filter_for in (self._filter_for or {}).items():
+            eligible &= (patch_df[col] == filter_for).to_numpy()
 
+        positions = np.flatnonzero(eligible)
         if self._sortby is not None:
-            queue_df.sort_values(self._sortby, ascending=self._ascending, inplace=True)
-            queue_df = queue_df[queue_df.eligible]
+            sort_values = pd.Series(patch_df[self._sortby].to_numpy()[positions])
+            order = sort_values.sort_values(
+                ascending=self._ascending, kind="stable"
+            ).index.to_numpy()
+            positions = positions[order]
         else:
-            queue_df = queue_df[queue_df.eligible].sample(frac=1)  # shuffle
+            positions = np.random.permutation(positions)  # shuffle
+
+        if self._uncertainty is not None:
+            positions = self._order_by_uncertainty(positions)
 
-        indices = queue_df.index
+        indices = patch_df.index[positions]
         if as_type == "list":
             return list(indices)
         if as_type == "index":
             return indices
-        return queue_df
+        return patch_df.iloc[positions]
+
+    def set_active_learning(
+        self,
+        classifier=None,
+        predictions: pd.DataFrame | None = None,
+        method: str = "entropy",
+        embeddings=None,
+        diversity: int | None = None,
+        pool_size: int | None = None,
+        refresh_every: int | None = None,
+        retrain_fn=None,
+        batch_size: int = 64,
+        num_workers: int = 0,
+        transform=None,
+    ) -> None:
+        """
+        Order the annotation queue by how uncertain a classifier is about
+        each patch, so the most informative patches are annotated first.
+
+        Parameters
+        ----------
+        classifier : ClassifierContainer or None, optional
+            A classifier used to predict the unlabelled patches (and to
+            refresh predictions, see ``refresh_every``). By default ``None``.
+        predictions : pandas.DataFrame or None, optional
+            Pre-computed predicted probabilities, indexed like the patch
+            DataFrame, with one column per label. If ``None``, predictions
+            are computed with ``classifier``. By default ``None``.
+        method : str, optional
+            How to score uncertainty: ``"entropy"``, ``"margin"`` or
+            ``"least_confidence"`` (see
+            :func:`~.annotate.active_learning.uncertainty_scores`). By default
+            ``"entropy"``.
+        embeddings : pandas.DataFrame, FeatureCache or None, optional
+            Patch embeddings (e.g. from ``ClassifierContainer.embed_patches``)
+            used to pick a diverse set of uncertain patches. By default
+            ``None``.
+        diversity : int or None, optional
+            The number of patches at the front of the queue to pick for
+            diversity (from the ``pool_size`` most uncertain patches). If
+            ``None``, the queue is ordered by uncertainty alone. By default
+            ``None``.
+        pool_size : int or None, optional
+            The number of most uncertain patches to pick diverse patches
+            from. If ``None``, uses ``10 * diversity``. By default ``None``.
+        refresh_every : int or None, optional
+            If set, predictions for the remaining unlabelled patches are
+            refreshed in a background thread after every ``refresh_every``
+            new annotations, and the rest of the queue is re-ordered. Requires
+            ``classifier``. By default ``None``.
+        retrain_fn : callable or None, optional
+            A function called (in the background thread) before predictions
+            are refreshed, e.g. to fine-tune the classifier. It is called with
+            the background copy of ``classifier`` and a copy of the labelled
+            data (see ``get_labelled_data``). By default ``None``.
+        batch_size : int, optional
+            The batch size used for predictions, by default ``64``.
+        num_workers : int, optional
+            The number of DataLoader workers used for predictions, by default
+            ``0``.
+        transform : str, callable or None, optional
+            The transform used on patches for predictions (see
+            ``PatchDataset``). If ``None``, uses the transform of
+            ``classifier``'s ``"val"`` dataset (see
+            :func:`~.annotate.active_learning.predict_unlabelled`). By default
+            ``None``.
+
+        Raises
+        ------
+        ValueError
+            If neither ``classifier`` nor ``predictions`` is provided, or if
+            ``refresh_every`` is set without a ``classifier``.
+
+        Notes
+        -----
+        Call ``annotate`` afterwards to rebuild the queue. Patches without
+        predictions are queued after all patches with predictions.
+
+        Refreshes use a copy of ``classifier`` (made at the first refresh and
+        kept between refreshes), so ``classifier`` itself is never used or
+        changed by the background thread and you can keep using it while
+        annotating.
+        """
+        if classifier is None and predictions is None:
+            raise ValueError(
+                "[ERROR] Please provide a ``classifier`` or ``predictions``."
+            )
+        if refresh_every is not None and classifier is None:
+            raise ValueError("[ERROR] ``refresh_every`` requires a ``classifier``.")
+
+        self._refresh_future = None  # ignore refreshes with the old settings
+        self._refresh_classifier = None
+        self._active_learning = {
+            "classifier": classifier,
+            "method": method,
+            "embeddings": embeddings,
+            "diversity": diversity,
+            "pool_size": pool_size or 10 * (diversity or 0),
+            "refresh_every": refresh_every,
+            "retrain_fn": retrain_fn,
+            "batch_size": batch_size,
+            "num_workers": num_workers,
+            "transform": transform,
+        }
+        if predictions is None:
+            predictions = predict_unlabelled(
+                classifier,
+                self.patch_df[self.patch_df[self.label_col].isna()],
+                patch_paths_col=self.patch_paths_col,
+                batch_size=batch_size,
+                num_workers=num_workers,
+                transform=transform,
+            )
+        self._set_predictions(predictions)
+        self._labels_since_refresh = 0
+
+    def _set_predictions(self, predictions: pd.DataFrame) -> None:
+        """Score the uncertainty of each patch from its predictions."""
+        self._uncertainty = pd.Series(
+            uncertainty_scores(predictions, method=self._active_learning["method"]),
+            index=predictions.index,
+        )
+
+    def _order_by_uncertainty(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Order positions in the patch DataFrame by uncertainty (most uncertain
+        first), then pick a diverse set of uncertain patches for the front of
+        the queue if ``diversity`` is set.
+        """
+        scores = (
+            self._uncertainty.reindex(self.patch_df.index[positions])
+            .fillna(-np.inf)
+            .to_numpy()
+        )
+        positions = positions[np.argsort(-scores, kind="stable")]
+
+        diversity = self._active_learning["diversity"]
+        embeddings = self._active_learning["embeddings"]
+        if not diversity or embeddings is None:
+            return positions
+
+        pool = positions[: self._active_learning["pool_size"]]
+        ids = self.patch_df.index[pool]
+        if isinstance(embeddings, pd.DataFrame):
+            has_embedding = ids.isin(embeddings.index)
+            vectors = embeddings.loc[ids[has_embedding]].to_numpy()
+        else:
+            has_embedding = np.array([i in embeddings for i in ids], dtype=bool)
+            vectors = embeddings.get(ids[has_embedding])
+
+        chosen = pool[has_embedding][diverse_order(vectors, diversity)[:diversity]]
+        return np.concatenate([chosen, positions[~np.isin(positions, chosen)]])
+
+    def _refresh_predictions(
+        self,
+        settings: dict,
+        classifier,
+        labelled: pd.DataFrame,
+        unlabelled: pd.DataFrame,
+    ) -> pd.DataFrame:
+        """
+        Re-train (optionally) and re-predict, in a background thread.
+
+        Only the copies of the settings, classifier and data passed in are
+        used, as the annotator (and the original classifier) may be changed
+        in the meantime.
+        """
+        if settings["retrain_fn"] is not None:
+            settings["retrain_fn"](classifier, labelled)
+        return predict_unlabelled(
+            classifier,
+            unlabelled,
+            patch_paths_col=self.patch_paths_col,
+            batch_size=settings["batch_size"],
+            num_workers=settings["num_workers"],
+            transform=settings["transform"],
+        )
+
+    def _maybe_refresh(self) -> None:
+        """
+        Starts refreshing predictions in the background once
+        ``refresh_every`` new annotations have been made.
+        """
+        settings = self._active_learning
+        if settings is None or not settings["refresh_every"]:
+            return
+        self._labels_since_refresh += 1
+        if self._labels_since_refresh < settings["refresh_every"]:
+            return
+        if self._refresh_future is not None and not self._refresh_future.done():
+            return  # wait for the current refresh to finish
+
+        self._labels_since_refresh = 0
+        if self._refresh_executor is None:
+            self._refresh_executor = ThreadPoolExecutor(max_workers=1)
+        if self._refresh_classifier is None:
+            self._refresh_classifier = copy.deepcopy(settings["classifier"])
+        labelled = self.get_labelled_data() if settings["retrain_fn"] else None
+        unlabelled = self.patch_df.loc[
+            self.patch_df[self.label_col].isna(), [self.patch_paths_col]
+        ].copy()
+        self._refresh_future = self._refresh_executor.submit(
+            self._refresh_predictions,
+            settings.copy(),
+            self._refresh_classifier,
+            labelled,
+            unlabelled,
+        )
+
+    def _apply_refresh(self) -> None:
+        """
+        Re-orders the rest of the queue (after the current patch) once
+        refreshed predictions are ready.
+        """
+        if self._refresh_future is None or not self._refresh_future.done():
+            return
+        future, self._refresh_future = self._refresh_future, None
+        try:
+            predictions = future.result()
+        except Exception as err:
+            print(f"[WARNING] Could not refresh predictions: {err}")
+            return
+
+        self._set_predictions(predictions)
+        seen = self._queue[: self.current_index + 1]
+        remaining = self._get_queue(as_type="index")
+        self._queue = seen.append(remaining[~remaining.isin(seen)])
 
     def _get_context(self):
         """
         Provides the surrounding context for the patch to be annotated.
 
+        Context images are built in background threads for the next
+        ``prefetch`` patches in the queue (see ``_prefetch_contexts``), so
+        this usually returns an image which is already built.
+
         Returns
         -------
-        ipywidgets.VBox
-            An IPython VBox widget containing the surrounding patches for
-            context.
+        PIL.Image
+            The patch to be annotated, surrounded by its (dimmed)
+            neighbouring patches.
+        """
+        if self.surrounding > 3:
+            display(
+                widgets.HTML(
+                    """<p style="color:red;"><b>Warning: More than 3 surrounding tiles may crowd the display and not display correctly.</b></p>"""
+                )
+            )
+
+        ix = self._queue[self.current_index]
+        key = (ix,) + self._context_settings()
+        future = self._context_futures.get(key)
+        if future is None:
+            future = Future()
+            future.set_result(self._build_context(*key))
+            self._context_futures[key] = future
+        self._context_futures.move_to_end(key)
+        return future.result()
+
+    def _context_settings(self) -> tuple:
+        """The settings which affect how context images are built."""
+        return (
+            self.surrounding,
+            self.border,
+            self.resize_to,
+            self.max_size,
+        )
+
+    def _get_context_index(self) -> dict:
+        """
+        Gets (building it on first use) a dictionary mapping
+        ``(parent_id, min_x, min_y)`` to the index of each patch, for
+        finding neighbouring patches. Ambiguous positions (i.e. shared by
+        more than one patch) are left out.
+
+        Returns
+        -------
+        dict
+            The neighbour lookup dictionary.
+        """
+        if self._context_index is None:
+            keys = pd.MultiIndex.from_arrays(
+                [
+                    self.patch_df["parent_id"],
+                    self.patch_df["min_x"],
+                    self.patch_df["min_y"],
+                ]
+            )
+            unique = ~keys.duplicated(keep=False)
+            self._context_index = dict(zip(keys[unique], self.patch_df.index[unique]))
+        return self._context_index
+
+    def _prefetch_contexts(self) -> None:
+        """
+        Starts building the context images for the next ``prefetch`` patches
+        in the queue in background threads.
+        """
+        if not self.prefetch:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=min(self.prefetch, 4))
+
+        settings = self._context_settings()
+        stop = min(self.current_index + 1 + self.prefetch, len(self._queue))
+        for i in range(self.current_index + 1, stop):
+            key = (self._queue[i],) + settings
+            if key not in self._context_futures:
+                self._context_futures[key] = self._executor.submit(
+                    self._build_context, *key
+                )
+
+        # keep the current patch and a few previous ones for "prev"
+        while len(self._context_futures) > 2 * self.prefetch + 2:
+            _, future = self._context_futures.popitem(last=False)
+            future.cancel()
+
+    def _build_context(
+        self,
+        ix,
+        surrounding: int,
+        border: bool,
+        resize_to: int | None,
+        max_size: int,
+    ) -> Image:
+        """
+        Builds the context image for a patch.
+
+        Parameters
+        ----------
+        ix : int or str
+            The index of the patch in the patch DataFrame.
+        surrounding : int
+            The number of surrounding patches to show.
+        border : bool
+            Whether to add a border around the patch.
+        resize_to : int or None
+            The size in pixels for the longest side to which resize the
+            context image.
+        max_size : int
+            The size in pixels for the longest side to which constrain the
+            context image (if ``resize_to`` is None).
+
+        Returns
+        -------
+        PIL.Image
+            The context image.
         """
 
         def get_square(image_path, dim=True, border=False):
-            # Resize the image
-            im = Image.open(image_path)
+            if tile_size is None:
+                # full size, so decode the patch directly
+                im = Image.open(image_path)
+                im.load()
+            else:
+                # each patch appears in several context images so use the
+                # (downsized) cached thumbnail
+                im = get_thumbnail_cache().get(image_path, tile_size)
+                if im.size != (width, height):
+                    im = im.resize((width, height))
 
             # Dim the image
-            if dim in ["True", True]:
+            if dim:
                 im_array = np.array(im)
                 im_array = 256 - (256 - im_array) * 0.4  # lighten image
                 im = Image.fromarray(im_array.astype(np.uint8))
 
-            if border in ["True", True] and self.border:
+            if border:
                 w, h = im.size
                 im = ImageOps.expand(im, border=2, fill="red")
                 im = im.resize((w, h))
 
             return im
 
-        def get_empty_square(patch_size: tuple[int, int]):
-            """Generates an empty square image.
-
-            Parameters
-            ----------
-            patch_size : tuple[int, int]
-                Patch size in pixels as tuple of `(width, height)`.
-            """
-            im = Image.new(
-                size=patch_size,
-                mode="RGB",
-                color="white",
-            )
-            return im
-
-        if self.surrounding > 3:
-            display(
-                widgets.HTML(
-                    """<p style="color:red;"><b>Warning: More than 3 surrounding tiles may crowd the display and not display correctly.</b></p>"""
-                )
-            )
-
-        ix = self._queue[self.current_index]
-
         min_x = self.patch_df.at[ix, "min_x"]
         min_y = self.patch_df.at[ix, "min_y"]
 
@@ -590,67 +1008,50 @@ class Annotator:
             width = im.width
 
         current_parent = self.patch_df.at[ix, "parent_id"]
-        parent_frame = self.patch_df.query(f"parent_id=='{current_parent}'")
-
-        deltas = list(range(-self.surrounding, self.surrounding + 1))
-        y_and_x = list(
-            product(
-                [min_y + y_delta * height for y_delta in deltas],
-                [min_x + x_delta * width for x_delta in deltas],
+        context_index = self._get_context_index()
+
+        deltas = list(range(-surrounding, surrounding + 1))
+        total_width = len(deltas) * width
+        total_height = len(deltas) * height
+
+        # build the context image at its final size, if smaller
+        patch_width, patch_height = width, height
+        target_size = resize_to or min(max_size, max(total_width, total_height))
+        scale = target_size / max(total_width, total_height)
+        tile_size = None
+        if scale < 1:
+            width = max(round(patch_width * scale), 1)
+            height = max(round(patch_height * scale), 1)
+            tile_size = max(width, height)
+            total_width = len(deltas) * width
+            total_height = len(deltas) * height
+
+        context_image = Image.new("RGB", (total_width, total_height), color="white")
+
+        for (row, y_delta), (col, x_delta) in product(
+            enumerate(deltas), enumerate(deltas)
+        ):
+            neighbour = context_index.get(
+                (
+                    current_parent,
+                    min_x + x_delta * patch_width,
+                    min_y + y_delta * patch_height,
+                )
             )
-        )
-        queries = [f"min_x == {x} & min_y == {y}" for y, x in y_and_x]
-        items = [parent_frame.query(query) for query in queries]
-
-        # derive ids from items
-        ids = [x.index[0] if len(x.index) == 1 else None for x in items]
-        # list of booleans, True if not the current patch, False if the current patch
-        # used for dimming the surrounding patches and adding a border to the current patch
-        dim_bools = [x != ix for x in ids]
-        border_bools = [x == ix for x in ids]
-
-        # derive images from items
-        image_paths = [
-            x.at[x.index[0], "image_path"] if len(x.index) == 1 else None for x in items
-        ]
-
-        # zip them
-        image_list = list(zip(image_paths, dim_bools, border_bools))
-
-        # split them into rows
-        per_row = len(deltas)
-        images = [
-            [
-                get_square(image_path, dim=dim, border=border)
-                if image_path
-                else get_empty_square((width, height))
-                for image_path, dim, border in lst
-            ]
-            for lst in array_split(image_list, per_row)
-        ]
-
-        total_width = (2 * self.surrounding + 1) * width
-        total_height = (2 * self.surrounding + 1) * height
-
-        context_image = Image.new("RGB", (total_width, total_height))
-
-        y_offset = 0
-        for row in images:
-            x_offset = 0
-            for image in row:
-                context_image.paste(image, (x_offset, y_offset))
-                x_offset += width
-            y_offset += height
-
-        if self.resize_to is not None:
-            context_image = ImageOps.contain(
-                context_image, (self.resize_to, self.resize_to)
+            if neighbour is None:
+                continue  # leave empty (white) square
+            image_path = self.patch_df.at[neighbour, self.patch_paths_col]
+            is_current = neighbour == ix
+            square = get_square(
+                image_path, dim=not is_current, border=is_current and border
             )
+            context_image.paste(square, (col * width, row * height))
+
+        if resize_to is not None:
+            context_image = ImageOps.contain(context_image, (resize_to, resize_to))
         # only constrain to max size if not resize_to
-        elif max(context_image.size) > self.max_size:
-            context_image = ImageOps.contain(
-                context_image, (self.max_size, self.max_size)
-            )
+        elif max(context_image.size) > max_size:
+            context_image = ImageOps.contain(context_image, (max_size, max_size))
 
         return context_image
 
@@ -723,7 +1124,7 @@ class Annotator:
         self.show_vals = show_vals
 
         # re-set up queue using new min/max values
-        self._queue = self._get_queue()
+        self._queue = self._get_queue(as_type="index")
 
         self._annotate(
             show_context=show_context,
@@ -772,7 +1173,7 @@ class Annotator:
             self.max_size = max_size
 
         # re-set up queue
-        self._queue = self._get_queue()
+        self._queue = self._get_queue(as_type="index")
 
         if self._filter_for is not None:
             print(f"[INFO] Filtering for: {self._filter_for}")
@@ -799,6 +1200,8 @@ class Annotator:
             self._render_complete()
             return
 
+        self._apply_refresh()
+
         self.previous_index = self.current_index
         self.current_index += 1
 
@@ -868,12 +1271,12 @@ class Annotator:
         # display new example
         with self.out:
             clear_output(wait=True)
-            image = self.get_patch_image(ix)
             if self.show_context:
                 context = self._get_context()
                 self._context_image = context
                 display(context.convert("RGB"))
             else:
+                image = self.get_patch_image(ix)
                 display(image.convert("RGB"))
             add_ins = []
             if "url" in self.patch_df.loc[ix].keys():
@@ -917,6 +1320,9 @@ class Annotator:
                 )
             )
 
+        if self.show_context:
+            self._prefetch_contexts()
+
     def get_patch_image(self, ix) -> Image:
         """
         Returns the image at the given index.
@@ -932,15 +1338,12 @@ class Annotator:
             A PIL.Image object of the image at the given index.
         """
         image_path = self.patch_df.at[ix, self.patch_paths_col]
-        image = Image.open(image_path)
+        thumbnails = get_thumbnail_cache()
 
         if self.resize_to is not None:
-            image = ImageOps.contain(image, (self.resize_to, self.resize_to))
+            return thumbnails.get(image_path, self.resize_to, upscale=True)
         # only constrain to max size if not resize_to
-        elif max(image.size) > self.max_size:
-            image = ImageOps.contain(image, (self.max_size, self.max_size))
-
-        return image
+        return thumbnails.get(image_path, self.max_size)
 
     def _add_annotation(self, annotation: str) -> None:
         """
@@ -959,18 +1362,190 @@ class Annotator:
         ix = self._queue[self.current_index]
         self.patch_df.at[ix, self.label_col] = annotation
         if self.auto_save:
-            self._auto_save()
+            self._journal.append(self._get_patch_id(ix), annotation)
+        self._maybe_refresh()
         self._next_example()
 
+    def _get_patch_id(self, ix):
+        """
+        Get the ID used for a patch in the annotations file (i.e. its
+        "image_id" if the patch DataFrame is not indexed by it).
+        """
+        if ("image_id" in self.patch_df.columns) and (
+            self.patch_df.index.name != "image_id"
+        ):
+            return self.patch_df.at[ix, "image_id"]
+        return ix
+
+    def save_annotations(self) -> None:
+        """
+        Saves the annotations made so far to the annotations file and clears
+        the journal.
+
+        Returns
+        -------
+        None
+        """
+        tmp_file = f"{self.annotations_file}.tmp"
+        labelled_data = self.get_labelled_data(sort=True)
+        if self.annotations_format == "parquet":
+            save_to_parquet(labelled_data, tmp_file, categorical=[self.label_col])
+        elif self.annotations_format == "arrow":
+            save_to_feather(labelled_data, tmp_file, categorical=[self.label_col])
+        else:
+            labelled_data.to_csv(tmp_file)
+        os.replace(tmp_file, self.annotations_file)
+        self._journal.clear()
+
     def _auto_save(self):
         """
-        Automatically saves the annotations made so far.
+        Automatically saves the annotations made so far, compacting the
+        journal into the annotations file.
+
+        Returns
+        -------
+        None
+        """
+        self.save_annotations()
+
+    def close(self) -> None:
+        """
+        Stops the background threads used for prefetching context images
+        and refreshing predictions, and closes the journal file. They are
+        restarted if you continue annotating.
 
         Returns
         -------
         None
         """
-        self.get_labelled_data(sort=True).to_csv(self.annotations_file)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._context_futures.clear()
+        if self._refresh_executor is not None:
+            self._refresh_executor.shutdown(wait=False, cancel_futures=True)
+            self._refresh_executor = None
+        self._refresh_future = None
+        self._journal.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except AttributeError:
+            pass  # not fully initialised
+
+    def serve(
+        self,
+        store: AnnotationStore | str | None = None,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        batch_size: int = 10,
+        lease_seconds: float = 600,
+        block: bool = False,
+    ) -> AnnotationServer:
+        """
+        Serve the patches in the annotation queue to several annotators at
+        once, from a web browser.
+
+        The queue (see ``annotate``) and any existing labels are added to a
+        shared SQLite store, and an ``AnnotationServer`` is started. Each
+        annotator opens ``http://<host>:<port>/?user=<name>``. Use
+        ``pull_annotations`` to copy their labels back into this annotator.
+
+        Parameters
+        ----------
+        store : AnnotationStore, str or None, optional
+            The store (or the path to its SQLite database). If ``None``, uses
+            ``store_file`` (in ``annotations_dir``, named by the task name
+            and image list, so it is shared by all usernames). By default
+            ``None``.
+        host : str, optional
+            The host to listen on, by default ``"127.0.0.1"`` (this machine
+            only). Use ``"0.0.0.0"`` to accept connections from your local
+            network.
+        port : int, optional
+            The port to listen on, by default ``8000``.
+        batch_size : int, optional
+            The number of patches leased to an annotator at a time, by
+            default ``10``.
+        lease_seconds : float, optional
+            How long (in seconds) a patch stays leased to an annotator, by
+            default ``600``.
+        block : bool, optional
+            Whether to serve in this thread until interrupted. If ``False``,
+            the server runs in a background thread. By default ``False``.
+
+        Returns
+        -------
+        AnnotationServer
+            The server. Call its ``stop`` method to stop serving.
+        """
+        if store is None:
+            store = self.store_file
+        if isinstance(store, str):
+            store = AnnotationStore(store, lease_seconds=lease_seconds)
+
+        queue = self._get_queue(as_type="index")
+        labelled = self.patch_df.index[self.patch_df[self.label_col].notna()]
+        n_added = store.add_patches(
+            self.patch_df.loc[queue.append(labelled)],
+            patch_paths_col=self.patch_paths_col,
+            label_col=self.label_col,
+        )
+        print(f"[INFO] Added {n_added} patches to {store.db_path}.")
+
+        server = AnnotationServer(
+            store,
+            labels=self._labels,
+            host=host,
+            port=port,
+            batch_size=batch_size,
+            thumbnail_size=self.resize_to or self.max_size,
+        )
+        if not block:
+            server.start()
+            return server
+
+        print(f"[INFO] Serving annotation page at {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return server
+
+    def pull_annotations(self, store: AnnotationStore | str | None = None) -> int:
+        """
+        Copy the labels saved in a shared store (see ``serve``) into this
+        annotator and, if ``auto_save`` is True, save them to the
+        annotations file.
+
+        Parameters
+        ----------
+        store : AnnotationStore, str or None, optional
+            The store (or the path to its SQLite database). If ``None``, uses
+            ``store_file``. By default ``None``.
+
+        Returns
+        -------
+        int
+            The number of patches whose labels were copied.
+        """
+        if store is None:
+            store = self.store_file
+        if isinstance(store, str):
+            store = AnnotationStore(store)
+
+        store_labels = store.get_labelled_data()["label"]
+        ids = pd.Series(self.patch_df.index, index=self.patch_df.index.astype(str))
+        store_labels = store_labels[store_labels.index.isin(ids.index)]
+        self.patch_df.loc[ids[store_labels.index], self.label_col] = (
+            store_labels.to_numpy()
+        )
+        if self.auto_save:
+            self.save_annotations()
+        return len(store_labels)
 
     def get_labelled_data(
         self,
@@ -1044,3 +1619,4 @@ class Annotator:
             self._auto_save()
         for button in self._buttons:
             button.disabled = True
+        self.close()
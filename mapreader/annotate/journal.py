@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+
+import pandas as pd
+
+
+class AnnotationJournal:
+    """
+    An append-only journal of annotation events, stored as JSON lines.
+
+    Each event records a patch ID, its new label (or ``None`` if the label
+    was removed) and a timestamp. Appending an event costs the same however
+    many patches have been annotated, unlike rewriting the whole
+    annotations file.
+
+    Parameters
+    ----------
+    path : str
+        The path to the journal file. It is created on the first call to
+        ``append``.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def append(self, patch_id, label: str | None) -> None:
+        """
+        Append a label event to the journal.
+
+        Parameters
+        ----------
+        patch_id : str or int
+            The ID of the patch.
+        label : str or None
+            The patch's new label.
+        """
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        if hasattr(patch_id, "item"):
+            patch_id = patch_id.item()  # numpy scalars
+        event = {"id": patch_id, "label": label, "time": time.time()}
+        self._file.write(json.dumps(event) + "\n")
+        self._file.flush()
+
+    def replay(self) -> pd.Series:
+        """
+        Replay the journal to get the latest label of each patch.
+
+        Returns
+        -------
+        pandas.Series
+            The latest label of each patch in the journal, indexed by patch
+            ID. A truncated last line (e.g. after a crash) is ignored.
+        """
+        labels = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    labels[event["id"]] = event["label"]
+        return pd.Series(labels, dtype=object)
+
+    def clear(self) -> None:
+        """Remove the journal file (e.g. once it has been compacted)."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self) -> None:
+        """Close the journal file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_file"] = None
+        return state
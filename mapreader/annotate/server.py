@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import json
+import mimetypes
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlparse
+
+from ..utils.thumbnails import get_thumbnail_cache
+from .store import AnnotationStore
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>MapReader annotation</title>
+<style>
+body { font-family: sans-serif; text-align: center; }
+#patch { max-width: 90vw; max-height: 70vh; image-rendering: pixelated; }
+button { margin: 4px; padding: 8px 16px; font-size: 1em; }
+</style>
+</head>
+<body>
+<p id="status"></p>
+<img id="patch" alt="">
+<div id="buttons"></div>
+<script>
+const user = new URLSearchParams(location.search).get("user")
+    || prompt("Your name:");
+const batchSize = __BATCH_SIZE__;
+let queue = [];
+
+async function api(path, body) {
+    const response = await fetch(path, {
+        method: "POST",
+        headers: {"Content-Type": "application/json"},
+        body: JSON.stringify(Object.assign({user: user}, body)),
+    });
+    return response.json();
+}
+
+async function fill() {
+    const patches = await api("/api/lease", {n: batchSize});
+    const ids = new Set(queue.map(p => p.id));
+    for (const patch of patches) {
+        if (!ids.has(patch.id)) {
+            new Image().src = patch.url;  // prefetch
+            queue.push(patch);
+        }
+    }
+}
+
+async function show() {
+    if (queue.length < batchSize / 2) await fill();
+    const progress = await (await fetch("/api/progress")).json();
+    document.getElementById("status").textContent = queue.length
+        ? `${user}: ${progress.labelled} / ${progress.total} patches labelled`
+        : "All patches have been annotated.";
+    document.getElementById("patch").src = queue.length ? queue[0].url : "";
+}
+
+async function annotate(label) {
+    if (!queue.length) return;
+    const patch = queue.shift();
+    const result = await api("/api/annotate", {annotations: [[patch.id, label]]});
+    // drop patches which were labelled by someone else after our lease expired
+    const rejected = new Set(result.rejected || []);
+    queue = queue.filter(p => !rejected.has(p.id));
+    show();
+}
+
+fetch("/api/labels").then(r => r.json()).then(labels => {
+    const div = document.getElementById("buttons");
+    labels.forEach((label, i) => {
+        const button = document.createElement("button");
+        button.textContent = `${label} (${i + 1})`;
+        button.onclick = () => annotate(label);
+        div.appendChild(button);
+    });
+    document.addEventListener("keydown", e => {
+        const i = parseInt(e.key) - 1;
+        if (i >= 0 && i < labels.length) annotate(labels[i]);
+    });
+    show();
+});
+window.addEventListener("pagehide", () => navigator.sendBeacon(
+    "/api/release", JSON.stringify({user: user})));
+</script>
+</body>
+</html>
+"""
+
+
+class AnnotationServer(ThreadingHTTPServer):
+    """
+    A small HTTP server for annotating the patches in an
+    ``AnnotationStore`` with several people at once, from a web browser.
+
+    Each user opens ``http://<host>:<port>/?user=<name>``. Patches are
+    leased to users in batches (so two users never get the same patch) and
+    the images of each batch are pre-loaded by the browser. Images are
+    served with ``ETag`` and ``Cache-Control`` headers, so they are only
+    sent once.
+
+    Parameters
+    ----------
+    store : AnnotationStore or str
+        The store (or the path to its SQLite database).
+    labels : list of str
+        The labels to choose from.
+    host : str, optional
+        The host to listen on, by default ``"127.0.0.1"`` (this machine
+        only). Use ``"0.0.0.0"`` to accept connections from your local
+        network.
+    port : int, optional
+        The port to listen on, by default ``8000``. Use ``0`` to pick a free
+        port.
+    batch_size : int, optional
+        The number of patches leased to a user at a time, by default ``10``.
+    thumbnail_size : int or None, optional
+        The size (in pixels) of the longest side of the images sent to
+        users. Images are resized using the shared ``ThumbnailCache``. If
+        ``None``, the original images are sent. By default ``None``.
+    cache_max_age : int, optional
+        How long (in seconds) browsers may cache images, by default
+        ``86400``.
+
+    Notes
+    -----
+    The server has no authentication and does not use HTTPS. Only run it on
+    a network you trust.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        store: AnnotationStore | str,
+        labels: list[str],
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        batch_size: int = 10,
+        thumbnail_size: int | None = None,
+        cache_max_age: int = 86400,
+    ):
+        if isinstance(store, str):
+            store = AnnotationStore(store)
+        if not labels:
+            raise ValueError("[ERROR] Please provide a list of labels.")
+
+        self.store = store
+        self.labels = list(labels)
+        self.batch_size = batch_size
+        self.thumbnail_size = thumbnail_size
+        self.cache_max_age = cache_max_age
+        self._thread = None
+        super().__init__((host, port), _AnnotationRequestHandler)
+
+    @property
+    def url(self) -> str:
+        """The URL of the annotation page."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> None:
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"[INFO] Serving annotation page at {self.url}")
+
+    def stop(self) -> None:
+        """Stop serving and close the server."""
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def read_image(self, image_path: str) -> tuple[bytes, str]:
+        """
+        Read an image (resized to ``thumbnail_size``, if set).
+
+        Parameters
+        ----------
+        image_path : str
+            The path to the image.
+
+        Returns
+        -------
+        tuple of bytes and str
+            The image bytes and their MIME type.
+        """
+        if self.thumbnail_size is None:
+            with open(image_path, "rb") as f:
+                data = f.read()
+            return data, mimetypes.guess_type(image_path)[0] or "image/png"
+
+        thumbnails = get_thumbnail_cache()
+        data = thumbnails.get_bytes(image_path, self.thumbnail_size)
+        return data, f"image/{thumbnails.image_format.lower()}"
+
+
+class _AnnotationRequestHandler(BaseHTTPRequestHandler):
+    server: AnnotationServer
+
+    def log_message(self, *_):
+        pass  # keep notebooks quiet
+
+    def _send(self, status: int, body: bytes, content_type: str, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, obj, status: int = 200):
+        self._send(
+            status,
+            json.dumps(obj).encode("utf-8"),
+            "application/json",
+            {"Cache-Control": "no-store"},
+        )
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/":
+            page = _PAGE.replace("__BATCH_SIZE__", str(self.server.batch_size))
+            self._send(200, page.encode("utf-8"), "text/html; charset=utf-8")
+        elif url.path == "/api/labels":
+            self._send_json(self.server.labels)
+        elif url.path == "/api/progress":
+            self._send_json(self.server.store.progress())
+        elif url.path.startswith("/images/"):
+            self._send_image(unquote(url.path[len("/images/") :]))
+        else:
+            self._send_json({"error": "Not found."}, 404)
+
+    def _send_image(self, patch_id: str):
+        image_path = self.server.store.get_image_path(patch_id)
+        if image_path is None or not os.path.exists(image_path):
+            self._send_json({"error": "Not found."}, 404)
+            return
+
+        stat = os.stat(image_path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}-{self.server.thumbnail_size}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"private, max-age={self.server.cache_max_age}",
+        }
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            return
+
+        data, content_type = self.server.read_image(image_path)
+        self._send(200, data, content_type, headers)
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            user = str(body["user"]).strip()
+            n = min(int(body.get("n", self.server.batch_size)), 1000)
+            annotations = [(str(i), label) for i, label in body.get("annotations", [])]
+        except (ValueError, KeyError, TypeError):
+            self._send_json({"error": "Invalid request."}, 400)
+            return
+        if not user:
+            self._send_json({"error": "Please provide a user name."}, 400)
+            return
+
+        path = urlparse(self.path).path
+        store = self.server.store
+        if path == "/api/lease":
+            patches = store.lease(user, n)
+            self._send_json(
+                [
+                    {"id": patch_id, "url": f"/images/{quote(patch_id, safe='')}"}
+                    for patch_id, _ in patches
+                ]
+            )
+        elif path == "/api/annotate":
+            if any(label not in self.server.labels for _, label in annotations):
+                self._send_json({"error": "Unknown label."}, 400)
+                return
+            saved = store.submit(user, annotations)
+            rejected = [i for i, _ in annotations if i not in set(saved)]
+            self._send_json({"saved": saved, "rejected": rejected})
+        elif path == "/api/release":
+            store.release(user)
+            self._send_json({})
+        else:
+            self._send_json({"error": "Not found."}, 404)
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patches (
+    id TEXT PRIMARY KEY,
+    image_path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    label TEXT,
+    annotator TEXT,
+    annotated_at REAL,
+    lease_owner TEXT,
+    lease_expires REAL
+);
+CREATE INDEX IF NOT EXISTS idx_queue ON patches (label, position);
+"""
+
+
+class AnnotationStore:
+    """
+    A shared SQLite store of patches and their labels, for annotating with
+    several people at once.
+
+    Patches are handed out with row-level leases: a leased patch is not
+    given to anyone else until it is labelled, released or its lease
+    expires. All users' labels are written to the same database, so there
+    is one set of annotations to export instead of one file per user.
+
+    Parameters
+    ----------
+    db_path : str
+        The path to the SQLite database. It is created if it does not
+        exist.
+    lease_seconds : float, optional
+        How long (in seconds) a patch stays leased to a user, by default
+        ``600``.
+
+    Notes
+    -----
+    The database uses SQLite's write-ahead log so readers do not block the
+    writer. Each thread uses its own connection. The database must be on a
+    local disk (SQLite locking is unreliable on most network file systems).
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 600):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        """Start an immediate (write-locking) transaction."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        return _Transaction(conn)
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM patches").fetchone()[0]
+
+    def add_patches(
+        self,
+        patch_df: pd.DataFrame,
+        patch_paths_col: str = "image_path",
+        label_col: str | None = "label",
+    ) -> int:
+        """
+        Add patches to the store, in the order they should be annotated.
+        Patches already in the store are left unchanged.
+
+        Parameters
+        ----------
+        patch_df : pandas.DataFrame
+            The patches, indexed by patch ID.
+        patch_paths_col : str, optional
+            The name of the column containing the patch image paths, by
+            default ``"image_path"``.
+        label_col : str or None, optional
+            The name of the column containing existing labels (if any), by
+            default ``"label"``.
+
+        Returns
+        -------
+        int
+            The number of patches added.
+        """
+        labels = (
+            patch_df[label_col]
+            if label_col is not None and label_col in patch_df.columns
+            else pd.Series(None, index=patch_df.index, dtype=object)
+        )
+        with self._transaction() as conn:
+            start = conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM patches"
+            ).fetchone()[0]
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO patches (id, image_path, position, label) VALUES (?, ?, ?, ?)",
+                zip(
+                    map(str, patch_df.index),
+                    map(str, patch_df[patch_paths_col]),
+                    range(start, start + len(patch_df)),
+                    (None if pd.isna(label) else str(label) for label in labels),
+                ),
+            )
+            return conn.total_changes - before
+
+    def lease(self, user: str, n: int = 1) -> list[tuple[str, str]]:
+        """
+        Lease the next ``n`` unlabelled patches to a user.
+
+        Patches already leased to the user (and not yet labelled) are
+        returned first, so reloading the annotation page does not skip them.
+
+        Parameters
+        ----------
+        user : str
+            The user's name.
+        n : int, optional
+            The number of patches to lease, by default ``1``.
+
+        Returns
+        -------
+        list of tuple
+            The ``(patch_id, image_path)`` of each leased patch.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, image_path FROM patches
+                WHERE label IS NULL
+                  AND (lease_owner = ? OR lease_expires IS NULL OR lease_expires < ?)
+                ORDER BY lease_owner = ? DESC, position
+                LIMIT ?
+                """,
+                (user, now, user, n),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE patches SET lease_owner = ?, lease_expires = ? WHERE id = ?",
+                [(user, now + self.lease_seconds, patch_id) for patch_id, _ in rows],
+            )
+        return rows
+
+    def submit(self, user: str, annotations: list[tuple[str, str]]) -> list[str]:
+        """
+        Save labels made by a user.
+
+        A label is only saved if the patch is not labelled yet and is leased
+        to the user or its lease has expired (i.e. nobody else is working on
+        it). Labels of patches whose lease expired and which were then
+        labelled by someone else are rejected.
+
+        Parameters
+        ----------
+        user : str
+            The user's name.
+        annotations : list of tuple
+            The ``(patch_id, label)`` of each annotation.
+
+        Returns
+        -------
+        list of str
+            The IDs of the patches whose labels were saved.
+        """
+        now = time.time()
+        saved = []
+        with self._transaction() as conn:
+            for patch_id, label in annotations:
+                cursor = conn.execute(
+                    """
+                    UPDATE patches
+                    SET label = ?, annotator = ?, annotated_at = ?,
+                        lease_owner = NULL, lease_expires = NULL
+                    WHERE id = ? AND label IS NULL
+                      AND (lease_owner = ? OR lease_expires IS NULL OR lease_expires < ?)
+                    """,
+                    (label, user, now, str(patch_id), user, now),
+                )
+                if cursor.rowcount:
+                    saved.append(str(patch_id))
+        return saved
+
+    def release(self, user: str) -> None:
+        """
+        Release all patches leased to a user (e.g. when they stop
+        annotating).
+
+        Parameters
+        ----------
+        user : str
+            The user's name.
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE patches SET lease_owner = NULL, lease_expires = NULL WHERE lease_owner = ?",
+                (user,),
+            )
+
+    def get_image_path(self, patch_id: str) -> str | None:
+        """
+        Get the image path of a patch.
+
+        Parameters
+        ----------
+        patch_id : str
+            The patch ID.
+
+        Returns
+        -------
+        str or None
+            The image path, or ``None`` if the patch is not in the store.
+        """
+        row = (
+            self._connect()
+            .execute("SELECT image_path FROM patches WHERE id = ?", (str(patch_id),))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def progress(self) -> dict:
+        """
+        Count labelled, leased and remaining patches.
+
+        Returns
+        -------
+        dict
+            The total number of patches, the number labelled (overall and by
+            each user) and the number currently leased.
+        """
+        conn = self._connect()
+        total, labelled = conn.execute(
+            "SELECT COUNT(*), COUNT(label) FROM patches"
+        ).fetchone()
+        leased = conn.execute(
+            "SELECT COUNT(*) FROM patches WHERE label IS NULL AND lease_expires >= ?",
+            (time.time(),),
+        ).fetchone()[0]
+        by_user = dict(
+            conn.execute(
+                "SELECT annotator, COUNT(*) FROM patches WHERE annotator IS NOT NULL GROUP BY annotator"
+            ).fetchall()
+        )
+        return {
+            "total": total,
+            "labelled": labelled,
+            "leased": leased,
+            "by_user": by_user,
+        }
+
+    def get_labelled_data(self) -> pd.DataFrame:
+        """
+        Get all labels saved so far.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The labelled patches, indexed by patch ID, with "label",
+            "image_path", "annotator" and "annotated_at" columns.
+        """
+        return pd.read_sql_query(
+            "SELECT id, label, image_path, annotator, annotated_at FROM patches WHERE label IS NOT NULL ORDER BY position",
+            self._connect(),
+            index_col="id",
+        )
+
+    def close(self) -> None:
+        """Close this thread's database connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class _Transaction:
+    """Commit on success, roll back on error."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.conn
+
+    def __exit__(self, exc_type, *_):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
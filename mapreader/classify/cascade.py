@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+
+def pixel_stats_rule(
+    labels_map: dict[int, str],
+    label: str,
+    max_std: float | None = 0.02,
+    min_mean: float | None = None,
+    max_mean: float | None = None,
+    conf: float = 1.0,
+    mean_col: str = "mean_pixel",
+    std_col: str = "std_pixel",
+) -> Callable[[pd.DataFrame], np.ndarray]:
+    """
+    Create a rule which labels patches using their pixel statistics (e.g.
+    blank patches with a low standard deviation of pixel values), for use as
+    the first stage of ``ClassifierContainer.cascade_inference``.
+
+    Pixel statistics can be calculated using the ``calc_pixel_stats`` method
+    of your ``MapImages`` object and must be in your patch DataFrame.
+
+    Parameters
+    ----------
+    labels_map : dict
+        A dictionary mapping label indices to their labels.
+    label : str
+        The label to give patches which match the rule.
+    max_std : float or None, optional
+        Patches must have a standard deviation of pixel values (between 0 and
+        1) less than or equal to this to match the rule. By default ``0.02``.
+    min_mean : float or None, optional
+        Patches must have a mean pixel value (between 0 and 1) greater than
+        or equal to this to match the rule. By default ``None``.
+    max_mean : float or None, optional
+        Patches must have a mean pixel value (between 0 and 1) less than or
+        equal to this to match the rule. By default ``None``.
+    conf : float, optional
+        The confidence to give patches which match the rule, by default
+        ``1.0``.
+    mean_col : str, optional
+        The name of the column containing mean pixel values, by default
+        ``"mean_pixel"``.
+    std_col : str, optional
+        The name of the column containing the standard deviations of pixel
+        values, by default ``"std_pixel"``.
+
+    Returns
+    -------
+    Callable
+        A function which takes a patch DataFrame and returns an array of
+        shape ``(len(patch_df), len(labels_map))`` of predicted
+        probabilities. Patches which do not match the rule are given equal
+        probabilities for each label (i.e. low confidence).
+
+    Raises
+    ------
+    ValueError
+        If ``label`` is not in ``labels_map``.
+    """
+    label_indices = {v: k for k, v in labels_map.items()}
+    if label not in label_indices:
+        raise ValueError(
+            f"[ERROR] ``label`` must be one of {list(labels_map.values())}."
+        )
+    label_index = label_indices[label]
+    n_labels = len(labels_map)
+
+    def rule(patch_df: pd.DataFrame) -> np.ndarray:
+        matches = np.ones(len(patch_df), dtype=bool)
+        for col, value, op in [
+            (std_col, max_std, np.less_equal),
+            (mean_col, min_mean, np.greater_equal),
+            (mean_col, max_mean, np.less_equal),
+        ]:
+            if value is None:
+                continue
+            if col not in patch_df.columns:
+                raise ValueError(
+                    f'[ERROR] "{col}" not in patch DataFrame. Use ``calc_pixel_stats`` to calculate pixel stats.'
+                )
+            matches &= op(patch_df[col].to_numpy(dtype=float), value)
+
+        probs = np.full((len(patch_df), n_labels), 1 / n_labels)
+        if n_labels > 1:
+            probs[matches] = (1 - conf) / (n_labels - 1)
+        probs[matches, label_index] = conf
+        return probs
+
+    return rule
@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import copy
+import json
 import os
 import random
 import socket
@@ -9,21 +10,29 @@ import sys
 import time
 from collections.abc import Hashable, Iterable
 from datetime import datetime
-from typing import Any
+from typing import TYPE_CHECKING, Any, Callable
 
 import joblib
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
 import torch
 import torch.nn as nn
 import torchvision
-from sklearn.metrics import precision_recall_fscore_support, roc_auc_score
 from torch import optim
-from torch.utils.data import DataLoader, Sampler
+from torch.utils.data import DataLoader, Sampler, SequentialSampler
 from torchinfo import summary
 from torchvision import models
 
-from .datasets import PatchDataset
+from .dataloader_tuning import tune_dataloader
+from .datasets import PatchDataset, PatchFeatureDataset
+from .feature_cache import FeatureCache
+from .metrics import MetricsAccumulator
+from .pruning import prune_conv_channels
+from .timing import PhaseTimer
+
+if TYPE_CHECKING:
+    from mapreader.load.images import MapImages
 
 
 class ClassifierContainer:
@@ -86,6 +95,10 @@ class ClassifierContainer:
         The loss function to use for training the model.
     metrics : dict
         A dictionary to store the metrics computed during training.
+    sample_losses : dict
+        A dictionary mapping dataset names to the loss of each patch (a
+        pandas.Series indexed by patch ID), from ``train_core`` or
+        ``compute_sample_losses``.
     last_epoch : int
         The last epoch number completed during training.
     best_loss : torch.Tensor
@@ -96,6 +109,12 @@ class ClassifierContainer:
     tmp_save_filename : str
         A temporary file name to save checkpoints during training and
         validation.
+    feature_dataloaders : dict
+        A dictionary of dataloaders which return cached features instead of
+        images (see ``extract_features``).
+    feature_head_name : str or None
+        The name of the layer (head) which is trained/run on the cached
+        features.
     """
 
     def __init__(
@@ -158,6 +177,7 @@ class ClassifierContainer:
             self.loss_fn = None
 
             self.metrics = {}
+            self.sample_losses = {}
             self.last_epoch = 0
             self.best_loss = torch.tensor(np.inf)
             self.best_epoch = 0
@@ -174,6 +194,8 @@ class ClassifierContainer:
 
             # add dataloaders and labels_map
             self.dataloaders = dataloaders if dataloaders else {}
+            self.feature_dataloaders = {}
+            self.feature_head_name = None
 
         for set_name, dataloader in self.dataloaders.items():
             print(f'[INFO] Loaded "{set_name}" with {len(dataloader.dataset)} items.')
@@ -596,11 +618,277 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to define one."  # noqa
             else:
                 param.requires_grad = False
 
+    def _get_head_name(self, head_name: str | None = None) -> str:
+        """
+        Get the name of the head (final classification layer) of the model.
+
+        Parameters
+        ----------
+        head_name : str or None, optional
+            The name of the head. If ``None``, the last ``nn.Linear`` layer in
+            the model is used. By default ``None``.
+
+        Returns
+        -------
+        str
+            The name of the head.
+
+        Raises
+        ------
+        ValueError
+            If ``head_name`` is not a layer in the model or, if ``head_name``
+            is ``None``, the model has no ``nn.Linear`` layers.
+        """
+        module_names = dict(self.model.named_modules())
+        if head_name is None:
+            linear_names = [
+                name
+                for name, module in module_names.items()
+                if isinstance(module, nn.Linear)
+            ]
+            if not len(linear_names):
+                raise ValueError(
+                    "[ERROR] Could not find the head of the model. Please specify ``head_name``."
+                )
+            return linear_names[-1]
+        if head_name not in module_names or head_name == "":
+            raise ValueError(f'[ERROR] "{head_name}" is not a layer in the model.')
+        return head_name
+
+    def extract_features(
+        self,
+        set_names: list[str] | None = None,
+        cache_dir: str | None = "features",
+        head_name: str | None = None,
+        overwrite: bool = False,
+        mixed_precision: bool | str = False,
+    ) -> FeatureCache:
+        """
+        Run the model, without its head, over the datasets in ``set_names``
+        and cache the resulting features (embeddings) by patch ID.
+
+        The cached features can then be used to train/run only the head of
+        the model by passing ``use_cached_features=True`` to ``train`` or
+        ``inference``.
+
+        Parameters
+        ----------
+        set_names : list of str or None, optional
+            The names of the dataloaders to extract features for. If ``None``,
+            all dataloaders are used. By default ``None``.
+        cache_dir : str, optional
+            The directory in which to store the cached features, by default
+            ``"features"``.
+        head_name : str or None, optional
+            The name of the head (final classification layer) of the model.
+            This layer is replaced by ``nn.Identity`` while extracting
+            features. If ``None``, the last ``nn.Linear`` layer is used.
+            By default ``None``.
+        overwrite : bool, optional
+            Whether to clear the cache if it was created with a different
+            model/head, by default ``False``.
+        mixed_precision : bool or str, optional
+            Whether to use automatic mixed precision (see ``train``), by
+            default ``False``.
+
+        Returns
+        -------
+        FeatureCache
+            The feature cache.
+
+        Notes
+        -----
+        Features are only computed for patches which are not already in the
+        cache, so adding newly annotated patches to your datasets and
+        re-running this method only runs the model on the new patches.
+
+        As the features are computed once, random augmentations (e.g. the
+        default "train" transforms) are not re-applied each epoch. Use
+        deterministic transforms (e.g. "val") when extracting features.
+
+        The cache does not track changes to the model's weights. If you
+        fine-tune any layers other than the head, clear the cache (e.g.
+        using ``overwrite=True`` with a new ``cache_dir``).
+        """
+        if set_names is None:
+            set_names = list(self.dataloaders.keys())
+        for set_name in set_names:
+            if set_name not in self.dataloaders.keys():
+                raise KeyError(
+                    f'[ERROR] "{set_name}" dataloader cannot be found in dataloaders.\n\
+    Valid options for ``set_names`` argument are: {self.dataloaders.keys()}'  # noqa
+                )
+
+        head_name = self._get_head_name(head_name)
+        if any(
+            param.requires_grad
+            for name, param in self.model.named_parameters()
+            if not name.startswith(f"{head_name}.")
+        ):
+            print(
+                f'[WARNING] Layers other than "{head_name}" are not frozen but will not be updated when training on cached features.'
+            )
+
+        if not hasattr(self, "feature_dataloaders"):
+            self.feature_dataloaders = {}
+
+        feature_cache = FeatureCache(cache_dir)
+        feature_cache.check_metadata(
+            {"model": type(self.model).__name__, "head": head_name},
+            overwrite=overwrite,
+        )
+
+        device_type, amp_dtype, _ = self._get_amp_settings(mixed_precision)
+
+        # replace head with identity so model outputs its features
+        parent_name, _, attr_name = head_name.rpartition(".")
+        parent = self.model.get_submodule(parent_name)
+        head = getattr(parent, attr_name)
+        setattr(parent, attr_name, nn.Identity())
+        was_training = self.model.training
+        self.model.eval()
+
+        def _features(dataloader, set_name):
+            with torch.no_grad():
+                for inputs, _labels, _label_indices in dataloader:
+                    inputs = tuple(input.to(self.device) for input in inputs)
+                    inputs = self._apply_batch_transform(inputs, set_name)
+                    with torch.autocast(
+                        device_type=device_type,
+                        dtype=amp_dtype,
+                        enabled=amp_dtype is not None,
+                    ):
+                        outputs = self.model(*inputs)
+                    if not isinstance(outputs, torch.Tensor):
+                        outputs = self._get_logits(outputs)
+                    yield outputs.float().flatten(start_dim=1).cpu().numpy()
+
+        try:
+            for set_name in set_names:
+                dataloader = self.dataloaders[set_name]
+                dataset = dataloader.dataset
+                patch_ids = dataset.patch_df.index
+                missing = set(feature_cache.missing(patch_ids))
+                if len(missing):
+                    print(
+                        f'[INFO] Extracting features for {len(missing)} patches in "{set_name}".'
+                    )
+                    positions = [
+                        i for i, patch_id in enumerate(patch_ids) if patch_id in missing
+                    ]
+                    missing_dataloader = DataLoader(
+                        torch.utils.data.Subset(dataset, positions),
+                        batch_size=dataloader.batch_size,
+                        shuffle=False,
+                        num_workers=dataloader.num_workers,
+                    )
+                    feature_cache.add(
+                        [patch_ids[i] for i in positions],
+                        _features(missing_dataloader, set_name),
+                    )
+
+                # feature dataloaders use the same sampler as the originals
+                self.feature_dataloaders[set_name] = DataLoader(
+                    PatchFeatureDataset(dataset, feature_cache),
+                    batch_size=dataloader.batch_size,
+                    sampler=dataloader.sampler,
+                    drop_last=dataloader.drop_last,
+                )
+        finally:
+            setattr(parent, attr_name, head)
+            self.model.train(was_training)
+
+        self.feature_head_name = head_name
+        return feature_cache
+
+    def embed_patches(
+        self,
+        patch_df: str | pd.DataFrame | MapImages,
+        cache_dir: str | None = "embeddings",
+        head_name: str | None = None,
+        set_name: str | None = "embed",
+        batch_size: int | None = 16,
+        num_workers: int | None = 0,
+        overwrite: bool = False,
+        mixed_precision: bool | str = False,
+        **kwargs,
+    ) -> FeatureCache:
+        """
+        Embed all patches in a patch DataFrame (or ``MapImages`` object) in
+        batches, using the model without its head, and save the embeddings
+        by patch ID.
+
+        The embeddings can then be used to build a ``NearestNeighbourIndex``
+        to find similar patches.
+
+        Parameters
+        ----------
+        patch_df : str, pandas.DataFrame or MapImages
+            The patches to embed. Either a DataFrame (or path to a CSV/geojson
+            file) containing the paths to your patches (e.g. ``patch_df.csv``)
+            or a ``MapImages`` object containing your patches.
+        cache_dir : str, optional
+            The directory in which to save the embeddings, by default
+            ``"embeddings"``.
+        head_name : str or None, optional
+            The name of the head (final classification layer) of the model.
+            If ``None``, the last ``nn.Linear`` layer is used.
+            By default ``None``.
+        set_name : str, optional
+            The name to use for the dataset of patches, by default
+            ``"embed"``.
+        batch_size : int, optional
+            The batch size, by default ``16``.
+        num_workers : int, optional
+            The number of worker processes to use for loading data, by default
+            ``0``.
+        overwrite : bool, optional
+            Whether to clear ``cache_dir`` if it was created with a different
+            model/head, by default ``False``.
+        mixed_precision : bool or str, optional
+            Whether to use automatic mixed precision (see ``train``), by
+            default ``False``.
+        **kwargs
+            Keyword arguments passed to ``PatchDataset`` (e.g.
+            ``patch_paths_col``).
+
+        Returns
+        -------
+        FeatureCache
+            The saved embeddings.
+
+        Notes
+        -----
+        Patches which are already in ``cache_dir`` are not embedded again.
+        The patches are embedded using the "val" transforms.
+        """
+        from mapreader.load.images import MapImages
+
+        if isinstance(patch_df, MapImages):
+            _, patch_df = patch_df.convert_images()
+
+        dataset = PatchDataset(patch_df, transform="val", **kwargs)
+        self.load_dataset(
+            dataset, set_name, batch_size=batch_size, num_workers=num_workers
+        )
+        return self.extract_features(
+            set_names=[set_name],
+            cache_dir=cache_dir,
+            head_name=head_name,
+            overwrite=overwrite,
+            mixed_precision=mixed_precision,
+        )
+
     def inference(
         self,
         set_name: str | None = "infer",
         verbose: bool | None = False,
         print_info_batch_freq: int | None = 5,
+        mixed_precision: bool | str = False,
+        compile_model: bool = False,
+        use_cached_features: bool = False,
+        tta: bool | list[str] | None = None,
+        ensemble: list[str | nn.Module] | None = None,
     ):
         """
         Run inference on a specified dataset (``set_name``).
@@ -614,6 +902,27 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to define one."  # noqa
             Whether to print verbose outputs, by default False.
         print_info_batch_freq : int, optional
             The frequency of printouts, by default ``5``.
+        mixed_precision : bool or str, optional
+            Whether to use automatic mixed precision (see ``train``), by
+            default ``False``.
+        compile_model : bool, optional
+            Whether to run the model through ``torch.compile``, by default
+            ``False``.
+        use_cached_features : bool, optional
+            Whether to only run the head of the model on cached features (see
+            ``extract_features``), by default ``False``.
+        tta : bool or list of str or None, optional
+            Test-time augmentations to apply to each batch. Options are
+            ``"hflip"``, ``"vflip"``, ``"rot90"``, ``"rot180"`` and
+            ``"rot270"``. If ``True``, uses ``["hflip", "vflip", "rot90"]``.
+            The predicted probabilities for the original and augmented images
+            are averaged. By default ``None``.
+        ensemble : list of str or nn.Module, or None, optional
+            Extra models to ensemble with ``self.model``. Each can be a model
+            or a path to a file saved using ``save`` or ``save_checkpoint``
+            (which must have the same architecture as ``self.model``). The
+            predicted probabilities of all models are averaged.
+            By default ``None``.
 
         Returns
         -------
@@ -621,6 +930,11 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to define one."  # noqa
 
         Notes
         -----
+        Augmented images are stacked along the batch dimension so each model
+        runs one forward pass per batch (on a batch ``len(tta) + 1`` times
+        larger), and only the averaged probabilities are stored. You may need
+        to reduce your batch size if using many augmentations.
+
         This method calls the
         :meth:`~.train.classifier.classifier.train` method with the
         ``num_epochs`` set to ``1`` and all the other parameters specified in
@@ -635,7 +949,162 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to define one."  # noqa
             tmp_file_save_freq=2,
             remove_after_load=False,
             print_info_batch_freq=print_info_batch_freq,
+            mixed_precision=mixed_precision,
+            compile_model=compile_model,
+            use_cached_features=use_cached_features,
+            tta=tta,
+            ensemble=ensemble,
+        )
+
+    def cascade_inference(
+        self,
+        first_stage: nn.Module | ClassifierContainer | Callable,
+        set_name: str | None = "infer",
+        threshold: float = 0.9,
+        verbose: bool | None = False,
+        print_info_batch_freq: int | None = 5,
+        **kwargs,
+    ) -> dict:
+        """
+        Run inference on a specified dataset (``set_name``) as a two-stage
+        cascade. A cheap first stage (e.g. a small model or a rule based on
+        pixel statistics) predicts labels for all patches and only patches
+        whose confidence is below ``threshold`` are passed to ``self.model``.
+
+        Parameters
+        ----------
+        first_stage : nn.Module, ClassifierContainer or Callable
+            The first stage. Either a model (with the same labels as
+            ``self.model``), a ``ClassifierContainer`` or a function which
+            takes the dataset's patch DataFrame and returns an array of
+            predicted probabilities of shape ``(n_patches, n_labels)`` (e.g.
+            one created using :func:`~.classify.cascade.pixel_stats_rule`).
+        set_name : str, optional
+            The name of the dataset to run inference on, by default
+            ``"infer"``.
+        threshold : float, optional
+            Patches with a first stage confidence greater than or equal to
+            this are not passed to ``self.model``, by default ``0.9``.
+        verbose : bool, optional
+            Whether to print verbose outputs, by default False.
+        print_info_batch_freq : int, optional
+            The frequency of printouts, by default ``5``.
+        **kwargs
+            Keyword arguments passed to ``inference`` (e.g.
+            ``mixed_precision`` or ``tta``) for each model.
+
+        Returns
+        -------
+        dict
+            Routing statistics: the number of patches, the number (and
+            fraction) decided by each stage and the time taken by each
+            stage. These are also saved as the ``cascade_stats`` attribute.
+
+        Notes
+        -----
+        The final predictions (``pred_conf``, ``pred_label_indices`` and
+        ``pred_label``) come from whichever stage decided each patch and the
+        stage (``1`` or ``2``) is saved as ``pred_stage``. If you then run
+        ``save_predictions``, this is added as the "cascade_stage" column.
+        """
+        if set_name not in self.dataloaders.keys():
+            raise KeyError(
+                f'[ERROR] "{set_name}" dataloader cannot be found in dataloaders.\n\
+    Valid options for ``set_name`` argument are: {self.dataloaders.keys()}'  # noqa
+            )
+
+        dataloader = self.dataloaders[set_name]
+        dataset = dataloader.dataset
+        since = time.time()
+
+        # --- first stage
+        if isinstance(first_stage, (nn.Module, ClassifierContainer)):
+            if isinstance(first_stage, nn.Module):
+                first_stage = ClassifierContainer(
+                    first_stage, labels_map=self.labels_map, device=self.device
+                )
+                first_stage.loss_fn = self.loss_fn
+            first_stage.dataloaders[set_name] = dataloader
+            first_stage.inference(
+                set_name,
+                verbose=verbose,
+                print_info_batch_freq=print_info_batch_freq,
+                **kwargs,
+            )
+            first_probs = np.array(first_stage.pred_conf)
+        elif callable(first_stage):
+            first_probs = np.asarray(first_stage(dataset.patch_df), dtype=float)
+        else:
+            raise ValueError(
+                "[ERROR] ``first_stage`` must be a model, a ClassifierContainer or a callable."
+            )
+
+        if first_probs.shape != (len(dataset), len(self.labels_map)):
+            raise ValueError(
+                f"[ERROR] The first stage returned predictions of shape {first_probs.shape}, expected {(len(dataset), len(self.labels_map))}."
+            )
+        first_stage_time = time.time() - since
+
+        uncertain = np.flatnonzero(first_probs.max(axis=1) < threshold)
+
+        # --- second stage, only on uncertain patches
+        since = time.time()
+        final_probs = first_probs.copy()
+        if len(uncertain):
+            cascade_set_name = f"{set_name}_cascade"
+            cascade_dataset = copy.copy(dataset)
+            cascade_dataset.patch_df = dataset.patch_df.iloc[uncertain]
+            self.dataloaders[cascade_set_name] = DataLoader(
+                cascade_dataset,
+                batch_size=dataloader.batch_size,
+                shuffle=False,
+                num_workers=dataloader.num_workers,
+            )
+            try:
+                self.inference(
+                    cascade_set_name,
+                    verbose=verbose,
+                    print_info_batch_freq=print_info_batch_freq,
+                    **kwargs,
+                )
+            finally:
+                del self.dataloaders[cascade_set_name]
+            final_probs[uncertain] = np.array(self.pred_conf)
+        second_stage_time = time.time() - since
+
+        pred_stage = np.ones(len(dataset), dtype=int)
+        pred_stage[uncertain] = 2
+
+        self.pred_conf = final_probs.tolist()
+        self.pred_label_indices = final_probs.argmax(axis=1).tolist()
+        self.pred_label = [
+            self.labels_map.get(i, None) for i in self.pred_label_indices
+        ]
+        self.pred_stage = pred_stage.tolist()
+        if dataset.label_index_col in dataset.patch_df.columns:
+            self.orig_label_indices = dataset.patch_df[dataset.label_index_col].tolist()
+        else:
+            self.orig_label_indices = [-1] * len(dataset)
+        self.orig_label = [
+            self.labels_map.get(i, None) for i in self.orig_label_indices
+        ]
+
+        n_total = len(dataset)
+        self.cascade_stats = {
+            "n_total": n_total,
+            "n_first_stage": n_total - len(uncertain),
+            "n_second_stage": len(uncertain),
+            "frac_first_stage": (
+                (n_total - len(uncertain)) / n_total if n_total else 0.0
+            ),
+            "first_stage_time": first_stage_time,
+            "second_stage_time": second_stage_time,
+        }
+        print(
+            f"[INFO] Cascade: {self.cascade_stats['n_first_stage']}/{n_total} patches decided by first stage ({first_stage_time:.1f}s), "
+            f"{self.cascade_stats['n_second_stage']}/{n_total} by second stage ({second_stage_time:.1f}s)."
         )
+        return self.cascade_stats
 
     def train_component_summary(self) -> None:
         """
@@ -667,6 +1136,15 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to define one."  # noqa
         tmp_file_save_freq: int | None | None = 2,
         remove_after_load: bool = True,
         print_info_batch_freq: int | None | None = 5,
+        mixed_precision: bool | str = False,
+        accumulation_steps: int = 1,
+        compile_model: bool = False,
+        use_cached_features: bool = False,
+        tta: bool | list[str] | None = None,
+        ensemble: list[str | nn.Module] | None = None,
+        sync_timing: bool = False,
+        profile_steps: int | None = None,
+        profile_dir: str | None = None,
     ) -> None:
         """
         Train the model on the specified phases for a given number of epochs.
@@ -702,6 +1180,39 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to define one."  # noqa
             The frequency (in batches) to print training information. Default
             is ``5``. If set to ``0`` or ``None``, no training information is
             printed.
+        mixed_precision : bool or str, optional
+            Whether to use automatic mixed precision. If ``True``, uses
+            bfloat16 on CPU and float16 (with gradient scaling) on CUDA.
+            Can also be set to ``"bf16"`` or ``"fp16"``. Default is ``False``.
+        accumulation_steps : int, optional
+            The number of batches to accumulate gradients over before each
+            optimizer step. Default is ``1``.
+        compile_model : bool, optional
+            Whether to run the model through ``torch.compile`` (requires
+            PyTorch 2.0 or later). Default is ``False``.
+        use_cached_features : bool, optional
+            Whether to train/run only the head of the model on cached
+            features instead of running the full model on images. The
+            features must first be created using ``extract_features``.
+            Default is ``False``.
+        tta : bool or list of str or None, optional
+            Test-time augmentations to apply (not valid for training phases).
+            See ``inference``. Default is ``None``.
+        ensemble : list of str or nn.Module, or None, optional
+            Extra models to ensemble with ``self.model`` (not valid for
+            training phases). See ``inference``. Default is ``None``.
+        sync_timing : bool, optional
+            Whether to synchronise CUDA when timing each part of the batch
+            loop (see ``train_core``). This gives an accurate time breakdown
+            on GPU at some cost to throughput. Default is ``False``.
+        profile_steps : int or None, optional
+            If set, runs ``torch.profiler`` for this many batches at the
+            start of the first phase and prints a summary of the most
+            expensive operators. Default is ``None``.
+        profile_dir : str or None, optional
+            The directory to save the profiler trace (``trace.json``,
+            viewable in ``chrome://tracing`` or Perfetto) in. If ``None``,
+            the trace is not saved. Default is ``None``.
 
         Returns
         -------
@@ -729,12 +1240,23 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to define one."  # noqa
                 tensorboard_path,
                 tmp_file_save_freq,
                 print_info_batch_freq=print_info_batch_freq,
+                mixed_precision=mixed_precision,
+                accumulation_steps=accumulation_steps,
+                compile_model=compile_model,
+                use_cached_features=use_cached_features,
+                tta=tta,
+                ensemble=ensemble,
+                sync_timing=sync_timing,
+                profile_steps=profile_steps,
+                profile_dir=profile_dir,
             )
         except KeyboardInterrupt:
             print("[INFO] Exiting...")
             if os.path.isfile(self.tmp_save_filename):
                 print(f'[INFO] Loading "{self.tmp_save_filename}" as model.')
-                self.load(self.tmp_save_filename, remove_after_load=remove_after_load)
+                self.load_checkpoint(
+                    self.tmp_save_filename, remove_after_load=remove_after_load
+                )
             else:
                 print("[INFO] No checkpoint file found - model has not been updated.")
 
@@ -747,6 +1269,15 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to define one."  # noqa
         tensorboard_path: str | None | None = None,
         tmp_file_save_freq: int | None | None = 2,
         print_info_batch_freq: int | None | None = 5,
+        mixed_precision: bool | str = False,
+        accumulation_steps: int = 1,
+        compile_model: bool = False,
+        use_cached_features: bool = False,
+        tta: bool | list[str] | None = None,
+        ensemble: list[str | nn.Module] | None = None,
+        sync_timing: bool = False,
+        profile_steps: int | None = None,
+        profile_dir: str | None = None,
     ) -> None:
         """
         Trains/fine-tunes a classifier for the specified number of epochs on
@@ -775,6 +1306,39 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to define one."  # noqa
             The frequency (in batches) to print training information. Default
             is ``5``. If set to ``0`` or ``None``, no training information is
             printed.
+        mixed_precision : bool or str, optional
+            Whether to use automatic mixed precision. If ``True``, uses
+            bfloat16 on CPU and float16 (with gradient scaling) on CUDA.
+            Can also be set to ``"bf16"`` or ``"fp16"``. Default is ``False``.
+        accumulation_steps : int, optional
+            The number of batches to accumulate gradients over before each
+            optimizer step. Default is ``1``.
+        compile_model : bool, optional
+            Whether to run the model through ``torch.compile`` (requires
+            PyTorch 2.0 or later). Default is ``False``.
+        use_cached_features : bool, optional
+            Whether to train/run only the head of the model on cached
+            features instead of running the full model on images. The
+            features must first be created using ``extract_features``.
+            Default is ``False``.
+        tta : bool or list of str or None, optional
+            Test-time augmentations to apply (not valid for training phases).
+            See ``inference``. Default is ``None``.
+        ensemble : list of str or nn.Module, or None, optional
+            Extra models to ensemble with ``self.model`` (not valid for
+            training phases). See ``inference``. Default is ``None``.
+        sync_timing : bool, optional
+            Whether to synchronise CUDA when timing each part of the batch
+            loop (see Notes). This gives an accurate time breakdown on GPU
+            at some cost to throughput. Default is ``False``.
+        profile_steps : int or None, optional
+            If set, runs ``torch.profiler`` for this many batches at the
+            start of the first phase and prints a summary of the most
+            expensive operators. Default is ``None``.
+        profile_dir : str or None, optional
+            The directory to save the profiler trace (``trace.json``,
+            viewable in ``chrome://tracing`` or Perfetto) in. If ``None``,
+            the trace is not saved. Default is ``None``.
 
         Raises
         ------
@@ -796,31 +1360,100 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to define one."  # noqa
         Returns
         -------
         None
+
+        Notes
+        -----
+        For each phase and epoch, the time (in seconds) spent waiting for
+        data, copying data to the device (including any batch transforms),
+        in the forward pass, in the backward pass (and optimizer step) and
+        in metric bookkeeping is saved in ``self.metrics`` (as
+        ``"epoch_time_data_{phase}"``, ``"epoch_time_transfer_{phase}"``,
+        etc.), alongside the throughput (``"epoch_samples_per_sec_{phase}"``).
+        These are also written to TensorBoard if ``tensorboard_path`` is set.
+
+        On GPU, operations run asynchronously so, unless ``sync_timing`` is
+        ``True``, time spent on the GPU is mostly attributed to whichever
+        part of the loop next waits for it (usually metric bookkeeping).
         """
 
         if phases is None:
             phases = ["train", "val"]
         print(f"[INFO] Each step will pass: {phases}.")
 
-        for phase in phases:
-            if phase not in self.dataloaders.keys():
-                raise KeyError(
-                    f'[ERROR] "{phase}" dataloader cannot be found in dataloaders.\n\
+        train_phase_names = ["train", "training"]
+        valid_phase_names = ["val", "validation", "eval", "evaluation"]
+
+        if use_cached_features:
+            dataloaders = getattr(self, "feature_dataloaders", {})
+            for phase in phases:
+                if phase not in dataloaders.keys():
+                    raise KeyError(
+                        f'[ERROR] No cached features found for "{phase}".\n\
+    Use ``extract_features`` to create them.'
+                    )
+        else:
+            dataloaders = self.dataloaders
+            for phase in phases:
+                if phase not in dataloaders.keys():
+                    raise KeyError(
+                        f'[ERROR] "{phase}" dataloader cannot be found in dataloaders.\n\
     Valid options for ``phases`` argument are: {self.dataloaders.keys()}'  # noqa
-                )
+                    )
 
         if verbose:
             self.train_component_summary()
 
+        if accumulation_steps < 1:
+            raise ValueError("[ERROR] ``accumulation_steps`` must be at least 1.")
+
+        device_type, amp_dtype, use_grad_scaler = self._get_amp_settings(
+            mixed_precision
+        )
+        if hasattr(torch.amp, "GradScaler"):
+            grad_scaler = torch.amp.GradScaler(device_type, enabled=use_grad_scaler)
+        else:
+            grad_scaler = torch.cuda.amp.GradScaler(enabled=use_grad_scaler)
+
+        # head/compiled model shares parameters with self.model
+        if use_cached_features:
+            model = self.model.get_submodule(self.feature_head_name)
+            is_inception = False
+        else:
+            model = self.model
+            is_inception = self.is_inception
+
+        if compile_model:
+            if not hasattr(torch, "compile"):
+                raise NotImplementedError(
+                    "[ERROR] ``compile_model`` requires PyTorch 2.0 or later."
+                )
+            model = torch.compile(model)
+
+        if tta or ensemble:
+            if any(phase.lower() in train_phase_names for phase in phases):
+                raise ValueError(
+                    "[ERROR] ``tta`` and ``ensemble`` can only be used for inference."
+                )
+            if use_cached_features:
+                raise ValueError(
+                    "[ERROR] ``tta`` and ``ensemble`` cannot be used with ``use_cached_features``."
+                )
+            tta = self._get_tta_names(tta)
+            ensemble_models = [model] + [
+                self._load_ensemble_model(member) for member in (ensemble or [])
+            ]
+            for ensemble_model in ensemble_models:
+                ensemble_model.eval()
+
         since = time.time()
 
         # initialize variables
-        train_phase_names = ["train", "training"]
-        valid_phase_names = ["val", "validation", "eval", "evaluation"]
-        best_model_wts = copy.deepcopy(self.model.state_dict())
+        best_model_wts = self._snapshot_state_dict()
         self.pred_conf = []
         self.pred_label_indices = []
         self.orig_label_indices = []
+        self.pred_stage = None
+        self.sample_losses = getattr(self, "sample_losses", {})
         if save_model_dir is not None:
             save_model_dir = os.path.abspath(save_model_dir)
 
@@ -838,6 +1471,8 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to define one."  # noqa
                 print("[WARNING] Continuing without tensorboard.")
                 tensorboard_path = None
 
+        profiler = self._start_profiler() if profile_steps else None
+
         start_epoch = self.last_epoch + 1
         end_epoch = self.last_epoch + num_epochs
 
@@ -846,30 +1481,48 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to define one."  # noqa
             # --- loop, phases
             for phase in phases:
                 if phase.lower() in train_phase_names:
-                    self.model.train()
+                    model.train()
                 else:
-                    self.model.eval()
+                    model.eval()
 
                 # initialize vars with one epoch lifetime
                 running_loss = 0.0
+                running_metrics = MetricsAccumulator()
                 running_pred_conf = []
                 running_pred_label_indices = []
                 running_orig_label_indices = []
+                running_sample_losses = []
+                timer = PhaseTimer(self.device, synchronize=sync_timing)
+
+                # per-sample losses can only be matched to patch IDs if the
+                # dataloader is not shuffled
+                record_losses = phase.lower() in (
+                    train_phase_names + valid_phase_names
+                ) and isinstance(dataloaders[phase].sampler, SequentialSampler)
 
                 # TQDM
                 # batch_loop = tqdm(iter(self.dataloaders[phase]), total=len(self.dataloaders[phase]), leave=False) # noqa
                 # if phase.lower() in train_phase_names+valid_phase_names:
                 #     batch_loop.set_description(f"Epoch {epoch}/{end_epoch}")
 
-                phase_batch_size = self.dataloaders[phase].batch_size
-                total_inp_counts = len(self.dataloaders[phase].dataset)
+                # reproducible epochs for samplers which support it
+                if hasattr(dataloaders[phase].sampler, "set_epoch"):
+                    dataloaders[phase].sampler.set_epoch(epoch)
+
+                phase_batch_size = dataloaders[phase].batch_size
+                total_inp_counts = len(dataloaders[phase].dataset)
+                num_batches = len(dataloaders[phase])
 
                 # --- loop, batches
                 for batch_idx, (inputs, _labels, label_indices) in enumerate(
-                    self.dataloaders[phase]
+                    dataloaders[phase]
                 ):
-                    inputs = tuple(input.to(self.device) for input in inputs)
-                    label_indices = label_indices.to(self.device)
+                    timer.data_ready(len(label_indices))
+                    with timer.section("transfer"):
+                        inputs = tuple(input.to(self.device) for input in inputs)
+                        if not use_cached_features:
+                            inputs = self._apply_batch_transform(inputs, phase)
+                        label_indices = label_indices.to(self.device)
 
                     if self.optimizer is None:
                         if phase.lower() in train_phase_names:
@@ -877,7 +1530,7 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to define one."  # noqa
                                 f"[ERROR] An optimizer should be defined for {phase} phase.\n\
 Use ``initialize_optimizer`` or ``add_optimizer`` to add one."  # noqa
                             )
-                    else:
+                    elif batch_idx % accumulation_steps == 0:
                         self.optimizer.zero_grad()
 
                     if phase.lower() in train_phase_names + valid_phase_names:
@@ -896,55 +1549,107 @@ Use ``initialize_optimizer`` or ``add_optimizer`` to add one."  # noqa
 Use ``add_loss_fn`` to define one."
                                 )
 
-                            if self.is_inception and (
-                                phase.lower() in train_phase_names
-                            ):
-                                outputs, aux_outputs = self.model(*inputs)
-
-                                if not isinstance(outputs, torch.Tensor):
-                                    outputs = self._get_logits(outputs)
-                                if not isinstance(aux_outputs, torch.Tensor):
-                                    aux_outputs = self._get_logits(aux_outputs)
-
-                                loss1 = self.loss_fn(outputs, label_indices)
-                                loss2 = self.loss_fn(aux_outputs, label_indices)
-                                # https://discuss.pytorch.org/t/how-to-optimize-inception-model-with-auxiliary-classifiers/7958
-                                loss = loss1 + 0.4 * loss2
-
-                            else:
-                                outputs = self.model(*inputs)
-
-                                if not isinstance(outputs, torch.Tensor):
-                                    outputs = self._get_logits(outputs)
-
-                                loss = self.loss_fn(outputs, label_indices)
-
+                            with timer.section("forward"):
+                                with torch.autocast(
+                                    device_type=device_type,
+                                    dtype=amp_dtype,
+                                    enabled=amp_dtype is not None,
+                                ):
+                                    if is_inception and (
+                                        phase.lower() in train_phase_names
+                                    ):
+                                        outputs, aux_outputs = model(*inputs)
+
+                                        if not isinstance(outputs, torch.Tensor):
+                                            outputs = self._get_logits(outputs)
+                                        if not isinstance(aux_outputs, torch.Tensor):
+                                            aux_outputs = self._get_logits(aux_outputs)
+
+                                        loss1 = self.loss_fn(outputs, label_indices)
+                                        loss2 = self.loss_fn(aux_outputs, label_indices)
+                                        # https://discuss.pytorch.org/t/how-to-optimize-inception-model-with-auxiliary-classifiers/7958
+                                        loss = loss1 + 0.4 * loss2
+
+                                    elif tta or ensemble:
+                                        outputs = self._forward_tta_ensemble(
+                                            ensemble_models, inputs, tta
+                                        )
+                                        loss = self.loss_fn(outputs, label_indices)
+
+                                    else:
+                                        outputs = model(*inputs)
+
+                                        if not isinstance(outputs, torch.Tensor):
+                                            outputs = self._get_logits(outputs)
+
+                                        loss = self.loss_fn(outputs, label_indices)
+
+                            outputs = outputs.float()
                             _, pred_label_indices = torch.max(outputs, dim=1)
 
                             # backward + optimize only if in training phase
+                            # (step once every ``accumulation_steps`` batches,
+                            # averaging the loss over the batches in the group,
+                            # which may be fewer at the end of the epoch)
                             if phase.lower() in train_phase_names:
-                                loss.backward()
-                                self.optimizer.step()
+                                group_start = batch_idx - batch_idx % accumulation_steps
+                                group_size = min(
+                                    accumulation_steps, num_batches - group_start
+                                )
+                                with timer.section("backward"):
+                                    grad_scaler.scale(loss / group_size).backward()
+                                    if (batch_idx + 1) % accumulation_steps == 0 or (
+                                        batch_idx + 1
+                                    ) == num_batches:
+                                        grad_scaler.step(self.optimizer)
+                                        grad_scaler.update()
 
                         # XXX (why multiply?)
-                        running_loss += loss.item() * inputs[0].size(0)
+                        with timer.section("metrics"):
+                            running_loss += loss.item() * inputs[0].size(0)
 
                         # TQDM
                         # batch_loop.set_postfix(loss=loss.data)
                         # batch_loop.refresh()
                     else:
-                        outputs = self.model(*inputs)
+                        with timer.section("forward"), torch.autocast(
+                            device_type=device_type,
+                            dtype=amp_dtype,
+                            enabled=amp_dtype is not None,
+                        ), torch.no_grad():
+                            if tta or ensemble:
+                                outputs = self._forward_tta_ensemble(
+                                    ensemble_models, inputs, tta
+                                )
+                            else:
+                                outputs = model(*inputs)
 
                         if not isinstance(outputs, torch.Tensor):
                             outputs = self._get_logits(outputs)
 
+                        outputs = outputs.float()
                         _, pred_label_indices = torch.max(outputs, dim=1)
 
-                    running_pred_conf.extend(
-                        torch.nn.functional.softmax(outputs, dim=1).cpu().tolist()
-                    )
-                    running_pred_label_indices.extend(pred_label_indices.cpu().tolist())
-                    running_orig_label_indices.extend(label_indices.cpu().tolist())
+                    with timer.section("metrics"):
+                        pred_conf = torch.nn.functional.softmax(outputs, dim=1)
+                        if phase.lower() in train_phase_names + valid_phase_names:
+                            running_metrics.update(
+                                label_indices, pred_label_indices, pred_conf
+                            )
+
+                        running_pred_conf.extend(pred_conf.cpu().tolist())
+                        running_pred_label_indices.extend(
+                            pred_label_indices.cpu().tolist()
+                        )
+                        running_orig_label_indices.extend(label_indices.cpu().tolist())
+                        if record_losses:
+                            running_sample_losses.extend(
+                                nn.functional.cross_entropy(
+                                    outputs.detach(), label_indices, reduction="none"
+                                )
+                                .cpu()
+                                .tolist()
+                            )
 
                     if batch_idx % print_info_batch_freq == 0:
                         curr_inp_counts = min(
@@ -965,15 +1670,28 @@ Use ``add_loss_fn`` to define one."
                             self.cprint("[INFO]", "dgreen", epoch_msg)
                         else:
                             self.cprint("[INFO]", "dgreen", epoch_msg)
+
+                    timer.batch_done()
+                    if profiler is not None:
+                        profiler.step()
+                        if profiler.step_num >= profile_steps:
+                            self._stop_profiler(profiler, profile_dir)
+                            profiler = None
                     # --- END: one batch
 
+                if profiler is not None:
+                    self._stop_profiler(profiler, profile_dir)
+                    profiler = None
+
                 # scheduler
                 if phase.lower() in train_phase_names and (self.scheduler is not None):
                     self.scheduler.step()
 
+                self._add_timing_metrics(timer, phase, epoch, tboard_writer, verbose)
+
                 if phase.lower() in train_phase_names + valid_phase_names:
                     # --- collect statistics
-                    epoch_loss = running_loss / len(self.dataloaders[phase].dataset)
+                    epoch_loss = running_loss / len(dataloaders[phase].dataset)
                     self._add_metrics(f"epoch_loss_{phase}", epoch_loss)
 
                     if tboard_writer is not None:
@@ -984,10 +1702,8 @@ Use ``add_loss_fn`` to define one."
                         )
 
                     # other metrics (precision/recall/F1)
-                    self.calculate_add_metrics(
-                        running_orig_label_indices,
-                        running_pred_label_indices,
-                        running_pred_conf,
+                    self._add_accumulated_metrics(
+                        running_metrics,
                         phase,
                         epoch,
                         tboard_writer,
@@ -1001,6 +1717,13 @@ Use ``add_loss_fn`` to define one."
                     else:
                         self.cprint("[INFO]", "dgreen", epoch_msg)
 
+                if record_losses:
+                    self.sample_losses[phase] = pd.Series(
+                        running_sample_losses,
+                        index=dataloaders[phase].dataset.patch_df.index,
+                        name="loss",
+                    )
+
                 # labels/confidence
                 self.pred_conf.extend(running_pred_conf)
                 self.pred_label_indices.extend(running_pred_label_indices)
@@ -1010,10 +1733,10 @@ Use ``add_loss_fn`` to define one."
                 if phase.lower() in valid_phase_names and epoch_loss < self.best_loss:
                     self.best_loss = epoch_loss
                     self.best_epoch = epoch
-                    best_model_wts = copy.deepcopy(self.model.state_dict())
+                    best_model_wts = self._snapshot_state_dict()
 
                 if phase.lower() in valid_phase_names:
-                    if epoch % tmp_file_save_freq == 0:
+                    if tmp_file_save_freq and epoch % tmp_file_save_freq == 0:
                         tmp_str = f'[INFO] Checkpoint file saved to "{self.tmp_save_filename}".'  # noqa
                         print(
                             self._print_colors["lgrey"]
@@ -1021,7 +1744,7 @@ Use ``add_loss_fn`` to define one."
                             + self._print_colors["reset"]
                         )
                         self.last_epoch = epoch
-                        self.save(self.tmp_save_filename, force=True)
+                        self.save_checkpoint(self.tmp_save_filename, force=True)
 
         self.pred_label = [
             self.labels_map.get(i, None) for i in self.pred_label_indices
@@ -1051,72 +1774,483 @@ Use ``add_loss_fn`` to define one."
 [INFO] Path: {save_model_path}"
                 )
 
-    @staticmethod
-    def _get_logits(out):
-        try:
-            out = out.logits
-        except AttributeError as err:
-            raise AttributeError(err.message)
-        return out
+    _tta_transforms = {
+        "identity": lambda x: x,
+        "hflip": lambda x: torch.flip(x, dims=[-1]),
+        "vflip": lambda x: torch.flip(x, dims=[-2]),
+        "rot90": lambda x: torch.rot90(x, k=1, dims=[-2, -1]),
+        "rot180": lambda x: torch.rot90(x, k=2, dims=[-2, -1]),
+        "rot270": lambda x: torch.rot90(x, k=3, dims=[-2, -1]),
+    }
 
-    def calculate_add_metrics(
+    def compute_sample_losses(
         self,
-        y_true,
-        y_pred,
-        y_score,
-        phase: str,
-        epoch: int | None = -1,
-        tboard_writer=None,
-    ) -> None:
+        set_name: str = "train",
+        batch_size: int | None = None,
+    ) -> pd.Series:
         """
-        Calculate and add metrics to the classifier's metrics dictionary.
+        Compute the loss of each patch in a dataset with the current model,
+        e.g. to find likely mislabelled patches (see
+        ``AnnotationsLoader.review_labels``).
 
         Parameters
         ----------
-        y_true : array-like of shape (n_samples,)
-            True binary labels or multiclass labels. Can be considered ground
-            truth or (correct) target values.
+        set_name : str, optional
+            The name of the dataset, by default ``"train"``.
+        batch_size : int or None, optional
+            The batch size. If ``None``, uses the batch size of the
+            dataset's dataloader. By default ``None``.
 
-        y_pred : array-like of shape (n_samples,)
-            Predicted binary labels or multiclass labels. The estimated
-            targets as returned by a classifier.
+        Returns
+        -------
+        pandas.Series
+            The cross-entropy loss of each patch, indexed by patch ID. It is
+            also saved in ``sample_losses[set_name]``.
 
-        y_score : array-like of shape (n_samples, n_classes)
-            Predicted probabilities for each class. Only required when
-            ``y_pred`` is not binary.
+        Notes
+        -----
+        ``train_core`` also saves per-patch losses (from the last epoch) in
+        ``sample_losses`` for each train/validation phase whose dataloader is
+        not shuffled.
+        """
+        if set_name not in self.dataloaders:
+            raise KeyError(
+                f'[ERROR] "{set_name}" dataloader cannot be found in dataloaders.'
+            )
+        dataloader = self.dataloaders[set_name]
+        dataset = dataloader.dataset
+        sequential = DataLoader(
+            dataset,
+            batch_size=batch_size or dataloader.batch_size,
+            shuffle=False,
+            num_workers=dataloader.num_workers,
+        )
 
-        phase : str
-            Name of the current phase, typically ``"train"`` or ``"val"``. See
-            ``train`` function.
+        was_training = self.model.training
+        self.model.eval()
+        losses = []
+        try:
+            with torch.no_grad():
+                for inputs, _labels, label_indices in sequential:
+                    inputs = tuple(input.to(self.device) for input in inputs)
+                    inputs = self._apply_batch_transform(inputs, set_name)
+                    outputs = self.model(*inputs)
+                    if not isinstance(outputs, torch.Tensor):
+                        outputs = self._get_logits(outputs)
+                    losses.append(
+                        nn.functional.cross_entropy(
+                            outputs.float(),
+                            label_indices.to(self.device),
+                            reduction="none",
+                        ).cpu()
+                    )
+        finally:
+            self.model.train(was_training)
+
+        if not hasattr(self, "sample_losses"):
+            self.sample_losses = {}
+        self.sample_losses[set_name] = pd.Series(
+            torch.cat(losses).numpy() if losses else [],
+            index=dataset.patch_df.index,
+            name="loss",
+            dtype=float,
+        )
+        return self.sample_losses[set_name]
 
-        epoch : int, optional
-            Current epoch number. Default is ``-1``.
+    def _get_tta_names(self, tta: bool | list[str] | None) -> list[str]:
+        """
+        Get the list of test-time augmentations to apply, starting with
+        ``"identity"`` (i.e. the original images).
 
-        tboard_writer : object, optional
-            TensorBoard SummaryWriter object to write the metrics. Default is
-            ``None``.
+        Parameters
+        ----------
+        tta : bool or list of str or None
+            The test-time augmentations (see ``inference``).
 
         Returns
         -------
-        None
+        list of str
+            The names of the augmentations.
 
-        Notes
-        -----
-        This method uses both the
-        :func:`sklearn.metrics.precision_recall_fscore_support` and
-        :func:`sklearn.metrics.roc_auc_score` functions from ``scikit-learn``
-        to calculate the metrics for each average type (``"micro"``,
-        ``"macro"`` and ``"weighted"``). The results are then added to the
-        ``metrics`` dictionary. It also writes the metrics to the TensorBoard
-        SummaryWriter, if ``tboard_writer`` is not None.
+        Raises
+        ------
+        ValueError
+            If any of the augmentations are not valid.
         """
-        # convert y_score to a numpy array:
-        y_score = np.array(y_score)
+        if not tta:
+            return ["identity"]
+        if tta is True:
+            tta = ["hflip", "vflip", "rot90"]
+        if isinstance(tta, str):
+            tta = [tta]
+        for name in tta:
+            if name not in self._tta_transforms:
+                raise ValueError(
+                    f"[ERROR] ``tta`` must be a list containing any of {list(self._tta_transforms.keys())}."
+                )
+        return ["identity"] + [name for name in tta if name != "identity"]
 
-        for avrg in ["micro", "macro", "weighted"]:
-            prec, rcall, fscore, supp = precision_recall_fscore_support(
-                y_true, y_pred, average=avrg
+    def _load_ensemble_model(self, member: str | nn.Module) -> nn.Module:
+        """
+        Load a model to use in an ensemble.
+
+        Parameters
+        ----------
+        member : str or nn.Module
+            A model or path to a file saved using ``save`` (i.e. the
+            ``checkpoint_X.pkl`` file, whose model is saved in the
+            ``model_checkpoint_X.pkl`` file) or ``save_checkpoint``.
+
+        Returns
+        -------
+        nn.Module
+            The model, on ``self.device``.
+        """
+        if isinstance(member, nn.Module):
+            return member.to(self.device)
+
+        par_name = os.path.dirname(os.path.abspath(member))
+        base_name = os.path.basename(os.path.abspath(member))
+        model_path = os.path.join(par_name, f"model_{base_name}")
+
+        if os.path.isfile(model_path):
+            return torch.load(model_path, map_location=self.device)
+        if not os.path.isfile(member):
+            raise FileNotFoundError(f'[ERROR] "{member}" cannot be found.')
+
+        loaded = torch.load(member, map_location=self.device)
+        if isinstance(loaded, nn.Module):
+            return loaded
+        # lightweight checkpoint, load state dict into a copy of self.model
+        model = copy.deepcopy(self.model)
+        model.load_state_dict(loaded.get("model_state_dict", loaded))
+        return model
+
+    def _forward_tta_ensemble(
+        self,
+        models: list[nn.Module],
+        inputs: tuple[torch.Tensor],
+        tta: list[str],
+    ) -> torch.Tensor:
+        """
+        Run each model on the original and augmented inputs and average the
+        predicted probabilities.
+
+        Parameters
+        ----------
+        models : list of nn.Module
+            The models to run.
+        inputs : tuple of torch.Tensor
+            The batch of inputs.
+        tta : list of str
+            The names of the augmentations (see ``_get_tta_names``).
+
+        Returns
+        -------
+        torch.Tensor
+            The log of the averaged probabilities, of shape
+            ``(batch_size, n_classes)``. Passing these through a softmax
+            gives back the averaged probabilities.
+
+        Raises
+        ------
+        ValueError
+            If rotating by 90 or 270 degrees and the inputs are not square.
+        """
+        if any(name in ["rot90", "rot270"] for name in tta) and any(
+            input.shape[-1] != input.shape[-2] for input in inputs
+        ):
+            raise ValueError(
+                '[ERROR] "rot90" and "rot270" can only be used with square images.'
+            )
+
+        # stack augmentations along the batch dimension
+        batch_size = inputs[0].shape[0]
+        aug_inputs = tuple(
+            torch.cat([self._tta_transforms[name](input) for name in tta])
+            for input in inputs
+        )
+
+        probs = 0
+        for model in models:
+            outputs = model(*aug_inputs)
+            if not isinstance(outputs, torch.Tensor):
+                outputs = self._get_logits(outputs)
+            outputs = torch.nn.functional.softmax(outputs.float(), dim=1)
+            probs = probs + outputs.view(len(tta), batch_size, -1).sum(dim=0)
+        probs = probs / (len(tta) * len(models))
+
+        return torch.log(probs.clamp_min(torch.finfo(probs.dtype).tiny))
+
+    def _snapshot_state_dict(self) -> dict[str, torch.Tensor]:
+        """
+        Take a copy of the model's state dict on the CPU.
+
+        Returns
+        -------
+        dict
+            The copied state dict.
+
+        Notes
+        -----
+        Each tensor is copied directly to the CPU, avoiding a
+        ``copy.deepcopy`` of the state dict on the model's device.
+        """
+        return {
+            k: v.detach().to("cpu", copy=True)
+            for k, v in self.model.state_dict().items()
+        }
+
+    def _get_amp_settings(
+        self, mixed_precision: bool | str = False
+    ) -> tuple[str, torch.dtype | None, bool]:
+        """
+        Work out the settings to use for automatic mixed precision.
+
+        Parameters
+        ----------
+        mixed_precision : bool or str, optional
+            ``False`` to disable mixed precision, ``True`` to use the default
+            for the device (bfloat16 on CPU, float16 on CUDA), or one of
+            ``"bf16"``/``"bfloat16"`` or ``"fp16"``/``"float16"``.
+            By default ``False``.
+
+        Returns
+        -------
+        tuple
+            The device type (e.g. ``"cpu"`` or ``"cuda"``), the dtype to use
+            for autocasting (``None`` if disabled) and whether to use a
+            gradient scaler (only for float16 on CUDA).
+
+        Raises
+        ------
+        ValueError
+            If ``mixed_precision`` is not a valid option.
+        """
+        device_type = torch.device(self.device).type
+
+        if not mixed_precision:
+            return device_type, None, False
+
+        if mixed_precision is True:
+            amp_dtype = torch.float16 if device_type == "cuda" else torch.bfloat16
+        elif mixed_precision in ["bf16", "bfloat16"]:
+            amp_dtype = torch.bfloat16
+        elif mixed_precision in ["fp16", "float16"]:
+            amp_dtype = torch.float16
+        else:
+            raise ValueError(
+                '[ERROR] ``mixed_precision`` must be a bool, "bf16" or "fp16".'
             )
+
+        use_grad_scaler = amp_dtype == torch.float16 and device_type == "cuda"
+        return device_type, amp_dtype, use_grad_scaler
+
+    def _apply_batch_transform(
+        self, inputs: tuple[torch.Tensor], set_name: str
+    ) -> tuple[torch.Tensor]:
+        """
+        Apply the ``batch_transform`` of a dataset (if it has one) to a batch
+        of inputs.
+
+        Parameters
+        ----------
+        inputs : tuple of torch.Tensor
+            The batch of inputs from the dataloader.
+        set_name : str
+            The name of the dataloader the inputs came from.
+
+        Returns
+        -------
+        tuple of torch.Tensor
+            The transformed inputs.
+
+        Notes
+        -----
+        Datasets created with ``fused_transform=True`` return uint8 images and
+        leave conversion to float and normalization to their
+        ``batch_transform``. This is applied here, after the inputs have been
+        moved to ``self.device``.
+        """
+        batch_transform = getattr(
+            self.dataloaders[set_name].dataset, "batch_transform", None
+        )
+        if batch_transform is None:
+            return inputs
+        return tuple(batch_transform(input) for input in inputs)
+
+    @staticmethod
+    def _get_logits(out):
+        try:
+            out = out.logits
+        except AttributeError as err:
+            raise AttributeError(err.message)
+        return out
+
+    def calculate_add_metrics(
+        self,
+        y_true,
+        y_pred,
+        y_score,
+        phase: str,
+        epoch: int | None = -1,
+        tboard_writer=None,
+    ) -> None:
+        """
+        Calculate and add metrics to the classifier's metrics dictionary.
+
+        Parameters
+        ----------
+        y_true : array-like of shape (n_samples,)
+            True binary labels or multiclass labels. Can be considered ground
+            truth or (correct) target values.
+
+        y_pred : array-like of shape (n_samples,)
+            Predicted binary labels or multiclass labels. The estimated
+            targets as returned by a classifier.
+
+        y_score : array-like of shape (n_samples, n_classes)
+            Predicted probabilities for each class. Only required when
+            ``y_pred`` is not binary.
+
+        phase : str
+            Name of the current phase, typically ``"train"`` or ``"val"``. See
+            ``train`` function.
+
+        epoch : int, optional
+            Current epoch number. Default is ``-1``.
+
+        tboard_writer : object, optional
+            TensorBoard SummaryWriter object to write the metrics. Default is
+            ``None``.
+
+        Returns
+        -------
+        None
+
+        Notes
+        -----
+        The metrics are calculated from a confusion matrix using
+        :class:`~.classify.metrics.MetricsAccumulator`, giving the same
+        results as ``scikit-learn``'s
+        :func:`sklearn.metrics.precision_recall_fscore_support` for each
+        average type (``"micro"``, ``"macro"`` and ``"weighted"``) and for
+        each label. ROC-AUC is approximated from a histogram of the scores.
+        The results are then added to the ``metrics`` dictionary. It also
+        writes the metrics to the TensorBoard SummaryWriter, if
+        ``tboard_writer`` is not None.
+        """
+        y_true = torch.as_tensor(np.asarray(y_true)).long()
+        y_pred = torch.as_tensor(np.asarray(y_pred)).long()
+        y_score = torch.as_tensor(np.asarray(y_score, dtype=np.float32))
+
+        num_classes = max(
+            y_score.shape[-1], int(y_true.max()) + 1, int(y_pred.max()) + 1
+        )
+        accumulator = MetricsAccumulator(num_classes)
+        accumulator.update(y_true, y_pred, y_score)
+        self._add_accumulated_metrics(accumulator, phase, epoch, tboard_writer)
+
+    def _add_timing_metrics(
+        self,
+        timer: PhaseTimer,
+        phase: str,
+        epoch: int | None = -1,
+        tboard_writer=None,
+        verbose: bool = False,
+    ) -> None:
+        """
+        Add the time breakdown and throughput from a ``PhaseTimer`` to the
+        classifier's metrics dictionary (see ``train_core``).
+
+        Parameters
+        ----------
+        timer : PhaseTimer
+            The timer for the phase.
+        phase : str
+            Name of the current phase, typically ``"train"`` or ``"val"``.
+        epoch : int, optional
+            Current epoch number. Default is ``-1``.
+        tboard_writer : object, optional
+            TensorBoard SummaryWriter object to write the metrics. Default is
+            ``None``.
+        verbose : bool, optional
+            Whether to print the time breakdown, by default ``False``.
+        """
+        summary = timer.summary()
+
+        for section in timer.sections:
+            self._add_metrics(f"epoch_time_{section}_{phase}", summary[section])
+            if tboard_writer is not None:
+                tboard_writer.add_scalar(
+                    f"Time/{phase}/{section}", summary[section], epoch
+                )
+        self._add_metrics(f"epoch_time_total_{phase}", summary["total"])
+        self._add_metrics(f"epoch_samples_per_sec_{phase}", summary["samples_per_sec"])
+        if tboard_writer is not None:
+            tboard_writer.add_scalar(
+                f"Throughput/{phase}", summary["samples_per_sec"], epoch
+            )
+
+        if verbose:
+            time_msg = "; ".join(
+                f"{section}: {summary[section]:.2f}s" for section in timer.sections
+            )
+            self.cprint(
+                "[INFO]",
+                "lgrey",
+                f"{phase: <8} -- {time_msg} -- {summary['samples_per_sec']:.1f} samples/sec",
+            )
+
+    def _start_profiler(self):
+        """Start a ``torch.profiler`` profile of the CPU (and CUDA) activity."""
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.device(self.device).type == "cuda":
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        profiler = torch.profiler.profile(activities=activities)
+        profiler.start()
+        return profiler
+
+    @staticmethod
+    def _stop_profiler(profiler, profile_dir: str | None = None) -> None:
+        """Stop a profiler, print a summary and optionally save its trace."""
+        profiler.stop()
+        print(
+            profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=15)
+        )
+        if profile_dir is not None:
+            os.makedirs(profile_dir, exist_ok=True)
+            trace_path = os.path.join(profile_dir, "trace.json")
+            profiler.export_chrome_trace(trace_path)
+            print(f'[INFO] Profiler trace saved to "{trace_path}".')
+
+    def _add_accumulated_metrics(
+        self,
+        accumulator: MetricsAccumulator,
+        phase: str,
+        epoch: int | None = -1,
+        tboard_writer=None,
+    ) -> None:
+        """
+        Add the metrics from a ``MetricsAccumulator`` to the classifier's
+        metrics dictionary (see ``calculate_add_metrics``).
+
+        Parameters
+        ----------
+        accumulator : MetricsAccumulator
+            The accumulator containing the counts for the epoch.
+        phase : str
+            Name of the current phase, typically ``"train"`` or ``"val"``.
+        epoch : int, optional
+            Current epoch number. Default is ``-1``.
+        tboard_writer : object, optional
+            TensorBoard SummaryWriter object to write the metrics. Default is
+            ``None``.
+        """
+        results = accumulator.compute()
+
+        for avrg in ["micro", "macro", "weighted"]:
+            prec, rcall, fscore, supp = results[avrg]
             self._add_metrics(f"epoch_prec_{avrg}_{phase}", prec * 100.0)
             self._add_metrics(f"epoch_recall_{avrg}_{phase}", rcall * 100.0)
             self._add_metrics(f"epoch_fscore_{avrg}_{phase}", fscore * 100.0)
@@ -1139,36 +2273,17 @@ Use ``add_loss_fn`` to define one."
                     epoch,
                 )
 
-            # --- compute ROC AUC
-            if y_score.shape[1] == 2:
-                # ---- binary case
-                # From scikit-learn:
-                #     The probability estimates correspond to the probability
-                #     of the class with the greater label, i.e.
-                #     estimator.classes_[1] and thus
-                #     estimator.predict_proba(X, y)[:, 1]
-                roc_auc = roc_auc_score(y_true, y_score[:, 1], average=avrg)
-            elif (y_score.shape[1] != 2) and (avrg in ["macro", "weighted"]):
-                # ---- multiclass
-                # In the multiclass case, it corresponds to an array of shape
-                # (n_samples, n_classes)
-                try:
-                    roc_auc = roc_auc_score(
-                        y_true, y_score, average=avrg, multi_class="ovr"
-                    )
-                except:
-                    continue
-            else:
-                continue
-
-            self._add_metrics(f"epoch_rocauc_{avrg}_{phase}", roc_auc * 100.0)
+            if avrg in results["rocauc"]:
+                self._add_metrics(
+                    f"epoch_rocauc_{avrg}_{phase}", results["rocauc"][avrg] * 100.0
+                )
 
-        prfs = precision_recall_fscore_support(y_true, y_pred, average=None)
-        for i in range(len(prfs[0])):
-            self._add_metrics(f"epoch_prec_{i}_{phase}", prfs[0][i] * 100.0)
-            self._add_metrics(f"epoch_recall_{i}_{phase}", prfs[1][i] * 100.0)
-            self._add_metrics(f"epoch_fscore_{i}_{phase}", prfs[2][i] * 100.0)
-            self._add_metrics(f"epoch_supp_{i}_{phase}", prfs[3][i])
+        labels, prec, rcall, fscore, supp = results["per_class"]
+        for i in range(len(labels)):
+            self._add_metrics(f"epoch_prec_{i}_{phase}", prec[i] * 100.0)
+            self._add_metrics(f"epoch_recall_{i}_{phase}", rcall[i] * 100.0)
+            self._add_metrics(f"epoch_fscore_{i}_{phase}", fscore[i] * 100.0)
+            self._add_metrics(f"epoch_supp_{i}_{phase}", supp[i])
 
             if tboard_writer is not None:
                 tboard_writer.add_scalar(
@@ -1529,6 +2644,7 @@ Output will show batch number {num_batches}.'
         for _ in range(batch_number):
             # Get a batch of training data
             inputs, labels, label_indices = next(dl_iter)
+        inputs = self._apply_batch_transform(inputs, set_name)
 
         # Make a grid from batch
         for input in inputs:
@@ -1661,6 +2777,7 @@ Output will show batch number {num_batches}.'
         with torch.no_grad():
             for inputs, _labels, label_indices in iter(self.dataloaders[set_name]):
                 inputs = tuple(input.to(self.device) for input in inputs)
+                inputs = self._apply_batch_transform(inputs, set_name)
                 label_indices = label_indices.to(self.device)
 
                 outputs = self.model(*inputs)
@@ -1737,33 +2854,572 @@ Output will show batch number {num_batches}.'
         ``joblib.dump`` function. The object's ``model`` attribute is excluded
         from this dictionary and saved separately using the ``torch.save``
         function, with a filename derived from the original ``save_path``.
+
+        Each file is written to a temporary file first and then moved into
+        place, so an interrupted save does not leave a corrupt file.
+
+        This saves the whole object, including any dataloaders (and their
+        datasets). To save only the model/optimizer/scheduler states and
+        metrics, use ``save_checkpoint`` instead.
         """
-        if os.path.isfile(save_path):
-            if force:
-                os.remove(save_path)
-            else:
-                raise FileExistsError(f"[INFO] File already exists: {save_path}")
+        if os.path.isfile(save_path) and not force:
+            raise FileExistsError(f"[INFO] File already exists: {save_path}")
 
         # parent/base-names
         par_name = os.path.dirname(os.path.abspath(save_path))
         base_name = os.path.basename(os.path.abspath(save_path))
 
         # Extract model, write it separately using torch.save
-        obj2write = copy.deepcopy(self.__dict__)
-        mymodel = obj2write["model"]
-        del obj2write["model"]
+        obj2write = {k: v for k, v in self.__dict__.items() if k != "model"}
 
         os.makedirs(par_name, exist_ok=True)
-        with open(save_path, "wb") as myfile:
-            # pickle.dump(self.__dict__, myfile)
-            joblib.dump(obj2write, myfile)
-
-        torch.save(mymodel, os.path.join(par_name, f"model_{base_name}"))
-        torch.save(
-            mymodel.state_dict(),
+        self._atomic_write(save_path, lambda f: joblib.dump(obj2write, f))
+        self._atomic_write(
+            os.path.join(par_name, f"model_{base_name}"),
+            lambda f: torch.save(self.model, f),
+        )
+        self._atomic_write(
             os.path.join(par_name, f"model_state_dict_{base_name}"),
+            lambda f: torch.save(self.model.state_dict(), f),
+        )
+
+    @staticmethod
+    def _atomic_write(save_path: str, write_fn) -> None:
+        """
+        Write a file by passing a file object to ``write_fn``, first writing
+        to a temporary file in the same directory and then replacing
+        ``save_path`` with it.
+        """
+        tmp_path = f"{save_path}.tmp{os.getpid()}"
+        try:
+            with open(tmp_path, "wb") as myfile:
+                write_fn(myfile)
+            os.replace(tmp_path, save_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def save_checkpoint(
+        self,
+        save_path: str | None = "checkpoint.pt",
+        force: bool | None = False,
+    ) -> None:
+        """
+        Save a lightweight checkpoint of the model and training state.
+
+        Parameters
+        ----------
+        save_path : str, optional
+            The path to the file to write.
+            If the file already exists and ``force`` is not ``True``, a ``FileExistsError`` is raised.
+            Defaults to ``"checkpoint.pt"``.
+        force : bool, optional
+            Whether to overwrite the file if it already exists. Defaults to
+            ``False``.
+
+        Raises
+        ------
+        FileExistsError
+            If the file already exists and ``force`` is not ``True``.
+
+        Notes
+        -----
+        Unlike ``save``, only the model, optimizer and scheduler state dicts,
+        the metrics, labels map and epoch/loss information are saved (i.e. no
+        dataloaders or datasets). The checkpoint is written with
+        ``torch.save`` to a temporary file which is then moved into place.
+
+        Use ``load_checkpoint`` to load the checkpoint into a
+        ``ClassifierContainer`` with the same model architecture.
+        """
+        if os.path.isfile(save_path) and not force:
+            raise FileExistsError(f"[INFO] File already exists: {save_path}")
+
+        checkpoint = {
+            "model_state_dict": self.model.state_dict(),
+            "optimizer_state_dict": (
+                self.optimizer.state_dict() if self.optimizer is not None else None
+            ),
+            "scheduler_state_dict": (
+                self.scheduler.state_dict() if self.scheduler is not None else None
+            ),
+            "metrics": {
+                k: [
+                    v.item() if isinstance(v, (np.generic, torch.Tensor)) else v
+                    for v in vals
+                ]
+                for k, vals in self.metrics.items()
+            },
+            "labels_map": self.labels_map,
+            "last_epoch": self.last_epoch,
+            "best_loss": float(self.best_loss),
+            "best_epoch": self.best_epoch,
+        }
+
+        os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
+        self._atomic_write(save_path, lambda f: torch.save(checkpoint, f))
+
+    def load_checkpoint(
+        self,
+        load_path: str,
+        remove_after_load: bool = False,
+    ) -> None:
+        """
+        Load a checkpoint saved using ``save_checkpoint``.
+
+        Parameters
+        ----------
+        load_path : str
+            Path to the checkpoint file.
+        remove_after_load : bool, optional
+            Whether to remove the checkpoint file after loading it, by
+            default ``False``.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the specified file does not exist.
+
+        Notes
+        -----
+        The model must have the same architecture as the one used to create
+        the checkpoint. Optimizer and scheduler states are only loaded if an
+        optimizer/scheduler has been added to the object.
+        """
+        if not os.path.isfile(load_path):
+            raise FileNotFoundError(f'[ERROR] "{load_path}" cannot be found.')
+
+        print(f'[INFO] Loading "{load_path}".')
+        checkpoint = torch.load(load_path, map_location=self.device)
+
+        self.model.load_state_dict(checkpoint["model_state_dict"])
+        if (
+            self.optimizer is not None
+            and checkpoint["optimizer_state_dict"] is not None
+        ):
+            self.optimizer.load_state_dict(checkpoint["optimizer_state_dict"])
+        if (
+            self.scheduler is not None
+            and checkpoint["scheduler_state_dict"] is not None
+        ):
+            self.scheduler.load_state_dict(checkpoint["scheduler_state_dict"])
+
+        self.metrics = checkpoint["metrics"]
+        self.labels_map = checkpoint["labels_map"]
+        self.last_epoch = checkpoint["last_epoch"]
+        self.best_loss = torch.tensor(checkpoint["best_loss"])
+        self.best_epoch = checkpoint["best_epoch"]
+
+        if remove_after_load:
+            os.remove(load_path)
+
+    def export_model(
+        self,
+        save_path: str,
+        export_format: str = "torchscript",
+        quantize: bool = False,
+        num_inputs: int | None = None,
+        opset_version: int = 17,
+    ) -> str:
+        """
+        Export the model to TorchScript or ONNX for fast CPU inference using
+        :class:`~.classify.predictor.ExportedPredictor`.
+
+        Parameters
+        ----------
+        save_path : str
+            The path to save the exported model to (e.g. ``"model.pt"`` for
+            TorchScript or ``"model.onnx"`` for ONNX). The labels map and
+            input size are saved alongside the model, in ``save_path`` +
+            ``".json"``.
+        export_format : str, optional
+            The format to export to, either ``"torchscript"`` or ``"onnx"``.
+            By default ``"torchscript"``.
+        quantize : bool, optional
+            Whether to apply int8 dynamic quantization to the linear layers
+            of the exported model (``torch.ao.quantization.quantize_dynamic``
+            for TorchScript, ``onnxruntime.quantization.quantize_dynamic`` for
+            ONNX). By default ``False``.
+        num_inputs : int or None, optional
+            The number of inputs the model takes (e.g. ``2`` for models using
+            ``PatchContextDataset``). If ``None``, this is inferred from the
+            first dataloader, or set to ``1`` if there are no dataloaders.
+            By default ``None``.
+        opset_version : int, optional
+            The ONNX opset version to use, by default ``17``.
+
+        Returns
+        -------
+        str
+            The path to the exported model.
+
+        Raises
+        ------
+        ValueError
+            If ``export_format`` is not one of "torchscript" or "onnx".
+        ImportError
+            If exporting to ONNX and ``onnx`` (or, if quantizing,
+            ``onnxruntime``) is not installed.
+
+        Notes
+        -----
+        Exported models use a dynamic batch size. They do not need the
+        model's class definitions (e.g. ``custom_models.twoParallelModels``)
+        to be loaded.
+        """
+        if export_format not in ["torchscript", "onnx"]:
+            raise ValueError(
+                '[ERROR] ``export_format`` must be one of "torchscript" or "onnx".'
+            )
+
+        if num_inputs is None:
+            num_inputs = 1
+            for dataloader in self.dataloaders.values():
+                if len(dataloader.dataset):
+                    num_inputs = len(dataloader.dataset[0][0])
+                    break
+
+        input_size = self.input_size
+        if isinstance(input_size, int):
+            input_size = (input_size, input_size)
+
+        # export a CPU copy of the model, returning logits only
+        model = _ExportWrapper(copy.deepcopy(self.model).cpu().eval())
+        if quantize and export_format == "torchscript":
+            model = torch.ao.quantization.quantize_dynamic(
+                model, {nn.Linear}, dtype=torch.qint8
+            )
+        example_inputs = tuple(
+            torch.randn(2, 3, *input_size) for _ in range(num_inputs)
         )
 
+        save_path = os.path.abspath(save_path)
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+
+        with torch.no_grad():
+            if export_format == "torchscript":
+                traced = torch.jit.trace(model, example_inputs)
+                traced.save(save_path)
+            else:
+                try:
+                    import onnx  # noqa: F401
+                except ImportError:
+                    raise ImportError(
+                        "[ERROR] Exporting to ONNX requires onnx. Please install it using ``pip install onnx onnxruntime``."
+                    )
+                input_names = [f"input_{i}" for i in range(num_inputs)]
+                torch.onnx.export(
+                    model,
+                    example_inputs,
+                    save_path,
+                    input_names=input_names,
+                    output_names=["logits"],
+                    dynamic_axes={
+                        name: {0: "batch_size"} for name in input_names + ["logits"]
+                    },
+                    opset_version=opset_version,
+                )
+                if quantize:
+                    try:
+                        from onnxruntime.quantization import QuantType, quantize_dynamic
+                    except ImportError:
+                        raise ImportError(
+                            "[ERROR] Quantizing ONNX models requires onnxruntime. Please install it using ``pip install onnxruntime``."
+                        )
+                    fp32_path = f"{save_path}.fp32"
+                    os.replace(save_path, fp32_path)
+                    try:
+                        # as for TorchScript, only quantize linear layers
+                        # (ConvInteger is not supported on CPU)
+                        quantize_dynamic(
+                            fp32_path,
+                            save_path,
+                            op_types_to_quantize=["MatMul", "Gemm"],
+                            weight_type=QuantType.QInt8,
+                        )
+                    finally:
+                        os.remove(fp32_path)
+
+        with open(f"{save_path}.json", "w") as f:
+            json.dump(
+                {
+                    "export_format": export_format,
+                    "labels_map": {str(k): v for k, v in self.labels_map.items()},
+                    "input_size": list(input_size),
+                    "num_inputs": num_inputs,
+                    "quantized": quantize,
+                },
+                f,
+            )
+
+        print(f"[INFO] Exported model to {save_path}.")
+        return save_path
+
+    def quantize_model(
+        self,
+        method: str = "dynamic",
+        calibration_set: str | None = "val",
+        num_calibration_batches: int | None = 10,
+        backend: str | None = None,
+        inplace: bool = False,
+    ) -> nn.Module:
+        """
+        Apply post-training int8 quantization to the model for CPU inference.
+
+        Parameters
+        ----------
+        method : str, optional
+            The quantization method, either ``"dynamic"`` (weights of linear
+            layers are quantized ahead of time, activations on the fly) or
+            ``"static"`` (weights and activations of all supported layers
+            are quantized, using a calibration pass over
+            ``calibration_set``). By default ``"dynamic"``.
+        calibration_set : str or None, optional
+            The name of the dataloader to use for calibration (static
+            quantization only). This should be a held-out dataset, by default
+            ``"val"``.
+        num_calibration_batches : int or None, optional
+            The number of batches to use for calibration. If ``None``, all
+            batches are used. By default ``10``.
+        backend : str or None, optional
+            The quantization backend (e.g. ``"x86"``, ``"fbgemm"`` or
+            ``"qnnpack"``). If ``None``, uses
+            ``torch.backends.quantized.engine``. By default ``None``.
+        inplace : bool, optional
+            Whether to replace ``self.model`` with the quantized model (and
+            set ``self.device`` to ``"cpu"``). By default ``False``.
+
+        Returns
+        -------
+        nn.Module
+            The quantized model (on the CPU).
+
+        Raises
+        ------
+        ValueError
+            If ``method`` is not one of "dynamic" or "static".
+
+        Notes
+        -----
+        Static quantization uses FX graph mode quantization
+        (``torch.ao.quantization.quantize_fx``), so the model must be
+        symbolically traceable. This works for the torchvision models
+        created by ``_initialize_model``.
+        """
+        if method not in ["dynamic", "static"]:
+            raise ValueError('[ERROR] ``method`` must be one of "dynamic" or "static".')
+
+        if backend is not None:
+            torch.backends.quantized.engine = backend
+        backend = torch.backends.quantized.engine
+
+        model = copy.deepcopy(self.model).cpu().eval()
+
+        if method == "dynamic":
+            model = torch.ao.quantization.quantize_dynamic(
+                model, {nn.Linear}, dtype=torch.qint8
+            )
+        else:
+            from torch.ao.quantization import get_default_qconfig_mapping
+            from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+            if calibration_set not in self.dataloaders.keys():
+                raise KeyError(
+                    f'[ERROR] "{calibration_set}" dataloader cannot be found in dataloaders.'
+                )
+            batches = self._iter_cpu_batches(
+                calibration_set, num_batches=num_calibration_batches
+            )
+            example_inputs = next(batches)[0]
+            model = prepare_fx(
+                model, get_default_qconfig_mapping(backend), example_inputs
+            )
+            print(f'[INFO] Calibrating on "{calibration_set}".')
+            with torch.no_grad():
+                model(*example_inputs)
+                for inputs, _ in batches:
+                    model(*inputs)
+            model = convert_fx(model)
+
+        if inplace:
+            self.model = model
+            self.device = torch.device("cpu")
+        return model
+
+    def prune_model(
+        self,
+        amount: float = 0.3,
+        inplace: bool = False,
+    ) -> nn.Module:
+        """
+        Apply structured (L2-norm) channel pruning to the model, removing the
+        pruned channels so the model is smaller and faster.
+
+        Parameters
+        ----------
+        amount : float, optional
+            The fraction of output channels to remove from each prunable
+            convolutional layer, by default ``0.3``.
+        inplace : bool, optional
+            Whether to replace ``self.model`` with the pruned model, by
+            default ``False``.
+
+        Returns
+        -------
+        nn.Module
+            The pruned model.
+
+        Raises
+        ------
+        ValueError
+            If ``amount`` is not between 0 and 1 or the model cannot be
+            traced with ``torch.fx``.
+
+        Notes
+        -----
+        The model is traced with ``torch.fx`` to find convolutional layers
+        whose output only feeds another convolutional layer (possibly
+        through batch norm, activation, pooling or dropout layers), e.g. the
+        first convolution of each ResNet block. For each of these, the
+        output channels with the smallest L2-norm are removed, along with
+        the matching batch norm channels and input channels of the next
+        convolution. Layers whose outputs are added to or concatenated with
+        other tensors (e.g. residual connections), grouped convolutions and
+        the final classification layer are never pruned. You will normally
+        need to fine-tune the pruned model to recover its accuracy. Use
+        ``benchmark_models`` to compare the pruned model against the
+        original.
+        """
+        if not 0 <= amount < 1:
+            raise ValueError("[ERROR] ``amount`` must be between 0 and 1.")
+
+        model = self.model if inplace else copy.deepcopy(self.model)
+        try:
+            n_pruned = prune_conv_channels(model, amount)
+        except Exception as err:
+            raise ValueError(
+                f"[ERROR] Your model cannot be traced with torch.fx, so it cannot be pruned ({err})."
+            )
+        print(f"[INFO] Pruned {n_pruned} convolutional layers.")
+        return model
+
+    def benchmark_models(
+        self,
+        models: dict[str, nn.Module] | None = None,
+        set_name: str | None = "val",
+        num_batches: int | None = None,
+        num_threads: int | None = None,
+    ) -> pd.DataFrame:
+        """
+        Compare the accuracy and CPU throughput of models (e.g. the original
+        model and quantized/pruned versions of it) on a dataset.
+
+        Parameters
+        ----------
+        models : dict or None, optional
+            A dictionary mapping names to models to compare. ``self.model`` is
+            always included (as "fp32"). By default ``None``.
+        set_name : str, optional
+            The name of the dataloader to use, by default ``"val"``.
+        num_batches : int or None, optional
+            The number of batches to use. If ``None``, all batches are used.
+            By default ``None``.
+        num_threads : int or None, optional
+            The number of CPU threads to use. If ``None``, uses the default.
+            By default ``None``.
+
+        Returns
+        -------
+        pandas.DataFrame
+            A DataFrame with one row per model, containing the accuracy and
+            macro F-score (as percentages), the throughput (samples per
+            second, counting only time spent in the model), the speed-up
+            compared to "fp32" and the size of the model's state dict (MB).
+        """
+        if set_name not in self.dataloaders.keys():
+            raise KeyError(
+                f'[ERROR] "{set_name}" dataloader cannot be found in dataloaders.'
+            )
+        num_threads_default = torch.get_num_threads()
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+        try:
+            report = self._benchmark_models(models, set_name, num_batches)
+        finally:
+            torch.set_num_threads(num_threads_default)
+
+        report = pd.DataFrame(report).set_index("model")
+        report["speedup"] = (
+            report["samples_per_sec"] / report.loc["fp32", "samples_per_sec"]
+        )
+        print(report.to_string(float_format="{:.2f}".format))
+        return report
+
+    def _benchmark_models(
+        self,
+        models: dict[str, nn.Module] | None,
+        set_name: str,
+        num_batches: int | None,
+    ) -> list[dict]:
+        """Run each model on the CPU and collect its metrics (see ``benchmark_models``)."""
+        models = {"fp32": copy.deepcopy(self.model).cpu(), **(models or {})}
+        batches = list(self._iter_cpu_batches(set_name, num_batches=num_batches))
+
+        report = []
+        for name, model in models.items():
+            model.eval()
+            metrics = MetricsAccumulator(roc_auc_bins=None)
+            n_samples = 0
+            model_time = 0.0
+            with torch.no_grad():
+                for inputs, label_indices in batches:
+                    since = time.perf_counter()
+                    outputs = model(*inputs)
+                    model_time += time.perf_counter() - since
+                    if not isinstance(outputs, torch.Tensor):
+                        outputs = self._get_logits(outputs)
+                    outputs = outputs.float()
+                    metrics.update(label_indices, outputs.argmax(dim=1), outputs)
+                    n_samples += len(label_indices)
+
+            results = metrics.compute()
+            n = metrics.num_classes
+            cm = metrics.confusion_matrix.view(n, n)
+            accuracy = float(cm.diag().sum()) / max(int(cm.sum()), 1)
+            state_dict_size = sum(self._nbytes(v) for v in model.state_dict().values())
+            report.append(
+                {
+                    "model": name,
+                    "accuracy": 100.0 * accuracy,
+                    "fscore_macro": 100.0 * results["macro"][2],
+                    "samples_per_sec": n_samples / model_time if model_time else np.nan,
+                    "size_mb": state_dict_size / 1e6,
+                }
+            )
+        return report
+
+    @classmethod
+    def _nbytes(cls, value: Any) -> int:
+        """Size (in bytes) of the tensors in a state dict value."""
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(cls._nbytes(v) for v in value)
+        return 0
+
+    def _iter_cpu_batches(self, set_name: str, num_batches: int | None = None):
+        """
+        Yield batches of (transformed) inputs and label indices from a
+        dataloader, on the CPU.
+        """
+        for batch_idx, (inputs, _labels, label_indices) in enumerate(
+            self.dataloaders[set_name]
+        ):
+            if num_batches is not None and batch_idx >= num_batches:
+                break
+            inputs = self._apply_batch_transform(inputs, set_name)
+            yield tuple(input.cpu() for input in inputs), label_indices
+
     def save_predictions(
         self,
         set_name: str,
@@ -1779,6 +3435,8 @@ Output will show batch number {num_batches}.'
         patch_df["predicted_label"] = self.pred_label
         patch_df["pred"] = self.pred_label_indices
         patch_df["conf"] = np.array(self.pred_conf).max(axis=1)
+        if getattr(self, "pred_stage", None) is not None:
+            patch_df["cascade_stage"] = self.pred_stage
 
         if save_path is None:
             save_path = f"{set_name}_predictions_patch_df.csv"
@@ -1793,6 +3451,7 @@ Output will show batch number {num_batches}.'
         sampler: Sampler | None | None = None,
         shuffle: bool | None = False,
         num_workers: int | None = 0,
+        auto_tune: bool | dict = False,
         **kwargs,
     ) -> None:
         """Creates a DataLoader from a PatchDataset and adds it to the ``dataloaders`` dictionary.
@@ -1811,10 +3470,33 @@ Output will show batch number {num_batches}.'
             Whether to shuffle the PatchDataset, by default False
         num_workers : Optional[int], optional
             The number of worker threads to use for loading data, by default 0.
+        auto_tune : Union[bool, dict], optional
+            Whether to benchmark a few DataLoader configurations (running
+            ``self.model`` in inference mode on each batch) and use the
+            fastest. If a dictionary, it is passed as keyword arguments to
+            :func:`~.classify.dataloader_tuning.tune_dataloader` (e.g.
+            ``{"batch_sizes": [32, 64], "memory_budget_mb": 2000}``). The
+            chosen settings override ``batch_size``, ``num_workers`` and any
+            of ``pin_memory``, ``persistent_workers`` and ``prefetch_factor``
+            and are printed so they can be pinned. By default False.
         """
         if sampler and shuffle:
             print("[INFO] ``sampler`` is defined so train dataset will be unshuffled.")
 
+        if auto_tune:
+            tune_kwargs = auto_tune if isinstance(auto_tune, dict) else {}
+            settings, _ = tune_dataloader(
+                dataset,
+                model=self.model,
+                device=self.device,
+                sampler=sampler,
+                shuffle=shuffle,
+                **tune_kwargs,
+            )
+            batch_size = settings.pop("batch_size")
+            num_workers = settings.pop("num_workers")
+            kwargs.update(settings)
+
         dataloader = DataLoader(
             dataset,
             batch_size=batch_size,
@@ -2012,3 +3694,17 @@ Output will show batch number {num_batches}.'
         text = f"\r[{'#'*block + '-'*(barLength-block)}] {progress*100:.1f}% {status} {text}"  # noqa
         sys.stdout.write(text)
         sys.stdout.flush()
+
+
+class _ExportWrapper(nn.Module):
+    """Wrap a model so it returns a logits tensor, for exporting."""
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, *inputs: torch.Tensor) -> torch.Tensor:
+        outputs = self.model(*inputs)
+        if not isinstance(outputs, torch.Tensor):
+            outputs = outputs.logits
+        return outputs
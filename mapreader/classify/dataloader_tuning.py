@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+import os
+import time
+
+import pandas as pd
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+
+def _sample_nbytes(dataset: Dataset) -> int:
+    """Size (in bytes) of the inputs of one (transformed) sample."""
+    inputs = dataset[0][0]
+    if isinstance(inputs, torch.Tensor):
+        inputs = (inputs,)
+    return sum(input.numel() * input.element_size() for input in inputs)
+
+
+def _benchmark_config(
+    dataset: Dataset,
+    loader_kwargs: dict,
+    num_batches: int,
+    model: nn.Module | None,
+    device: torch.device,
+) -> float:
+    """Throughput (samples/sec) of one DataLoader configuration."""
+    batch_transform = getattr(dataset, "batch_transform", None)
+    non_blocking = loader_kwargs.get("pin_memory", False)
+
+    def run_batch(batch) -> int:
+        inputs, _labels, _label_indices = batch
+        inputs = tuple(input.to(device, non_blocking=non_blocking) for input in inputs)
+        if batch_transform is not None:
+            inputs = tuple(batch_transform(input) for input in inputs)
+        if model is not None:
+            with torch.no_grad():
+                model(*inputs)
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+        return len(inputs[0])
+
+    loader = DataLoader(dataset, **loader_kwargs)
+    batches = iter(loader)
+    since = time.perf_counter()
+    n_samples = run_batch(next(batches))
+
+    # don't count worker start-up unless there is only one batch
+    if len(loader) > 1:
+        since = time.perf_counter()
+        n_samples = 0
+    for _ in range(num_batches):
+        try:
+            n_samples += run_batch(next(batches))
+        except StopIteration:
+            break
+    elapsed = time.perf_counter() - since
+    del batches
+    return n_samples / elapsed if elapsed > 0 else float("inf")
+
+
+def tune_dataloader(
+    dataset: Dataset,
+    batch_sizes: list[int] | None = None,
+    num_workers: list[int] | None = None,
+    prefetch_factors: list[int] | None = None,
+    num_batches: int = 10,
+    memory_budget_mb: float | None = None,
+    model: nn.Module | None = None,
+    device: str | torch.device | None = None,
+    sampler: Sampler | None = None,
+    shuffle: bool = False,
+    verbose: bool = True,
+) -> tuple[dict, pd.DataFrame]:
+    """
+    Benchmark a few DataLoader configurations for a short burst of batches
+    and pick the fastest that fits within a memory budget.
+
+    The number of workers (and prefetch factor) is tuned first, using the
+    first batch size, and then the batch size is tuned using the best
+    number of workers.
+
+    Parameters
+    ----------
+    dataset : PatchDataset or PatchContextDataset
+        The dataset to load.
+    batch_sizes : list of int or None, optional
+        The batch sizes to try. If ``None``, uses ``[16, 32, 64, 128]``.
+        By default ``None``.
+    num_workers : list of int or None, optional
+        The numbers of workers to try. If ``None``, uses ``0``, ``2``,
+        ``4`` and ``8`` (up to the number of CPUs). By default ``None``.
+    prefetch_factors : list of int or None, optional
+        The prefetch factors to try (only used if ``num_workers > 0``). If
+        ``None``, uses ``[2, 4]``. By default ``None``.
+    num_batches : int, optional
+        The number of batches to time for each configuration, after one
+        warm-up batch. By default ``10``.
+    memory_budget_mb : float or None, optional
+        The maximum memory (in MB) a configuration may use. This is
+        estimated as the size of the batches held in memory at once (i.e.
+        ``num_workers * prefetch_factor`` prefetched batches plus the
+        current batch) plus, if running ``model`` on a CUDA device, the
+        peak GPU memory allocated. If ``None``, there is no budget. By
+        default ``None``.
+    model : nn.Module or None, optional
+        A model to run (in inference mode) on each batch, so that batch
+        sizes are tuned for inference. If ``None``, only data loading is
+        timed. By default ``None``.
+    device : str, torch.device or None, optional
+        The device to copy batches (and run ``model``) on. If ``None``,
+        uses ``"cuda"`` if available, else ``"cpu"``. By default ``None``.
+    sampler : Sampler or None, optional
+        The sampler to use, by default ``None``.
+    shuffle : bool, optional
+        Whether to shuffle the dataset (ignored if ``sampler`` is set), by
+        default ``False``.
+    verbose : bool, optional
+        Whether to print the results of each configuration, by default
+        ``True``.
+
+    Returns
+    -------
+    tuple of dict and pandas.DataFrame
+        The chosen DataLoader keyword arguments (``batch_size``,
+        ``num_workers``, ``pin_memory`` and, if using workers,
+        ``persistent_workers`` and ``prefetch_factor``) and a DataFrame
+        of the results of each configuration tried.
+
+    Raises
+    ------
+    ValueError
+        If no configuration fits within ``memory_budget_mb``.
+    """
+    if batch_sizes is None:
+        batch_sizes = [16, 32, 64, 128]
+    if num_workers is None:
+        num_workers = [n for n in [0, 2, 4, 8] if n <= (os.cpu_count() or 1)]
+    if prefetch_factors is None:
+        prefetch_factors = [2, 4]
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    device = torch.device(device)
+    pin_memory = device.type == "cuda"
+
+    model_was_training = model is not None and model.training
+    if model is not None:
+        model = model.to(device).eval()
+
+    sample_nbytes = _sample_nbytes(dataset)
+    results = []
+
+    def try_config(batch_size: int, n_workers: int, prefetch_factor: int | None):
+        loader_kwargs = {
+            "batch_size": batch_size,
+            "sampler": sampler,
+            "shuffle": shuffle if sampler is None else False,
+            "num_workers": n_workers,
+            "pin_memory": pin_memory,
+        }
+        if n_workers > 0:
+            loader_kwargs["prefetch_factor"] = prefetch_factor
+
+        if device.type == "cuda":
+            torch.cuda.reset_peak_memory_stats(device)
+        samples_per_sec = _benchmark_config(
+            dataset, loader_kwargs, num_batches, model, device
+        )
+
+        batches_in_memory = n_workers * (prefetch_factor or 0) + 1
+        memory_mb = batch_size * sample_nbytes * batches_in_memory / 1024**2
+        if model is not None and device.type == "cuda":
+            memory_mb += torch.cuda.max_memory_allocated(device) / 1024**2
+
+        results.append(
+            {
+                "batch_size": batch_size,
+                "num_workers": n_workers,
+                "prefetch_factor": prefetch_factor,
+                "samples_per_sec": samples_per_sec,
+                "memory_mb": memory_mb,
+                "fits": memory_budget_mb is None or memory_mb <= memory_budget_mb,
+            }
+        )
+        if verbose:
+            print(
+                f"[INFO] batch_size={batch_size}, num_workers={n_workers}, prefetch_factor={prefetch_factor} -- "
+                f"{samples_per_sec:.1f} samples/sec, {memory_mb:.1f} MB"
+            )
+
+    def best(rows: list[dict]) -> dict:
+        rows = [row for row in rows if row["fits"]]
+        if not rows:
+            raise ValueError(
+                f"[ERROR] No DataLoader configuration fits within {memory_budget_mb} MB."
+            )
+        return max(rows, key=lambda row: row["samples_per_sec"])
+
+    try:
+        # --- workers (and prefetch factor) at the first batch size
+        for n_workers in num_workers:
+            for prefetch_factor in prefetch_factors if n_workers > 0 else [None]:
+                try_config(batch_sizes[0], n_workers, prefetch_factor)
+        chosen = best(results)
+
+        # --- batch size with the best workers
+        for batch_size in batch_sizes[1:]:
+            try_config(batch_size, chosen["num_workers"], chosen["prefetch_factor"])
+        chosen = best(results)
+    finally:
+        if model is not None:
+            model.train(model_was_training)
+
+    settings = {
+        "batch_size": chosen["batch_size"],
+        "num_workers": chosen["num_workers"],
+        "pin_memory": pin_memory,
+    }
+    if chosen["num_workers"] > 0:
+        settings["persistent_workers"] = True
+        settings["prefetch_factor"] = chosen["prefetch_factor"]
+
+    print(f"[INFO] Chosen DataLoader settings: {settings}.")
+    return settings, pd.DataFrame(results)
@@ -4,6 +4,8 @@ from __future__ import annotations
 import os
 import pathlib
 import re
+from ast import literal_eval
+from collections import defaultdict
 from itertools import product
 from typing import Callable
 
@@ -14,6 +16,16 @@ import torch
 from PIL import Image
 from torch.utils.data import DataLoader, Dataset
 from torchvision import transforms
+from torchvision.io import ImageReadMode, read_image
+
+# Use torchvision.transforms.v2 if available
+try:
+    from torchvision.transforms import v2 as transforms_v2
+
+    # ``scale`` was added to ``ToDtype`` in torchvision 0.16
+    transforms_v2.ToDtype(torch.float32, scale=True)
+except (ImportError, TypeError):
+    transforms_v2 = None
 
 # Import parhugin
 try:
@@ -26,7 +38,7 @@ except ImportError:
     )
     parhugin_installed = False
 
-from mapreader.utils.load_frames import eval_dataframe, load_from_csv, load_from_geojson
+from mapreader.utils.load_frames import load_from_csv, load_from_geojson
 
 
 class PatchDataset(Dataset):
@@ -52,6 +64,10 @@ class PatchDataset(Dataset):
         The name of the column containing the indices of the image labels. Default is None.
     image_mode : str, optional
         The color format to convert the image to. Default is "RGB".
+    fused_transform : bool, optional
+        Whether to use the fused uint8 version of the default transforms (only valid if ``transform`` is a string).
+        If True, images are decoded straight to uint8 tensors and resized/flipped per sample, while conversion to float and normalization are done on whole batches by ``batch_transform``.
+        Default is False.
 
     Attributes
     ----------
@@ -71,6 +87,9 @@ class PatchDataset(Dataset):
     transform : callable
         A callable object (a torchvision transform) that takes in an image
         and performs image transformations.
+    batch_transform : callable or None
+        A callable applied to each batch of images after collation (e.g. by
+        ``ClassifierContainer``). Only set if ``fused_transform=True``.
 
     Methods
     -------
@@ -91,6 +110,8 @@ class PatchDataset(Dataset):
         If ``label_index_col`` not in ``patch_df``.
     ValueError
         If ``transform`` passed as a string, but not one of "train", "test" or "val".
+    ValueError
+        If ``fused_transform`` is True, but ``transform`` is not passed as a string.
     """
 
     def __init__(
@@ -102,6 +123,7 @@ class PatchDataset(Dataset):
         label_col: str | None = None,
         label_index_col: str | None = None,
         image_mode: str | None = "RGB",
+        fused_transform: bool = False,
     ):
         if isinstance(patch_df, pd.DataFrame):
             self.patch_df = patch_df
@@ -151,23 +173,16 @@ class PatchDataset(Dataset):
                     print(
                         f"[INFO] Label index column ({label_index_col}) not in DataFrame. Creating column."
                     )
+                    index_map = {label: i for i, label in enumerate(self.unique_labels)}
                     self.patch_df[self.label_index_col] = self.patch_df[
                         self.label_col
-                    ].apply(self._get_label_index)
+                    ].map(index_map)
                 else:
                     raise ValueError(
                         f"[ERROR] Label index column ({label_index_col}) not in DataFrame."
                     )
 
-        if isinstance(transform, str):
-            if transform in ["train", "val", "test"]:
-                self.transform = self._default_transform(transform)
-            else:
-                raise ValueError(
-                    '[ERROR] ``transform`` can only be "train", "val" or "test" or, a transform.'
-                )
-        else:
-            self.transform = transform
+        self._set_transform(transform, fused_transform)
 
     def __len__(self) -> int:
         """
@@ -206,7 +221,10 @@ class PatchDataset(Dataset):
         img_path = self.patch_df.iloc[idx][self.patch_paths_col]
 
         if os.path.exists(img_path):
-            img = Image.open(img_path).convert(self.image_mode)
+            if self.fused_transform:
+                img = self._read_image_tensor(img_path)
+            else:
+                img = Image.open(img_path).convert(self.image_mode)
         else:
             raise ValueError(
                 f'[ERROR] "{img_path} cannot be found.\n\n\
@@ -265,10 +283,80 @@ Please check the image exists, your file paths are correct and that ``.patch_pat
 
         return img
 
+    def _set_transform(
+        self,
+        transform: str | (transforms.Compose | Callable),
+        fused_transform: bool = False,
+    ) -> None:
+        """Sets the ``transform``, ``batch_transform`` and ``fused_transform`` attributes.
+
+        Parameters
+        ----------
+        transform : str, transforms.Compose or Callable
+            The transform to use on the image (see ``PatchDataset``).
+        fused_transform : bool, optional
+            Whether to use the fused uint8 version of the default transforms, by default False.
+        """
+        if isinstance(transform, str):
+            if transform in ["train", "val", "test"]:
+                self.transform = self._default_transform(
+                    transform, fused=fused_transform
+                )
+            else:
+                raise ValueError(
+                    '[ERROR] ``transform`` can only be "train", "val" or "test" or, a transform.'
+                )
+        else:
+            if fused_transform:
+                raise ValueError(
+                    "[ERROR] ``fused_transform`` can only be used with the default transforms (``transform`` passed as a string)."
+                )
+            self.transform = transform
+
+        self.fused_transform = fused_transform
+        self.batch_transform = (
+            self._default_batch_transform() if fused_transform else None
+        )
+
+    def _read_image_tensor(self, img_path: str) -> torch.Tensor:
+        """Decodes an image straight to a uint8 tensor of shape (C, H, W).
+
+        Parameters
+        ----------
+        img_path : str
+            The path to the image.
+
+        Returns
+        -------
+        torch.Tensor
+            The decoded image.
+
+        Notes
+        -----
+        PNG and JPEG images are decoded using ``torchvision.io.read_image``.
+        Other formats (or image modes) fall back to PIL.
+        """
+        read_mode = {
+            "RGB": ImageReadMode.RGB,
+            "RGBA": ImageReadMode.RGB_ALPHA,
+            "L": ImageReadMode.GRAY,
+            "LA": ImageReadMode.GRAY_ALPHA,
+        }.get(self.image_mode)
+
+        if read_mode is not None:
+            try:
+                return read_image(str(img_path), mode=read_mode)
+            except RuntimeError:
+                pass
+        return transforms.functional.pil_to_tensor(
+            Image.open(img_path).convert(self.image_mode)
+        )
+
     def _default_transform(
         self,
         t_type: str | None = "train",
         resize: int | tuple[int, int] | None = (224, 224),
+        fused: bool = False,
     ) -> transforms.Compose:
         """
         Returns the default image transformations for the train, test and validation sets as a transforms.Compose.
@@ -280,6 +368,10 @@ Please check the image exists, your file paths are correct and that ``.patch_pat
             Default is "train".
         resize2 : int or Tuple[int, int], optional
             The size in pixels to resize the image to. Default is (224, 224).
+        fused : bool, optional
+            If True, return transforms which work on uint8 tensors and leave
+            conversion to float and normalization to ``_default_batch_transform``.
+            Default is False.
 
         Returns
         -------
@@ -295,6 +387,25 @@ Please check the image exists, your file paths are correct and that ``.patch_pat
 
         t_type = "val" if t_type == "test" else t_type  # test and val are synonymous
 
+        if fused:
+            tfms = transforms_v2 if transforms_v2 is not None else transforms
+            data_transforms = {
+                "train": tfms.Compose(
+                    [
+                        tfms.Resize(resize, antialias=True),
+                        tfms.RandomApply(
+                            [
+                                tfms.RandomHorizontalFlip(),
+                                tfms.RandomVerticalFlip(),
+                            ],
+                            p=0.5,
+                        ),
+                    ]
+                ),
+                "val": tfms.Compose([tfms.Resize(resize, antialias=True)]),
+            }
+            return data_transforms[t_type]
+
         data_transforms = {
             "train": transforms.Compose(
                 [
@@ -321,6 +432,33 @@ Please check the image exists, your file paths are correct and that ``.patch_pat
         }
         return data_transforms[t_type]
 
+    @staticmethod
+    def _default_batch_transform() -> transforms.Compose:
+        """
+        Returns the batch-wise part of the fused default transforms, i.e.
+        conversion of a uint8 batch of shape (B, C, H, W) to float and
+        normalization.
+
+        Returns
+        -------
+        transforms.Compose
+            A torchvision.transforms.Compose which can be applied to a whole batch of images.
+        """
+        normalize_mean = [0.485, 0.456, 0.406]
+        normalize_std = [0.229, 0.224, 0.225]
+
+        if transforms_v2 is not None:
+            to_float = transforms_v2.ToDtype(torch.float32, scale=True)
+            normalize = transforms_v2.Normalize(normalize_mean, normalize_std)
+            return transforms_v2.Compose([to_float, normalize])
+
+        return transforms.Compose(
+            [
+                transforms.ConvertImageDtype(torch.float32),
+                transforms.Normalize(normalize_mean, normalize_std),
+            ]
+        )
+
     def _get_label_index(self, label: str) -> int:
         """Gets the index of a label.
 
@@ -416,6 +554,9 @@ class PatchContextDataset(PatchDataset):
     parent_path : str, optional
         The path to the directory containing parent images. Default is
         "./maps".
+    fused_transform : bool, optional
+        Whether to use the fused uint8 version of the default transforms (see ``PatchDataset``).
+        Default is False.
 
     Attributes
     ----------
@@ -454,6 +595,7 @@ class PatchContextDataset(PatchDataset):
         context_dir: str | None = "./maps/maps_context",
         create_context: bool = False,
         parent_path: str | None = "./maps",
+        fused_transform: bool = False,
     ):
         if isinstance(patch_df, pd.DataFrame):
             self.patch_df = patch_df
@@ -521,23 +663,16 @@ class PatchContextDataset(PatchDataset):
                     print(
                         f"[INFO] Label index column ({label_index_col}) not in DataFrame. Creating column."
                     )
+                    index_map = {label: i for i, label in enumerate(self.unique_labels)}
                     self.patch_df[self.label_index_col] = self.patch_df[
                         self.label_col
-                    ].apply(self._get_label_index)
+                    ].map(index_map)
                 else:
                     raise ValueError(
                         f"[ERROR] Label index column ({label_index_col}) not in DataFrame."
                     )
 
-        if isinstance(transform, str):
-            if transform in ["train", "val", "test"]:
-                self.transform = self._default_transform(transform)
-            else:
-                raise ValueError(
-                    '[ERROR] ``transform`` can only be "train", "val" or "test" or, a transform.'
-                )
-        else:
-            self.transform = transform
+        self._set_transform(transform, fused_transform)
 
     def save_context(
         self,
@@ -567,42 +702,114 @@ class PatchContextDataset(PatchDataset):
         Notes
         -----
         Parhugin is a Python package for parallelizing computations across
-        multiple CPU cores. The method uses Parhugin to parallelize the
-        computation of saving parent patches to disk. When Parhugin is
-        installed and ``use_parhugin`` is set to True, the method parallelizes
-        the calling of the ``get_context_id`` method and its corresponding
-        arguments. If Parhugin is not installed or ``use_parhugin`` is set to
-        False, the method executes the loop over patch indices sequentially
-        instead.
+        multiple CPU cores. Patches are grouped by their parent image and
+        each group is saved as one job (see ``_save_context_parent``), so
+        each parent image is only read once. When Parhugin is installed and
+        ``use_parhugin`` is set to True, the jobs are run in parallel.
+        If Parhugin is not installed or ``use_parhugin`` is set to False, the
+        jobs are run sequentially instead.
+
+        Context images which already exist in ``context_dir`` are skipped
+        (unless ``overwrite=True``), so an interrupted run can be resumed by
+        calling this method again.
         """
+        context_index = self._get_context_index()
+
+        os.makedirs(self.context_dir, exist_ok=True)
+        existing = set() if overwrite else set(os.listdir(self.context_dir))
+
+        # group patches by parent, skipping those which are already saved
+        parent_groups = {}
+        for id in self.patch_df.index:
+            if id not in context_index["positions"]:
+                raise ValueError(f"[ERROR] '{id}' not found in ``total_df``.")
+            pos = context_index["positions"][id]
+            if os.path.basename(context_index["paths"][pos]) in existing:
+                continue
+            parent_id = context_index["bounds"][pos][0]
+            parent_groups.setdefault(parent_id, []).append(id)
+
+        num_skipped = len(self.patch_df) - sum(map(len, parent_groups.values()))
+        if num_skipped:
+            print(f"[INFO] Skipping {num_skipped} existing context images.")
+
+        list_jobs = [
+            [self._save_context_parent, (parent_id, ids, overwrite)]
+            for parent_id, ids in parent_groups.items()
+        ]
+        if len(list_jobs) == 0:
+            return
+
         if parhugin_installed and use_parhugin:
             my_proc = multiFunc(num_req_p=processors, sleep_time=sleep_time)
-            list_jobs = []
-            for id in self.patch_df.index:
-                list_jobs.append(
-                    [
-                        self.get_context_id(
-                            id,
-                            overwrite=overwrite,
-                            save_context=True,
-                            return_image=False,
-                        ),
-                        {},
-                    ]
-                )
-
             print(f"Total number of jobs: {len(list_jobs)}")
             # and then adding them to my_proc
             my_proc.add_list_jobs(list_jobs)
             my_proc.run_jobs()
         else:
-            for id in self.patch_df.index:
+            for func, args in list_jobs:
+                func(*args)
+
+    def _save_context_parent(
+        self,
+        parent_id: str,
+        ids: list,
+        overwrite: bool = False,
+    ) -> None:
+        """
+        Save context images for a group of patches from the same parent image.
+
+        Parameters
+        ----------
+        parent_id : str
+            The ID of the parent image.
+        ids : list
+            The IDs of the patches to save context images for.
+        overwrite : bool, optional
+            Whether to overwrite existing context images, by default False.
+
+        Notes
+        -----
+        If the parent image can be found in ``parent_path`` (and its size
+        matches the pixel bounds of its patches), it is read once and each
+        context image is cut from it. Otherwise, context images are created
+        from the patch images using ``get_context_id``.
+        """
+        context_index = self._get_context_index()
+
+        parent_image = None
+        if self.parent_path is not None:
+            parent_image_path = os.path.join(self.parent_path, parent_id)
+            if os.path.isfile(parent_image_path):
+                parent_image = Image.open(parent_image_path)
+                # e.g. if patches were created from a resized parent image
+                if parent_image.size != context_index["parent_sizes"][parent_id]:
+                    parent_image = None
+                else:
+                    parent_image = parent_image.convert(self.image_mode)
+
+        for id in ids:
+            if parent_image is None:
                 self.get_context_id(
-                    id,
-                    overwrite=overwrite,
-                    save_context=True,
-                    return_image=False,
+                    id, overwrite=overwrite, save_context=True, return_image=False
+                )
+                continue
+
+            pos = context_index["positions"][id]
+            patch_path = context_index["paths"][pos]
+            with Image.open(patch_path) as patch_image:
+                patch_size = patch_image.size  # only reads image header
+
+            context_images = [
+                (
+                    parent_image.crop(context_index["bounds"][context_pos][1:])
+                    if context_pos is not None
+                    else None
                 )
+                for context_pos in self._get_context_patches(id)
+            ]
+            context_image = self._assemble_context_image(context_images, *patch_size)
+            self._save_context_image(context_image, patch_path, overwrite=overwrite)
 
     @staticmethod
     def _get_empty_square(
@@ -616,6 +823,188 @@ class PatchContextDataset(PatchDataset):
         )
         return im
 
+    def _build_context_index(self) -> dict:
+        """
+        Build a hash index of the patches in ``total_df`` so neighbouring
+        patches can be found without scanning the whole DataFrame.
+
+        Returns
+        -------
+        dict
+            A dictionary containing:
+
+            - ``"positions"``: maps each image ID to its row position.
+            - ``"bounds"``: ``(parent_id, min_x, min_y, max_x, max_y)`` for each row.
+            - ``"paths"``: the patch path for each row.
+            - ``"patches"``: maps ``(parent_id, min_x, min_y)`` to row positions.
+            - ``"prev_x"``/``"prev_y"``: map ``(parent_id, max_x)``/``(parent_id, max_y)``
+              to the ``min_x``/``min_y`` values of patches ending at that coordinate.
+            - ``"parent_sizes"``: maps each parent ID to the (width, height) covered by its patches.
+
+        Notes
+        -----
+        The index is built once and cached on the dataset (see
+        ``_get_context_index``).
+        """
+        total_df = self.total_df
+
+        # backwards compatibility with annotator without pixel_bounds and parent_id columns
+        if "parent_id" in total_df.columns:
+            parent_ids = total_df["parent_id"].tolist()
+        else:
+            parent_ids = [x.split("#")[1] for x in total_df.index]
+
+        if all(
+            [col in total_df.columns for col in ["min_x", "min_y", "max_x", "max_y"]]
+        ):
+            bounds = total_df[["min_x", "min_y", "max_x", "max_y"]].values.tolist()
+        elif "pixel_bounds" in total_df.columns:
+            bounds = [
+                (
+                    literal_eval(pixel_bounds)
+                    if isinstance(pixel_bounds, str)
+                    else pixel_bounds
+                )
+                for pixel_bounds in total_df["pixel_bounds"]
+            ]
+        else:
+            bounds = [[int(i) for i in x.split("-")[1:5]] for x in total_df.index]
+
+        context_index = {
+            "positions": {},
+            "bounds": [],
+            "paths": total_df[self.patch_paths_col].tolist(),
+            "patches": defaultdict(list),
+            "prev_x": defaultdict(set),
+            "prev_y": defaultdict(set),
+            "parent_sizes": {},
+        }
+        for pos, (image_id, parent_id, (min_x, min_y, max_x, max_y)) in enumerate(
+            zip(total_df.index, parent_ids, bounds)
+        ):
+            context_index["positions"].setdefault(image_id, pos)
+            context_index["bounds"].append((parent_id, min_x, min_y, max_x, max_y))
+            context_index["patches"][(parent_id, min_x, min_y)].append(pos)
+            context_index["prev_x"][(parent_id, max_x)].add(min_x)
+            context_index["prev_y"][(parent_id, max_y)].add(min_y)
+            parent_width, parent_height = context_index["parent_sizes"].get(
+                parent_id, (0, 0)
+            )
+            context_index["parent_sizes"][parent_id] = (
+                max(parent_width, max_x),
+                max(parent_height, max_y),
+            )
+
+        return context_index
+
+    def _get_context_index(self) -> dict:
+        """Return the cached context index, building it if needed."""
+        if getattr(self, "_context_index", None) is None:
+            self._context_index = self._build_context_index()
+        return self._context_index
+
+    def _get_context_patches(self, id) -> list[int | None]:
+        """
+        Find the patches surrounding a patch.
+
+        Parameters
+        ----------
+        id
+            Index of the patch in ``total_df``.
+
+        Returns
+        -------
+        list
+            The row positions (in the context index) of the 3x3 grid of
+            patches centred on ``id``, read row by row. Missing patches are
+            ``None``.
+
+        Raises
+        ------
+        ValueError
+            If the patch is not found in ``total_df`` or if multiple patches
+            are found in one position of the grid.
+        """
+        context_index = self._get_context_index()
+
+        if id not in context_index["positions"]:
+            raise ValueError(f"[ERROR] '{id}' not found in ``total_df``.")
+        pos = context_index["positions"][id]
+        parent_id, min_x, min_y, max_x, max_y = context_index["bounds"][pos]
+
+        # (candidate min values, required max value) for each row/column of context grid
+        x_opts = [
+            (context_index["prev_x"].get((parent_id, min_x), ()), min_x),
+            ((min_x,), max_x),
+            ((max_x,), None),
+        ]
+        y_opts = [
+            (context_index["prev_y"].get((parent_id, min_y), ()), min_y),
+            ((min_y,), max_y),
+            ((max_y,), None),
+        ]
+
+        context_list = []
+        for (y_starts, y_end), (x_starts, x_end) in product(y_opts, x_opts):
+            context_patch = [
+                context_pos
+                for y_start in y_starts
+                for x_start in x_starts
+                for context_pos in context_index["patches"].get(
+                    (parent_id, x_start, y_start), []
+                )
+                if (x_end is None or context_index["bounds"][context_pos][3] == x_end)
+                and (y_end is None or context_index["bounds"][context_pos][4] == y_end)
+            ]
+            if len(context_patch) > 1:
+                raise ValueError(f"[ERROR] Multiple context patches found for '{id}'.")
+            context_list.append(context_patch[0] if len(context_patch) else None)
+
+        return context_list
+
+    def _assemble_context_image(
+        self,
+        context_images: list[Image.Image | None],
+        patch_width: int,
+        patch_height: int,
+    ) -> Image.Image:
+        """
+        Paste a 3x3 grid of images (read row by row) into one context image.
+        Missing images (``None``) are replaced by empty squares.
+        """
+        total_width = 3 * patch_width
+        total_height = 3 * patch_height
+        context_image = Image.new(self.image_mode, (total_width, total_height))
+
+        for i, image in enumerate(context_images):
+            if image is None:
+                image = self._get_empty_square((patch_width, patch_height))
+            x_offset = (i % 3) * patch_width
+            y_offset = (i // 3) * patch_height
+            context_image.paste(image, (x_offset, y_offset))
+
+        return context_image
+
+    def _save_context_image(
+        self,
+        context_image: Image.Image,
+        patch_path: str,
+        overwrite: bool = False,
+    ) -> None:
+        """
+        Save a context image to ``context_dir`` using the file name of its
+        patch. The image is first written to a temporary file and then moved
+        into place so that interrupted runs do not leave partial files.
+        """
+        os.makedirs(self.context_dir, exist_ok=True)
+        context_path = os.path.join(self.context_dir, os.path.basename(patch_path))
+        if overwrite or not os.path.exists(context_path):
+            tmp_path = os.path.join(
+                self.context_dir, f".tmp-{os.getpid()}-{os.path.basename(patch_path)}"
+            )
+            context_image.save(tmp_path)
+            os.replace(tmp_path, context_path)
+
     def get_context_id(
         self,
         id,
@@ -646,112 +1035,36 @@ class PatchContextDataset(PatchDataset):
         Returns
         -------
         None
+
+        Notes
+        -----
+        Neighbouring patches are looked up in a hash index of ``total_df``
+        keyed by ``(parent_id, min_x, min_y)``, which is built on first use.
+        If ``total_df`` is changed after this, set ``_context_index`` to ``None``
+        to rebuild it.
         """
-        total_df = self.total_df.copy(deep=True)
+        context_positions = self._get_context_patches(id)
 
-        # backwards compatibility with annotator without pixel_bounds and parent_id columns
-        if "pixel_bounds" not in total_df.columns:
-            total_df["pixel_bounds"] = total_df.index.map(
-                lambda x: str(tuple(x.split("-")[1:5]))
-            )
-        if "parent_id" not in total_df.columns:
-            total_df["parent_id"] = total_df.index.map(lambda x: x.split("#")[1])
-        total_df = eval_dataframe(total_df)
+        context_index = self._get_context_index()
+        patch_path = context_index["paths"][context_index["positions"][id]]
 
-        if not all(
-            [col in total_df.columns for col in ["min_x", "min_y", "max_x", "max_y"]]
-        ):
-            total_df[["min_x", "min_y", "max_x", "max_y"]] = [*total_df.pixel_bounds]
-
-        patch_image = Image.open(total_df.loc[id, self.patch_paths_col]).convert(
-            self.image_mode
-        )
+        patch_image = Image.open(patch_path).convert(self.image_mode)
         patch_width, patch_height = (patch_image.width, patch_image.height)
-        parent_id = total_df.loc[id, "parent_id"]
-        min_x = total_df.loc[id, "min_x"]
-        min_y = total_df.loc[id, "min_y"]
-        max_x = total_df.loc[id, "max_x"]
-        max_y = total_df.loc[id, "max_y"]
-
-        # get a pixel bounds of context images
-        context_grid = [
-            *product(
-                [
-                    (total_df["min_y"], min_y),
-                    (min_y, max_y),
-                    (max_y, total_df["max_y"]),
-                ],
-                [
-                    (total_df["min_x"], min_x),
-                    (min_x, max_x),
-                    (max_x, total_df["max_x"]),
-                ],
-            )
-        ]
-        # reshape to min_x, min_y, max_x, max_y
-        context_grid = [
-            (coord[1][0], coord[0][0], coord[1][1], coord[0][1])
-            for coord in context_grid
-        ]
 
-        # get a list of context images
-        context_list = [
-            total_df[
-                (total_df["min_x"] == context_loc[0])
-                & (total_df["min_y"] == context_loc[1])
-                & (total_df["max_x"] == context_loc[2])
-                & (total_df["max_y"] == context_loc[3])
-                & (total_df["parent_id"] == parent_id)
-            ]
-            for context_loc in context_grid
-        ]
-        if any([len(context_patch) > 1 for context_patch in context_list]):
-            raise ValueError(f"[ERROR] Multiple context patches found for '{id}'.")
-        if len(context_list) != 9:
-            raise ValueError(f"[ERROR] Missing context images for '{id}'.")
-
-        context_paths = [
-            (
-                context_patch[self.patch_paths_col].values[0]
-                if len(context_patch)
-                else None
-            )
-            for context_patch in context_list
-        ]
         context_images = [
             (
-                Image.open(context_path).convert(self.image_mode)
-                if context_path is not None
-                else self._get_empty_square((patch_width, patch_height))
+                Image.open(context_index["paths"][context_pos]).convert(self.image_mode)
+                if context_pos is not None
+                else None
             )
-            for context_path in context_paths
+            for context_pos in context_positions
         ]
-
-        # split into rows (3x3 grid)
-        context_images = [
-            context_images[i : i + 3] for i in range(0, len(context_images), 3)
-        ]
-
-        total_width = 3 * patch_width
-        total_height = 3 * patch_height
-        context_image = Image.new(self.image_mode, (total_width, total_height))
-
-        y_offset = 0
-        for row in context_images:
-            x_offset = 0
-            for image in row:
-                context_image.paste(image, (x_offset, y_offset))
-                x_offset += patch_width
-            y_offset += patch_height
+        context_image = self._assemble_context_image(
+            context_images, patch_width, patch_height
+        )
 
         if save_context:
-            os.makedirs(self.context_dir, exist_ok=True)
-            context_path = os.path.join(
-                self.context_dir,
-                os.path.basename(total_df.loc[id, self.patch_paths_col]),
-            )
-            if overwrite or not os.path.exists(context_path):
-                context_image.save(context_path)
+            self._save_context_image(context_image, patch_path, overwrite=overwrite)
 
         if return_image:
             return context_image
@@ -826,6 +1139,12 @@ class PatchContextDataset(PatchDataset):
 
         if self.create_context:
             context_img = self.get_context_id(image_id, return_image=True)
+            if self.fused_transform:
+                context_img = transforms.functional.pil_to_tensor(context_img)
+        elif self.fused_transform:
+            context_img = self._read_image_tensor(
+                os.path.join(self.context_dir, os.path.basename(img_path))
+            )
         else:
             context_img = Image.open(
                 os.path.join(self.context_dir, os.path.basename(img_path))
@@ -844,3 +1163,102 @@ class PatchContextDataset(PatchDataset):
             image_label_index = -1
 
         return (context_img,), image_label, image_label_index
+
+
+class PatchFeatureDataset(Dataset):
+    """A PyTorch Dataset class which returns cached features (embeddings)
+    instead of images for the patches in another dataset.
+
+    Parameters
+    ----------
+    dataset : PatchDataset or PatchContextDataset
+        The dataset whose patches (and labels) to use.
+    feature_cache : FeatureCache
+        The feature cache containing the features for each patch, keyed by
+        patch ID (i.e. the index of ``dataset.patch_df``).
+
+    Attributes
+    ----------
+    dataset : PatchDataset or PatchContextDataset
+        The dataset whose patches (and labels) to use.
+    patch_df : pandas.DataFrame or gpd.GeoDataFrame
+        The DataFrame of the underlying dataset.
+    feature_cache : FeatureCache
+        The feature cache.
+    label_col : str
+        The name of the column containing the image labels.
+    label_index_col : str
+        The name of the column containing the labels indices.
+
+    Raises
+    ------
+    ValueError
+        If any of the patches in ``dataset`` are not in ``feature_cache``.
+    """
+
+    def __init__(
+        self,
+        dataset: PatchDataset | PatchContextDataset,
+        feature_cache,
+    ):
+        missing = feature_cache.missing(dataset.patch_df.index)
+        if len(missing):
+            raise ValueError(
+                f"[ERROR] {len(missing)} patches (e.g. {missing[0]}) are not in the feature cache."
+            )
+
+        self.dataset = dataset
+        self.patch_df = dataset.patch_df
+        self.feature_cache = feature_cache
+        self.label_col = dataset.label_col
+        self.label_index_col = dataset.label_index_col
+
+    def __len__(self) -> int:
+        """
+        Return the length of the dataset.
+
+        Returns
+        -------
+        int
+            The number of samples in the dataset.
+        """
+        return len(self.patch_df)
+
+    def __getitem__(
+        self, idx: int | torch.Tensor
+    ) -> tuple[tuple[torch.Tensor], str, int]:
+        """
+        Return the features, label and the index of that label at the given index in the dataset.
+
+        Parameters
+        ----------
+        idx : int or torch.Tensor
+            Index or indices of the desired patch.
+
+        Returns
+        -------
+        Tuple[torch.Tensor, str, int]
+            A tuple containing the features, the label and the index of that label.
+
+        Notes
+        ------
+            The label is "" and has index -1 if it is not present in the DataFrame.
+        """
+        if torch.is_tensor(idx):
+            idx = idx.tolist()
+
+        features = torch.from_numpy(
+            self.feature_cache.get_one(self.patch_df.index[idx])
+        )
+
+        if self.label_col in self.patch_df.iloc[idx].keys():
+            image_label = self.patch_df.iloc[idx][self.label_col]
+        else:
+            image_label = ""
+
+        if self.label_index_col in self.patch_df.iloc[idx].keys():
+            image_label_index = self.patch_df.iloc[idx][self.label_index_col]
+        else:
+            image_label_index = -1
+
+        return (features,), image_label, image_label_index
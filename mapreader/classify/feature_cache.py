@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+import glob
+import json
+import os
+import re
+from collections.abc import Hashable, Iterable
+
+import numpy as np
+
+
+class FeatureCache:
+    """
+    A cache of feature vectors (embeddings), keyed by patch ID and stored in
+    memory-mapped ``.npy`` files.
+
+    Features are written in shards. Each call to ``add`` writes a new
+    ``features_XXXXX.npy`` file, containing one row per patch, and a
+    ``ids_XXXXX.json`` file, containing the patch IDs for each row. Existing
+    shards are never rewritten, so adding features for new patches only
+    costs as much as computing those features.
+
+    Parameters
+    ----------
+    cache_dir : str or pathlib.Path
+        The directory in which to store the cached features. Created if it
+        does not exist.
+
+    Attributes
+    ----------
+    cache_dir : str
+        The directory in which the cached features are stored.
+    metadata : dict
+        Information about how the features were created (e.g. the model and
+        head used), used to check the cache matches the current model.
+    dim : int or None
+        The length of each feature vector. ``None`` if the cache is empty.
+    """
+
+    _shard_pattern = re.compile(r"ids_(\d+)\.json$")
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = os.path.abspath(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """Read the metadata and the patch IDs of every shard in ``cache_dir``."""
+        metadata_path = os.path.join(self.cache_dir, "metadata.json")
+        if os.path.isfile(metadata_path):
+            with open(metadata_path) as f:
+                self.metadata = json.load(f)
+        else:
+            self.metadata = {}
+
+        self.dim = self.metadata.get("dim")
+        self._shards = []
+        self._index = {}
+        self._memmaps = {}
+
+        # only shards with an ids file are complete
+        for ids_path in sorted(glob.glob(os.path.join(self.cache_dir, "ids_*.json"))):
+            shard = self._shard_pattern.search(ids_path).group(1)
+            with open(ids_path) as f:
+                ids = json.load(f)
+            for row, patch_id in enumerate(ids):
+                self._index[patch_id] = (shard, row)
+            self._shards.append(shard)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, patch_id: Hashable) -> bool:
+        return patch_id in self._index
+
+    def __getstate__(self) -> dict:
+        # memory-maps are re-opened as needed after unpickling
+        state = self.__dict__.copy()
+        state["_memmaps"] = {}
+        return state
+
+    def check_metadata(self, metadata: dict, overwrite: bool = False) -> None:
+        """
+        Check the cache was created with the same settings (e.g. model and
+        head) as given in ``metadata``.
+
+        Parameters
+        ----------
+        metadata : dict
+            Information about how the features are created.
+        overwrite : bool, optional
+            Whether to clear the cache if the metadata does not match, by
+            default ``False``.
+
+        Raises
+        ------
+        ValueError
+            If the metadata does not match and ``overwrite`` is ``False``.
+        """
+        existing = {k: v for k, v in self.metadata.items() if k != "dim"}
+        if len(self) and existing != metadata:
+            if not overwrite:
+                raise ValueError(
+                    f"[ERROR] Features in {self.cache_dir} were created with different settings ({existing}).\n\
+Use ``overwrite=True`` to clear the cache."
+                )
+            self.clear()
+
+        self.metadata = {**metadata, "dim": self.dim}
+        self._write_metadata()
+
+    def _write_metadata(self) -> None:
+        with open(os.path.join(self.cache_dir, "metadata.json"), "w") as f:
+            json.dump(self.metadata, f)
+
+    def missing(self, patch_ids: Iterable[Hashable]) -> list:
+        """
+        Return the patch IDs which are not yet in the cache.
+
+        Parameters
+        ----------
+        patch_ids : Iterable
+            The patch IDs to check.
+
+        Returns
+        -------
+        list
+            The patch IDs which are not in the cache.
+        """
+        return [patch_id for patch_id in patch_ids if patch_id not in self._index]
+
+    def add(self, patch_ids: list[Hashable], features: Iterable[np.ndarray]) -> None:
+        """
+        Add features to the cache as a new shard.
+
+        Parameters
+        ----------
+        patch_ids : list
+            The patch IDs, one per feature vector.
+        features : Iterable of numpy.ndarray
+            The features to add. This can be an array of shape
+            ``(len(patch_ids), dim)`` or an iterable of 2D batches (e.g. a
+            generator), which are written to disk as they are produced.
+
+        Raises
+        ------
+        ValueError
+            If the number of feature vectors does not match the number of
+            patch IDs, or their length does not match ``dim``.
+        """
+        if len(patch_ids) == 0:
+            return
+
+        shard = f"{int(self._shards[-1]) + 1 if self._shards else 0:05d}"
+        features_path = os.path.join(self.cache_dir, f"features_{shard}.npy")
+
+        memmap = None
+        row = 0
+        for batch in features:
+            batch = np.asarray(batch, dtype=np.float32)
+            batch = batch.reshape(-1, batch.shape[-1])
+            if memmap is None:
+                if self.dim is not None and batch.shape[1] != self.dim:
+                    raise ValueError(
+                        f"[ERROR] Features have length {batch.shape[1]}, expected {self.dim}."
+                    )
+                self.dim = batch.shape[1]
+                memmap = np.lib.format.open_memmap(
+                    features_path,
+                    mode="w+",
+                    dtype=np.float32,
+                    shape=(len(patch_ids), self.dim),
+                )
+            if row + len(batch) > len(patch_ids):
+                raise ValueError("[ERROR] More feature vectors than patch IDs.")
+            memmap[row : row + len(batch)] = batch
+            row += len(batch)
+
+        if row != len(patch_ids):
+            raise ValueError(
+                f"[ERROR] Got {row} feature vectors for {len(patch_ids)} patch IDs."
+            )
+        memmap.flush()
+        del memmap
+
+        # writing the ids file marks the shard as complete
+        with open(os.path.join(self.cache_dir, f"ids_{shard}.json"), "w") as f:
+            json.dump(list(patch_ids), f)
+
+        for row, patch_id in enumerate(patch_ids):
+            self._index[patch_id] = (shard, row)
+        self._shards.append(shard)
+        self.metadata["dim"] = self.dim
+        self._write_metadata()
+
+    def _get_memmap(self, shard: str) -> np.memmap:
+        if shard not in self._memmaps:
+            self._memmaps[shard] = np.load(
+                os.path.join(self.cache_dir, f"features_{shard}.npy"), mmap_mode="r"
+            )
+        return self._memmaps[shard]
+
+    def get_one(self, patch_id: Hashable) -> np.ndarray:
+        """
+        Return the feature vector of a single patch.
+
+        Parameters
+        ----------
+        patch_id : Hashable
+            The patch ID.
+
+        Returns
+        -------
+        numpy.ndarray
+            The feature vector (copied out of the memory-map).
+
+        Raises
+        ------
+        KeyError
+            If the patch ID is not in the cache.
+        """
+        if patch_id not in self._index:
+            raise KeyError(f"[ERROR] No features found for {patch_id}.")
+        shard, row = self._index[patch_id]
+        return np.array(self._get_memmap(shard)[row])
+
+    def get(self, patch_ids: Iterable[Hashable]) -> np.ndarray:
+        """
+        Return the feature vectors of several patches.
+
+        Parameters
+        ----------
+        patch_ids : Iterable
+            The patch IDs.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape ``(len(patch_ids), dim)``.
+
+        Raises
+        ------
+        KeyError
+            If any of the patch IDs are not in the cache.
+        """
+        patch_ids = list(patch_ids)
+        missing = self.missing(patch_ids)
+        if len(missing):
+            raise KeyError(f"[ERROR] No features found for {missing[0]}.")
+
+        features = np.empty((len(patch_ids), self.dim or 0), dtype=np.float32)
+        if not len(patch_ids):
+            return features
+
+        # read rows shard by shard
+        shards, rows = zip(*(self._index[patch_id] for patch_id in patch_ids))
+        shards = np.array(shards)
+        rows = np.array(rows)
+        for shard in np.unique(shards):
+            mask = shards == shard
+            features[mask] = self._get_memmap(shard)[rows[mask]]
+        return features
+
+    @property
+    def patch_ids(self) -> list:
+        """The IDs of all patches in the cache."""
+        return list(self._index.keys())
+
+    def clear(self) -> None:
+        """Remove all cached features."""
+        self._memmaps = {}
+        for path in glob.glob(
+            os.path.join(self.cache_dir, "features_*.npy")
+        ) + glob.glob(os.path.join(self.cache_dir, "ids_*.json")):
+            os.remove(path)
+        self.metadata = {}
+        self._write_metadata()
+        self._load_index()
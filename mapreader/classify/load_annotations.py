@@ -1,25 +1,83 @@
 #!/usr/bin/env python
 from __future__ import annotations
 
+import math
 import os
 import pathlib
 import re
-from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable
 
 import geopandas as gpd
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from PIL import Image
-from sklearn.model_selection import train_test_split
+import torch
+from PIL import Image, ImageDraw
 from torch import Tensor
 from torch.utils.data import DataLoader, Sampler, WeightedRandomSampler
 from torchvision.transforms import Compose
 
-from mapreader.utils.load_frames import load_from_csv, load_from_geojson
+from mapreader.utils.load_frames import (
+    load_from_csv,
+    load_from_feather,
+    load_from_geojson,
+    load_from_parquet,
+)
+from mapreader.utils.thumbnails import get_thumbnail_cache
 
+from .dataloader_tuning import tune_dataloader
 from .datasets import PatchContextDataset, PatchDataset
+from .samplers import ClassBalancedShardSampler
+
+
+def _find_missing_paths(paths, max_workers: int = 16) -> set:
+    """
+    Find which of a list of file paths do not exist.
+
+    Instead of one ``os.path.exists`` call per path, each unique directory
+    is listed once (in a thread pool, which helps on network file systems)
+    and file names are looked up in the listings. Paths not found in a
+    listing are double-checked with ``os.path.exists`` (e.g. for
+    case-insensitive file systems).
+
+    Parameters
+    ----------
+    paths : iterable of str
+        The file paths to check.
+    max_workers : int, optional
+        The maximum number of directories to list at once, by default ``16``.
+
+    Returns
+    -------
+    set
+        The paths which do not exist.
+    """
+    by_dir = {}
+    for path in paths:
+        directory, name = os.path.split(os.fspath(path))
+        by_dir.setdefault(directory, []).append((path, name))
+
+    def list_dir(directory: str) -> set | None:
+        try:
+            return set(os.listdir(directory or "."))
+        except (FileNotFoundError, NotADirectoryError):
+            return set()
+        except OSError:  # e.g. permission denied, fall back to os.path.exists
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(by_dir)))) as ex:
+        listings = dict(zip(by_dir, ex.map(list_dir, by_dir)))
+
+    missing = set()
+    for directory, entries in by_dir.items():
+        listing = listings[directory]
+        for path, name in entries:
+            if listing is not None and name in listing:
+                continue
+            if not os.path.exists(path):
+                missing.add(path)
+    return missing
 
 
 class AnnotationsLoader:
@@ -35,10 +93,17 @@ class AnnotationsLoader:
         self.patch_paths_col = None
         self.label_col = None
         self.datasets = None
+        self.splits = None
 
     def load(
         self,
-        annotations: str | pathlib.Path | pd.DataFrame | gpd.GeoDataFrame,
+        annotations: (
+            str
+            | pathlib.Path
+            | pd.DataFrame
+            | gpd.GeoDataFrame
+            | list[str | pathlib.Path | pd.DataFrame | gpd.GeoDataFrame]
+        ),
         labels_map: dict | None = None,
         delimiter: str = ",",
         images_dir: str | None = None,
@@ -49,16 +114,17 @@ class AnnotationsLoader:
         append: bool = True,
         scramble_frame: bool = False,
         reset_index: bool = False,
+        keep: str = "first",
     ):
         """
-        Loads annotations from a CSV/TSV/geojson file, a pandas DataFrame or a geopandas GeoDataFrame.
+        Loads annotations from a CSV/TSV/geojson/Parquet/Arrow file, a pandas DataFrame or a geopandas GeoDataFrame.
         Sets the ``patch_paths_col`` and ``label_col`` attributes.
 
         Parameters
         ----------
-        annotations : str | pathlib.Path | pd.DataFrame | gpd.GeoDataFrame
+        annotations : str | pathlib.Path | pd.DataFrame | gpd.GeoDataFrame | list
             The annotations.
-            Can either be the path to a CSV/TSV/geojson file, a pandas DataFrame or a geopandas GeoDataFrame.
+            Can either be the path to a CSV/TSV/geojson/Parquet/Arrow IPC (feather) file, a pandas DataFrame or a geopandas GeoDataFrame, or a list of these (e.g. the annotation files of several annotators).
         labels_map : Optional[dict], optional
             A dictionary mapping labels to indices. If not provided, labels will be mapped to indices based on the order in which they appear in the annotations dataframe. By default None.
         delimiter : str, optional
@@ -83,17 +149,25 @@ class AnnotationsLoader:
         append : bool, optional
             Whether to append the annotations to a pre-existing ``annotations`` DataFrame.
             If False, existing DataFrame will be overwritten.
+            When appending (or loading a list of annotations), patches which are already annotated (i.e. have the same index) keep only one label (see ``keep``), unless ``reset_index`` is True.
             By default True.
         scramble_frame : bool, optional
             Whether to shuffle the rows of the DataFrame, by default False.
         reset_index : bool, optional
             Whether to reset the index of the DataFrame (e.g. after shuffling), by default False.
+        keep : str, optional
+            Which label to keep for patches annotated more than once (e.g. by several annotators): ``"first"`` or ``"last"`` (i.e. the label from the annotations loaded last).
+            The number of patches with conflicting labels is reported.
+            By default ``"first"``.
 
         Raises
         ------
         ValueError
             If ``annotations`` is passed as something other than a string or pd.DataFrame.
+            If ``keep`` is not ``"first"`` or ``"last"``.
         """
+        if keep not in ["first", "last"]:
+            raise ValueError('[ERROR] ``keep`` must be "first" or "last".')
 
         if not self.patch_paths_col:
             self.patch_paths_col = patch_paths_col
@@ -111,29 +185,46 @@ class AnnotationsLoader:
             )
             self.label_col = label_col
 
-        if isinstance(annotations, (str, pathlib.Path)):
-            annotations = self._load_annotations_file(
-                annotations, delimiter, scramble_frame, reset_index
-            )
-        if not isinstance(annotations, pd.DataFrame):
-            raise ValueError(
-                "[ERROR] Please pass ``annotations`` as a path to a CSV/TSV/geojson file, a pandas DataFrame or a geopandas GeoDataFrame."
-            )
+        if not isinstance(annotations, list):
+            annotations = [annotations]
+        if not annotations:
+            raise ValueError("[ERROR] ``annotations`` is an empty list.")
+
+        abs_images_dir = os.path.abspath(images_dir) if images_dir else None
+        frames = []
+        for annots in annotations:
+            if isinstance(annots, (str, pathlib.Path)):
+                annots = self._load_annotations_file(
+                    annots, delimiter, scramble_frame, reset_index
+                )
+            if not isinstance(annots, pd.DataFrame):
+                raise ValueError(
+                    "[ERROR] Please pass ``annotations`` as a path to a CSV/TSV/geojson/Parquet/Arrow file, a pandas DataFrame or a geopandas GeoDataFrame (or a list of these)."
+                )
+            if images_dir:
+                annots[self.patch_paths_col] = annots.index.map(
+                    lambda x: os.path.join(abs_images_dir, x)
+                )
+            frames.append(annots)
 
-        if images_dir:
-            abs_images_dir = os.path.abspath(images_dir)
-            annotations[self.patch_paths_col] = annotations.index.map(
-                lambda x: os.path.join(abs_images_dir, x)
-            )
+        if append and len(self.annotations):
+            frames.insert(0, self.annotations)
 
-        annotations = annotations.astype(
-            {self.label_col: str}
-        )  # ensure labels are interpreted as strings
+        # concatenate once, rather than once per file
+        annotations = pd.concat(frames) if len(frames) > 1 else frames[0]
 
-        if append:
-            self.annotations = pd.concat([self.annotations, annotations])
-        else:
-            self.annotations = annotations
+        if len(frames) > 1 and not reset_index:
+            # hash-based, so merging is linear in the number of annotations
+            duplicated = annotations.index.duplicated(keep=keep)
+            if duplicated.any():
+                print(
+                    f"[INFO] Ignoring {duplicated.sum()} annotation(s) of already annotated patches."
+                )
+                self._report_conflicts(annotations, keep)
+                annotations = annotations[~duplicated]
+
+        # ensure labels are interpreted as strings
+        self.annotations = annotations.astype({self.label_col: str})
 
         self._check_patch_paths(
             remove_broken=remove_broken, ignore_broken=ignore_broken
@@ -161,8 +252,9 @@ class AnnotationsLoader:
                 labels_map = {i: label for i, label in enumerate(self.unique_labels)}
                 self.labels_map = labels_map
 
-        self.annotations["label_index"] = self.annotations[self.label_col].apply(
-            self._get_label_index
+        index_map = {label: i for i, label in self.labels_map.items()}
+        self.annotations["label_index"] = self.annotations[self.label_col].map(
+            index_map
         )
 
         print(self)
@@ -174,7 +266,7 @@ class AnnotationsLoader:
         scramble_frame: bool = False,
         reset_index: bool = False,
     ) -> pd.DataFrame | gpd.GeoDataFrame:
-        """Loads annotations from a CSV/TSV/geojson file.
+        """Loads annotations from a CSV/TSV/geojson/Parquet/Arrow file.
 
         Parameters
         ----------
@@ -206,9 +298,15 @@ class AnnotationsLoader:
             )
         elif re.search(r"\..*?json$", str(annotations)):
             annotations = load_from_geojson(annotations)
+        elif re.search(r"\.(geo)?parquet$", str(annotations)):
+            print(f'[INFO] Reading "{annotations}"')
+            annotations = load_from_parquet(annotations)
+        elif re.search(r"\.(arrow|feather|ipc)$", str(annotations)):
+            print(f'[INFO] Reading "{annotations}"')
+            annotations = load_from_feather(annotations)
         else:
             raise ValueError(
-                "[ERROR] ``annotations`` must be a path to a CSV/TSV/etc or geojson file, a pandas DataFrame or a geopandas GeoDataFrame."
+                "[ERROR] ``annotations`` must be a path to a CSV/TSV/etc or geojson file, a Parquet or Arrow IPC (feather) file, a pandas DataFrame or a geopandas GeoDataFrame."
             )
 
         if scramble_frame:
@@ -221,6 +319,18 @@ class AnnotationsLoader:
         ]  # remove duplicates
         return annotations
 
+    def _report_conflicts(self, annotations: pd.DataFrame, keep: str) -> None:
+        """Print the number of patches which have been given different labels."""
+        if self.label_col not in annotations.columns:
+            return
+        repeated = annotations.index.duplicated(keep=False)
+        labels = annotations.loc[repeated, self.label_col].astype(str)
+        n_conflicts = (labels.groupby(level=0).nunique() > 1).sum()
+        if n_conflicts:
+            print(
+                f"[WARNING] {n_conflicts} patch(es) have conflicting labels. Keeping the {keep} label of each (see ``keep``)."
+            )
+
     def _check_patch_paths(
         self,
         remove_broken: bool | None = True,
@@ -238,26 +348,32 @@ class AnnotationsLoader:
         ignore_broken : Optional[bool], optional
             Whether to ignore broken image paths (only valid if remove_broken=False).
             If True, annotations with broken paths will remain in annotations DataFrame and no error will be raised. This may cause issues!
+
+        Notes
+        -----
+        Paths are checked with one directory listing per unique directory
+        (see ``_find_missing_paths``) and broken annotations are removed with
+        a single boolean mask. Broken paths are written to
+        "broken_files.txt".
         """
 
         if len(self.annotations) == 0:
             return
 
-        broken_paths = []
-        for i, patch_path in self.annotations[self.patch_paths_col].items():
-            if not os.path.exists(patch_path):
-                broken_paths.append(patch_path)
-                if remove_broken:
-                    self.annotations.drop(i, inplace=True)
+        paths = self.annotations[self.patch_paths_col]
+        broken = paths.isin(_find_missing_paths(paths.unique())).to_numpy()
+        broken_paths = paths[broken].tolist()
+        if remove_broken and broken.any():
+            self.annotations = self.annotations[~broken]
 
         if len(broken_paths) != 0:  # write broken paths to text file
-            with open("broken_files.txt", "w") as f:
-                for broken_path in broken_paths:
-                    f.write(f"{broken_path}\n")
+            broken_file = "broken_files.txt"
+            with open(broken_file, "w") as f:
+                f.writelines(f"{broken_path}\n" for broken_path in broken_paths)
 
             print(
                 f"[WARNING] {len(broken_paths)} files cannot be found.\n\
-Check '{os.path.abspath('broken_paths.txt')}' for more details and, if possible, update your file paths using the 'images_dir' argument."
+Check '{os.path.abspath(broken_file)}' for more details and, if possible, update your file paths using the 'images_dir' argument."
             )
 
             if remove_broken:
@@ -302,7 +418,7 @@ Number of annotations remaining: {len(self.annotations)}"
         patch_path = self.annotations.loc[patch_id, self.patch_paths_col]
         patch_label = self.annotations.loc[patch_id, self.label_col]
         try:
-            img = Image.open(patch_path)
+            img = get_thumbnail_cache().get(patch_path)
         except FileNotFoundError as e:
             e.add_note(
                 f'[ERROR] File could not be found: "{patch_path}".\n\n\
@@ -335,6 +451,8 @@ Please check your image paths in your annonations.csv file and update them if ne
         exclude_df: pd.DataFrame | gpd.GeoDataFrame | None = None,
         include_df: pd.DataFrame | gpd.GeoDataFrame | None = None,
         deduplicate_col: str = "image_id",
+        thumbnail_size: int | None = 256,
+        priority: str | pd.Series | None = None,
     ) -> None:
         """
         Perform image review on annotations and update labels for a given
@@ -356,6 +474,18 @@ Please check your image paths in your annonations.csv file and update them if ne
         deduplicate_col : str, optional
             The column to use for deduplicating reviewed images, by default
             ``"image_id"``.
+        thumbnail_size : int or None, optional
+            The size (in pixels) of the longest side of the images shown.
+            Images are read through the shared thumbnail cache and the next
+            chunk of images is rendered in the background. If ``None``,
+            images are shown at full size. By default ``256``.
+        priority : str, pandas.Series or None, optional
+            Scores used to order the review, highest first: either the name
+            of a column in the annotations or a Series indexed like the
+            annotations (e.g. ``ClassifierContainer.sample_losses["train"]``,
+            to review likely mislabelled patches first). If ``None``, images
+            are reviewed in the order of the annotations. By default
+            ``None``.
 
         Returns
         -------
@@ -366,6 +496,11 @@ Please check your image paths in your annonations.csv file and update them if ne
         This method reviews images with their corresponding labels and allows
         the user to change the label for each image.
 
+        Each chunk of images is shown as one pre-rendered grid of thumbnails,
+        captioned with each image's label and ID (its index in
+        :attr:`~.classify.load_annotations.AnnotationsLoader.annotations`).
+        Corrections are applied with ``apply_corrections``.
+
         Updated labels are saved in
         :attr:`~.classify.load_annotations.AnnotationsLoader.annotations`
         and in a newly created
@@ -382,14 +517,109 @@ Please check your image paths in your annonations.csv file and update them if ne
         if len(self.annotations) == 0:
             raise ValueError("[ERROR] No annotations loaded.")
 
+        annots2review = self._get_annots2review(
+            label_to_review, exclude_df, include_df, priority
+        )
+
+        # the index of ``annotations`` is used as the ID, typed as a string
+        id_lookup = pd.Series(
+            self.annotations.index, index=self.annotations.index.astype(str)
+        )
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        def render(start: int):
+            page = annots2review.iloc[start : start + chunks]
+            return page, self._render_review_grid(page, num_cols, thumbnail_size)
+
+        next_page = executor.submit(render, 0)
+        image_idx = 0
+        user_input_ids = ""
+        try:
+            while image_idx < len(annots2review):
+                page, grid = next_page.result()
+                if image_idx + chunks < len(annots2review):
+                    # render the next chunk while this one is reviewed
+                    next_page = executor.submit(render, image_idx + chunks)
+
+                print('[INFO] Type "exit", "end" or "stop" to exit.')
+                print(
+                    f"[INFO] Showing {image_idx}-{image_idx+len(page)} out of {len(annots2review)}."  # noqa
+                )
+                num_rows = -(-len(page) // num_cols)
+                plt.figure(figsize=(num_cols * 3, num_rows * 3))
+                plt.imshow(grid)
+                plt.axis("off")
+                plt.show()
+
+                self._add_reviewed(page, deduplicate_col)
+                image_idx += len(page)
+
+                print(f"[INFO] IDs of current patches: {page.index.tolist()}")
+                q = "\nEnter IDs, comma separated (or press enter to continue): "
+                user_input_ids = input(q)
+
+                while user_input_ids.strip().lower() not in [
+                    "",
+                    "exit",
+                    "end",
+                    "stop",
+                ]:
+                    list_input_ids = [
+                        input_id.strip() for input_id in user_input_ids.split(",")
+                    ]
+                    unknown = [i for i in list_input_ids if i not in id_lookup.index]
+                    if unknown:
+                        print(f"[ERROR] IDs not found in the annotations: {unknown}.")
+                        user_input_ids = input(q)
+                        continue
+
+                    print(
+                        f"[INFO] Options for labels:{list(self.annotations[self.label_col].unique())}"
+                    )
+                    input_label = input("Enter new label:  ")
+                    if input_label not in list(
+                        self.annotations[self.label_col].unique()
+                    ):
+                        print(
+                            f'[ERROR] Label "{input_label}" not found in the annotations. Please enter a valid label.'
+                        )
+                        continue
+
+                    input_ids = id_lookup[list_input_ids].tolist()
+                    self.apply_corrections(dict.fromkeys(input_ids, input_label))
+                    print(
+                        f'[INFO] Images {input_ids} have been relabelled as "{input_label}"'
+                    )
+
+                    user_input_ids = input(q)
+
+                if user_input_ids.lower() in ["exit", "end", "stop"]:
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        print("[INFO] Exited.")
+
+    def _get_annots2review(
+        self,
+        label_to_review: str | None = None,
+        exclude_df: pd.DataFrame | None = None,
+        include_df: pd.DataFrame | None = None,
+        priority: str | pd.Series | None = None,
+    ) -> pd.DataFrame:
+        """
+        Select (and order) the annotations to review, keeping the index of
+        ``annotations``. See ``review_labels``.
+        """
+        annots2review = self.annotations
         if label_to_review:
-            annots2review = self.annotations[
-                self.annotations[self.label_col] == label_to_review
+            annots2review = annots2review[
+                annots2review[self.label_col] == label_to_review
             ]
-            annots2review.reset_index(inplace=True, drop=False)
-        else:
-            annots2review = self.annotations
-            annots2review.reset_index(inplace=True, drop=False)
+
+        # keep the index as a column so it survives merges
+        index_name = self.annotations.index.name or "index"
+        annots2review = annots2review.reset_index(names=index_name)
 
         if exclude_df is not None:
             if isinstance(exclude_df, pd.DataFrame):
@@ -399,110 +629,133 @@ Please check your image paths in your annonations.csv file and update them if ne
                 annots2review = merged_df[merged_df["_merge"] == "left_only"].drop(
                     columns="_merge"
                 )
-                annots2review.reset_index(inplace=True, drop=True)
             else:
                 raise ValueError("[ERROR] ``exclude_df`` must be a pandas DataFrame.")
 
         if include_df is not None:
             if isinstance(include_df, pd.DataFrame):
                 annots2review = pd.merge(annots2review, include_df, how="right")
-                annots2review.reset_index(inplace=True, drop=True)
             else:
                 raise ValueError("[ERROR] ``include_df`` must be a pandas DataFrame.")
 
-        image_idx = 0
-        while image_idx < len(annots2review):
-            print('[INFO] Type "exit", "end" or "stop" to exit.')
-            print(
-                f"[INFO] Showing {image_idx}-{image_idx+chunks} out of {len(annots2review)}."  # noqa
-            )
-            plt.figure(figsize=(num_cols * 3, (chunks // num_cols) * 3))
-            counter = 1
-            iter_ids = []
-            while (counter <= chunks) and (image_idx < len(annots2review)):
-                # The first term is just a ceiling division, equivalent to:
-                # from math import ceil
-                # int(ceil(chunks / num_cols))
-                plt.subplot((chunks // num_cols), num_cols, counter)
-                patch_path = annots2review.iloc[image_idx][self.patch_paths_col]
-                try:
-                    img = Image.open(patch_path)
-                except FileNotFoundError as e:
-                    e.add_note(
-                        f'[ERROR] File could not be found: "{patch_path}".\n\n\
+        annots2review = annots2review.set_index(index_name)
+        annots2review.index.name = self.annotations.index.name
+
+        if priority is not None:
+            if isinstance(priority, str):
+                priority = self.annotations[priority]
+            scores = priority.reindex(annots2review.index).astype(float)
+            order = np.argsort(-scores.fillna(-np.inf).to_numpy(), kind="stable")
+            annots2review = annots2review.iloc[order]
+
+        return annots2review
+
+    def _render_review_grid(
+        self,
+        page: pd.DataFrame,
+        num_cols: int,
+        thumbnail_size: int | None,
+    ) -> Image.Image:
+        """
+        Paste the thumbnails of a page of annotations into one grid image,
+        captioned with their labels and IDs.
+        """
+        thumbnails = get_thumbnail_cache()
+        images = []
+        for patch_path in page[self.patch_paths_col]:
+            try:
+                images.append(thumbnails.get(patch_path, size=thumbnail_size))
+            except FileNotFoundError as e:
+                e.add_note(
+                    f'[ERROR] File could not be found: "{patch_path}".\n\n\
 Please check your image paths and update them if necessary.'
-                    )
-                plt.imshow(img)
-                plt.xticks([])
-                plt.yticks([])
-                plt.title(
-                    f"{annots2review.iloc[image_idx][self.label_col]} | id: {annots2review.iloc[image_idx].name}"  # noqa
                 )
-                iter_ids.append(annots2review.iloc[image_idx].name)
-                # Add to reviewed
-                self.reviewed = pd.concat(
-                    [self.reviewed, annots2review.iloc[image_idx : image_idx + 1]]
-                )
-                try:
-                    self.reviewed.drop_duplicates(subset=[deduplicate_col])
-                except Exception:
-                    pass
-                counter += 1
-                image_idx += 1
-            plt.show()
-
-            print(f"[INFO] IDs of current patches: {iter_ids}")
-            q = "\nEnter IDs, comma separated (or press enter to continue): "
-            user_input_ids = input(q)
-
-            while user_input_ids.strip().lower() not in [
-                "",
-                "exit",
-                "end",
-                "stop",
-            ]:
-                list_input_ids = user_input_ids.split(",")
-                print(
-                    f"[INFO] Options for labels:{list(self.annotations[self.label_col].unique())}"
-                )
-                input_label = input("Enter new label:  ")
-                if input_label not in list(self.annotations[self.label_col].unique()):
-                    print(
-                        f'[ERROR] Label "{input_label}" not found in the annotations. Please enter a valid label.'
-                    )
-                    continue
-
-                for input_id in list_input_ids:
-                    input_id = int(input_id)
-                    # Change both annotations and reviewed
-                    self.annotations.loc[input_id, self.label_col] = input_label
-                    self.reviewed.loc[input_id, self.label_col] = input_label
-                    # Update label indices
-                    self.annotations.loc[
-                        input_id, "label_index"
-                    ] = self._get_label_index(input_label)
-                    self.reviewed.loc[input_id, "label_index"] = self._get_label_index(
-                        input_label
-                    )
-                    if not (
-                        self.annotations[self.label_col].value_counts().tolist()
-                        == self.annotations["label_index"].value_counts().tolist()
-                    ):
-                        raise RuntimeError(
-                            f"[ERROR] Label indices do not match label counts. Please check the label indices for label '{input_label}'."
-                        )
-                    print(
-                        f'[INFO] Image {input_id} has been relabelled as "{input_label}"'
-                    )
+                raise
+
+        caption_height = 14
+        cell_w = max((image.width for image in images), default=1)
+        cell_h = max((image.height for image in images), default=1) + caption_height
+        num_rows = max(-(-len(images) // num_cols), 1)
+        grid = Image.new("RGB", (cell_w * num_cols, cell_h * num_rows), "white")
+        draw = ImageDraw.Draw(grid)
+        labels = page[self.label_col].tolist()
+        for i, (image, label, patch_id) in enumerate(zip(images, labels, page.index)):
+            x, y = (i % num_cols) * cell_w, (i // num_cols) * cell_h
+            grid.paste(image.convert("RGB"), (x, y + caption_height))
+            draw.text((x + 2, y + 1), f"{label} | id: {patch_id}", fill="black")
+        return grid
+
+    def _add_reviewed(self, page: pd.DataFrame, deduplicate_col: str) -> None:
+        """Add a page of reviewed annotations to ``reviewed``."""
+        self.reviewed = pd.concat([self.reviewed, page])
+        if deduplicate_col in self.reviewed.columns:
+            self.reviewed = self.reviewed.drop_duplicates(
+                subset=[deduplicate_col], keep="last"
+            )
+        else:
+            self.reviewed = self.reviewed[~self.reviewed.index.duplicated(keep="last")]
 
-                user_input_ids = input(q)
+    def apply_corrections(self, corrections: dict | pd.Series) -> None:
+        """
+        Change the labels of several annotations at once (e.g. after
+        reviewing them).
+
+        Parameters
+        ----------
+        corrections : dict or pandas.Series
+            The new label of each annotation, keyed (or indexed) by the
+            annotations' index.
 
-            if user_input_ids.lower() in ["exit", "end", "stop"]:
-                break
+        Raises
+        ------
+        KeyError
+            If any of the IDs are not in the annotations.
+        ValueError
+            If any of the labels are not in ``labels_map``.
 
-        print("[INFO] Exited.")
+        Notes
+        -----
+        Corrections are applied to both
+        :attr:`~.classify.load_annotations.AnnotationsLoader.annotations` and
+        (for annotations which have been reviewed)
+        :attr:`~.classify.load_annotations.AnnotationsLoader.reviewed`,
+        along with their label indices.
+        """
+        corrections = pd.Series(corrections, dtype=object)
+        if len(corrections) == 0:
+            return
 
-    def show_sample(self, label_to_show: str, num_samples: int | None = 9) -> None:
+        missing = corrections.index.difference(self.annotations.index)
+        if len(missing):
+            raise KeyError(
+                f"[ERROR] IDs not found in the annotations: {missing.tolist()}."
+            )
+        index_map = {v: k for k, v in self.labels_map.items()}
+        unknown = set(corrections) - set(index_map)
+        if unknown:
+            raise ValueError(
+                f"[ERROR] Labels not found in ``labels_map``: {sorted(unknown)}."
+            )
+
+        label_indices = corrections.map(index_map).to_numpy()
+        self.annotations.loc[corrections.index, self.label_col] = corrections.to_numpy()
+        self.annotations.loc[corrections.index, "label_index"] = label_indices
+
+        if len(self.reviewed):
+            reviewed = corrections.index.intersection(self.reviewed.index)
+            self.reviewed.loc[reviewed, self.label_col] = corrections[
+                reviewed
+            ].to_numpy()
+            self.reviewed.loc[reviewed, "label_index"] = corrections[reviewed].map(
+                index_map
+            )
+
+    def show_sample(
+        self,
+        label_to_show: str,
+        num_samples: int | None = 9,
+        thumbnail_size: int | None = 256,
+    ) -> None:
         """Show a random sample of images with the specified label (tar_label).
 
         Parameters
@@ -512,6 +765,10 @@ Please check your image paths and update them if necessary.'
         num_sample : int, optional
             The number of images to show.
             If ``None``, all images with the specified label will be shown. Default is ``9``.
+        thumbnail_size : int or None, optional
+            The size (in pixels) of the longest side of the images shown.
+            Images are read through the shared thumbnail cache. If ``None``,
+            images are shown at full size. Default is ``256``.
 
         Returns
         -------
@@ -531,7 +788,7 @@ Please check your image paths and update them if necessary.'
             plt.subplot(int(num_samples / 2.0), 3, i + 1)
             patch_path = annot2plot.iloc[i][self.patch_paths_col]
             try:
-                img = Image.open(patch_path)
+                img = get_thumbnail_cache().get(patch_path, size=thumbnail_size)
             except FileNotFoundError:
                 raise FileNotFoundError(
                     f'[ERROR] File could not be found: "{patch_path}".\n\n\
@@ -553,6 +810,9 @@ Please check your image paths and update them if necessary.'
         test_transform: str | (Compose | Callable) = "test",
         context_datasets: bool = False,
         context_df: str | pathlib.Path | pd.DataFrame | gpd.GeoDataFrame | None = None,
+        fused_transform: bool = False,
+        group_col: str | None = None,
+        split_file: str | None = None,
     ) -> None:
         """
         Splits the dataset into three subsets: training, validation, and test sets (DataFrames) and saves them as a dictionary in ``self.datasets``.
@@ -587,12 +847,30 @@ Please check your image paths and update them if necessary.'
         context_df: str or or pathlib.Path or pandas.DataFrame or gpd.GeoDataFrame, optional
             The DataFrame containing all patches if using context datasets.
             Used to create context images. By default None.
+        fused_transform: bool, optional
+            Whether to use the fused uint8 version of the default transforms (only valid if transforms are passed as strings).
+            If True, conversion to float and normalization are done on whole batches instead of on each image.
+            By default False.
+        group_col: str or None, optional
+            A column whose values (e.g. "parent_id") must not be split between
+            sets, to stop neighbouring patches from the same parent image
+            leaking between the training and validation/test sets. Whole
+            groups are assigned to each set, so fractions and label
+            frequencies are only approximate. By default None.
+        split_file: str or None, optional
+            A CSV file to save the split to (the set of each annotation, along
+            with the fractions, ``random_state`` and ``group_col`` used). If
+            the file exists, covers the same annotations and was created with
+            the same parameters, the split is loaded from it instead of being
+            recomputed, so it can be reproduced exactly. Otherwise, a new split
+            is created and saved. By default None.
 
         Raises
         ------
         ValueError
             If the sum of fractions of training, validation and test sets does
             not add up to 1.
+            If ``group_col`` is not a column in the annotations.
 
         Returns
         -------
@@ -604,57 +882,44 @@ Please check your image paths and update them if necessary.'
 
         Following fractional ratios provided by the user, where each subset is
         stratified by the values in a specific column (that is, each subset has
-        the same relative frequency of the values in the column). It performs
-        this splitting by running ``train_test_split()`` twice.
+        the same relative frequency of the values in the column). The set of
+        each annotation is computed once as an integer array (see
+        ``_assign_splits``) and saved in ``self.splits``.
 
         See ``PatchDataset`` for more information on transforms.
         """
         if len(self.annotations) == 0:
             raise ValueError("[ERROR] No annotations loaded.")
 
-        frac_train = Decimal(str(frac_train))
-        frac_val = Decimal(str(frac_val))
-        frac_test = Decimal(str(frac_test))
-
-        if sum([frac_train + frac_val + frac_test]) != 1:
+        if not math.isclose(frac_train + frac_val + frac_test, 1):
             raise ValueError(
                 f"[ERROR] ``frac_train`` ({frac_train}), ``frac_val`` ({frac_val}) and ``frac_test`` ({frac_test}) do not add up to 1."
             )  # noqa
 
-        labels = self.annotations[self.label_col]
-
-        # Split original dataframe into train and temp (val+test) dataframes.
-        df_train, df_temp, _, labels_temp = train_test_split(
-            self.annotations,
-            labels,
-            stratify=labels,
-            test_size=float(1 - frac_train),
-            random_state=random_state,
-        )
-
-        if frac_test != 0:
-            # Split the temp dataframe into val and test dataframes.
-            relative_frac_test = Decimal(frac_test / (frac_val + frac_test))
-            relative_frac_test = relative_frac_test.quantize(Decimal("0.001"))
-            df_val, df_test, _, _ = train_test_split(
-                df_temp,
-                labels_temp,
-                stratify=labels_temp,
-                test_size=float(relative_frac_test),
-                random_state=random_state,
+        split_params = {
+            "frac_train": frac_train,
+            "frac_val": frac_val,
+            "frac_test": frac_test,
+            "random_state": random_state,
+            "group_col": group_col,
+        }
+        split = None
+        if split_file is not None and os.path.exists(split_file):
+            split = self._load_split(split_file, split_params)
+        if split is None:
+            split = self._assign_splits(
+                frac_train, frac_val, frac_test, random_state, group_col
             )
-            if not len(self.annotations) == len(df_train) + len(df_val) + len(df_test):
-                raise ValueError(
-                    "[ERROR] Number of annotations in the split DataFrames does not match the number of annotations in the original DataFrame."
-                )
+            if split_file is not None:
+                self._save_split(split, split_file, split_params)
 
-        else:
-            df_val = df_temp
-            df_test = None
-            if not len(self.annotations) == len(df_train) + len(df_val):
-                raise ValueError(
-                    "[ERROR] Number of annotations in the split DataFrames does not match the number of annotations in the original DataFrame."
-                )
+        set_names = np.array(["train", "val", "test"])
+        self.splits = pd.Series(
+            set_names[split], index=self.annotations.index, name="split"
+        )
+        df_train = self.annotations[split == 0]
+        df_val = self.annotations[split == 1]
+        df_test = self.annotations[split == 2] if (split == 2).any() else None
 
         if context_datasets:
             datasets = self.create_patch_context_datasets(
@@ -665,6 +930,7 @@ Please check your image paths and update them if necessary.'
                 df_train,
                 df_val,
                 df_test,
+                fused_transform=fused_transform,
             )
         else:
             datasets = self.create_patch_datasets(
@@ -674,6 +940,7 @@ Please check your image paths and update them if necessary.'
                 df_train,
                 df_val,
                 df_test,
+                fused_transform=fused_transform,
             )
 
         dataset_sizes = {
@@ -687,8 +954,170 @@ Please check your image paths and update them if necessary.'
         for set_name in datasets.keys():
             print(f"    - {set_name}:   {dataset_sizes[set_name]}")
 
+    @staticmethod
+    def _split_sizes(
+        n: int, frac_train: float, frac_val: float, frac_test: float
+    ) -> np.ndarray:
+        """Number of annotations in the train, val and test sets."""
+        n_temp = math.ceil(round((1 - frac_train) * n, 6))
+        n_test = 0
+        if frac_test:
+            n_test = math.ceil(round(frac_test / (frac_val + frac_test) * n_temp, 6))
+        return np.array([n - n_temp, n_temp - n_test, n_test])
+
+    @staticmethod
+    def _apportion(total: int, weights: np.ndarray) -> np.ndarray:
+        """Split ``total`` in proportion to ``weights`` (largest remainder)."""
+        if total == 0 or weights.sum() == 0:
+            return np.zeros(len(weights), dtype=int)
+        exact = total * weights / weights.sum()
+        counts = np.floor(exact).astype(int)
+        remainder = total - counts.sum()
+        counts[np.argsort(-(exact - counts), kind="stable")[:remainder]] += 1
+        return counts
+
+    def _assign_splits(
+        self,
+        frac_train: float,
+        frac_val: float,
+        frac_test: float,
+        random_state: int | None = None,
+        group_col: str | None = None,
+    ) -> np.ndarray:
+        """
+        Assign each annotation to the train (0), val (1) or test (2) set,
+        stratified by label.
+
+        Parameters
+        ----------
+        frac_train, frac_val, frac_test : float
+            The fraction of annotations in each set.
+        random_state : int or None, optional
+            The random seed, by default None.
+        group_col : str or None, optional
+            A column whose values must not be split between sets (see
+            ``create_datasets``), by default None.
+
+        Returns
+        -------
+        numpy.ndarray
+            The set of each annotation (in the order of ``annotations``).
+        """
+        rng = np.random.default_rng(random_state)
+        label_codes, labels = pd.factorize(self.annotations[self.label_col])
+        label_counts = np.bincount(label_codes, minlength=len(labels))
+        sizes = self._split_sizes(len(label_codes), frac_train, frac_val, frac_test)
+
+        # number of annotations of each label in each set, shape (3, n_labels)
+        n_temp = self._apportion(sizes[1] + sizes[2], label_counts)
+        n_test = self._apportion(sizes[2], n_temp)
+        targets = np.stack([label_counts - n_temp, n_temp - n_test, n_test])
+
+        split = np.empty(len(label_codes), dtype=np.int8)
+
+        if group_col is None:
+            for label in range(len(labels)):
+                positions = rng.permutation(np.flatnonzero(label_codes == label))
+                split[positions] = np.repeat([0, 1, 2], targets[:, label])
+            return split
+
+        if group_col not in self.annotations.columns:
+            raise ValueError(f"[ERROR] {group_col} is not a column in the annotations.")
+
+        # assign whole groups (largest first) to the set which most needs
+        # their labels
+        group_codes, groups = pd.factorize(self.annotations[group_col])
+        group_counts = np.zeros((len(groups), len(labels)), dtype=int)
+        np.add.at(group_counts, (group_codes, label_codes), 1)
+        order = rng.permutation(len(groups))
+        order = order[np.argsort(-group_counts[order].sum(axis=1), kind="stable")]
+
+        current = np.zeros_like(targets)
+        group_split = np.empty(len(groups), dtype=np.int8)
+        allowed = np.array([frac_train, frac_val, frac_test]) > 0
+        for group in order:
+            need = (targets - current) @ group_counts[group]
+            need[~allowed] = np.iinfo(need.dtype).min
+            group_split[group] = np.argmax(need)
+            current[group_split[group]] += group_counts[group]
+
+        empty = [
+            name
+            for name, n, a in zip(
+                ["train", "val", "test"], current.sum(axis=1), allowed
+            )
+            if a and n == 0
+        ]
+        if empty:
+            print(
+                f"[WARNING] No annotations in the {empty} set(s). There may be too few groups in ``{group_col}`` to split."
+            )
+        return group_split[group_codes]
+
+    def _save_split(self, split: np.ndarray, split_file: str, params: dict) -> None:
+        """
+        Save the set of each annotation to a CSV file, with the parameters
+        used to create the split in extra columns.
+        """
+        set_names = np.array(["train", "val", "test"])
+        saved = pd.DataFrame(
+            {"split": set_names[split]}, index=self.annotations.index.astype(str)
+        )
+        for name, value in params.items():
+            saved[name] = value
+        saved.to_csv(split_file, index_label="id")
+        print(f'[INFO] Split saved to "{split_file}".')
+
+    def _load_split(self, split_file: str, params: dict) -> np.ndarray | None:
+        """
+        Load the set of each annotation from a CSV file, or return None if
+        the file does not cover the same annotations or was created with
+        different parameters.
+        """
+        saved = pd.read_csv(
+            split_file, index_col="id", dtype={"id": str, "group_col": str}
+        )
+        ids = self.annotations.index.astype(str)
+        if len(saved) != len(ids) or not ids.isin(saved.index).all():
+            print(
+                f'[WARNING] "{split_file}" does not match the loaded annotations. Creating a new split.'
+            )
+            return None
+
+        changed = [
+            name
+            for name, value in params.items()
+            if name not in saved.columns
+            or not self._same_split_param(saved[name].iloc[0], value)
+        ]
+        if changed:
+            print(
+                f'[WARNING] "{split_file}" was created with different {changed}. Creating a new split.'
+            )
+            return None
+
+        print(f'[INFO] Split loaded from "{split_file}".')
+        codes = {"train": 0, "val": 1, "test": 2}
+        return saved["split"].reindex(ids).map(codes).to_numpy(dtype=np.int8)
+
+    @staticmethod
+    def _same_split_param(saved, value) -> bool:
+        """Compare a split parameter read from a split file to its new value."""
+        if pd.isna(saved) or value is None:
+            return pd.isna(saved) and value is None
+        if isinstance(value, str):
+            return str(saved) == value
+        return math.isclose(float(saved), value)
+
     def create_patch_datasets(
-        self, train_transform, val_transform, test_transform, df_train, df_val, df_test
+        self,
+        train_transform,
+        val_transform,
+        test_transform,
+        df_train,
+        df_val,
+        df_test,
+        fused_transform=False,
     ):
         train_dataset = PatchDataset(
             df_train,
@@ -696,6 +1125,7 @@ Please check your image paths and update them if necessary.'
             patch_paths_col=self.patch_paths_col,
             label_col=self.label_col,
             label_index_col="label_index",
+            fused_transform=fused_transform,
         )
         val_dataset = PatchDataset(
             df_val,
@@ -703,6 +1133,7 @@ Please check your image paths and update them if necessary.'
             patch_paths_col=self.patch_paths_col,
             label_col=self.label_col,
             label_index_col="label_index",
+            fused_transform=fused_transform,
         )
         if df_test is not None:
             test_dataset = PatchDataset(
@@ -711,6 +1142,7 @@ Please check your image paths and update them if necessary.'
                 patch_paths_col=self.patch_paths_col,
                 label_col=self.label_col,
                 label_index_col="label_index",
+                fused_transform=fused_transform,
             )
             datasets = {
                 "train": train_dataset,
@@ -732,6 +1164,7 @@ Please check your image paths and update them if necessary.'
         df_train,
         df_val,
         df_test,
+        fused_transform=False,
     ):
         train_dataset = PatchContextDataset(
             df_train,
@@ -741,6 +1174,7 @@ Please check your image paths and update them if necessary.'
             label_col=self.label_col,
             label_index_col="label_index",
             create_context=True,
+            fused_transform=fused_transform,
         )
         val_dataset = PatchContextDataset(
             df_val,
@@ -750,6 +1184,7 @@ Please check your image paths and update them if necessary.'
             label_col=self.label_col,
             label_index_col="label_index",
             create_context=True,
+            fused_transform=fused_transform,
         )
         if df_test is not None:
             test_dataset = PatchContextDataset(
@@ -760,6 +1195,7 @@ Please check your image paths and update them if necessary.'
                 label_col=self.label_col,
                 label_index_col="label_index",
                 create_context=True,
+                fused_transform=fused_transform,
             )
             datasets = {
                 "train": train_dataset,
@@ -778,6 +1214,8 @@ Please check your image paths and update them if necessary.'
         sampler: Sampler | (str | None) | None = "default",
         shuffle: bool | None = False,
         num_workers: int | None = 0,
+        auto_tune: bool | dict = False,
+        seed: int | None = None,
         **kwargs,
     ) -> None:
         """Creates a dictionary containing PyTorch dataloaders
@@ -789,10 +1227,27 @@ Please check your image paths and update them if necessary.'
             The batch size to use for the dataloader. By default ``16``.
         sampler : Sampler, str or None, optional
             The sampler to use when creating batches from the training dataset.
+            Can be a PyTorch sampler, ``"default"`` (a weighted random sampler
+            which balances labels), ``"streaming"`` (a
+            :class:`~.classify.samplers.ClassBalancedShardSampler` which
+            balances labels while streaming through the dataset one parent
+            image at a time) or ``None``. By default ``"default"``.
         shuffle : bool, optional
             Whether to shuffle the dataset during training. By default ``False``.
         num_workers : int, optional
             The number of worker threads to use for loading data. By default ``0``.
+        auto_tune : bool or dict, optional
+            Whether to benchmark a few DataLoader configurations on the
+            training dataset and use the fastest for all dataloaders. If a
+            dictionary, it is passed as keyword arguments to
+            :func:`~.classify.dataloader_tuning.tune_dataloader` (e.g.
+            ``{"batch_sizes": [32, 64], "memory_budget_mb": 2000}``). The
+            chosen settings override ``batch_size``, ``num_workers`` and any
+            of ``pin_memory``, ``persistent_workers`` and ``prefetch_factor``
+            and are printed so they can be pinned. By default ``False``.
+        seed : int or None, optional
+            The random seed for the ``"default"`` or ``"streaming"``
+            samplers, so that epochs are reproducible. By default ``None``.
         **kwds :
             Additional keyword arguments to pass to PyTorch's ``DataLoader`` constructor.
 
@@ -816,15 +1271,31 @@ Please check your image paths and update them if necessary.'
         if isinstance(sampler, str):
             if sampler == "default":
                 print("[INFO] Using default sampler.")
-                sampler = self._define_sampler()
+                sampler = self._define_sampler(seed=seed)
+            elif sampler == "streaming":
+                print("[INFO] Using streaming sampler.")
+                sampler = self._define_streaming_sampler(seed=seed)
             else:
                 raise ValueError(
-                    '[ERROR] ``sampler`` can only be a PyTorch sampler, ``"default"`` or ``None``.'
+                    '[ERROR] ``sampler`` can only be a PyTorch sampler, ``"default"``, ``"streaming"`` or ``None``.'
                 )
 
         if sampler and shuffle:
             print("[INFO] ``sampler`` is defined so train dataset will be un-shuffled.")
 
+        if auto_tune:
+            tune_kwargs = auto_tune if isinstance(auto_tune, dict) else {}
+            tune_set = "train" if "train" in datasets.keys() else next(iter(datasets))
+            settings, _ = tune_dataloader(
+                datasets[tune_set],
+                sampler=sampler if tune_set == "train" else None,
+                shuffle=False if tune_set == "train" else shuffle,
+                **tune_kwargs,
+            )
+            batch_size = settings.pop("batch_size")
+            num_workers = settings.pop("num_workers")
+            kwargs.update(settings)
+
         dataloaders = {
             set_name: DataLoader(
                 datasets[set_name],
@@ -841,10 +1312,15 @@ Please check your image paths and update them if necessary.'
 
         return dataloaders
 
-    def _define_sampler(self):
+    def _define_sampler(self, seed: int | None = None):
         """Defines a weighted random sampler for the training dataset.
         Weighting are proportional to the reciprocal of number of instances of each label.
 
+        Parameters
+        ----------
+        seed : int or None, optional
+            The random seed for the sampler, by default ``None``.
+
         Returns
         -------
         torch.utils.data.WeightedRandomSampler
@@ -861,14 +1337,17 @@ Please check your image paths and update them if necessary.'
         datasets = self.datasets
 
         if "train" in datasets.keys():
-            value_counts = (
-                datasets["train"].patch_df[self.label_col].value_counts().to_list()
-            )
-            weights = np.reciprocal(Tensor(value_counts))
-            weights = weights.double()
+            label_indices = datasets["train"].patch_df["label_index"].to_numpy()
+            # weights indexed by label index (not by value_counts order)
+            label_counts = np.bincount(label_indices, minlength=len(self.labels_map))
+            weights = np.reciprocal(Tensor(label_counts).double())
+            generator = None
+            if seed is not None:
+                generator = torch.Generator().manual_seed(seed)
             sampler = WeightedRandomSampler(
-                weights[datasets["train"].patch_df["label_index"].tolist()],
+                weights[label_indices],
                 num_samples=len(datasets["train"].patch_df),
+                generator=generator,
             )
 
         else:
@@ -876,6 +1355,39 @@ Please check your image paths and update them if necessary.'
 
         return sampler
 
+    def _define_streaming_sampler(self, seed: int | None = None):
+        """Defines a class-balanced, shard-aware streaming sampler for the
+        training dataset, using parent images as shards (if known).
+
+        Parameters
+        ----------
+        seed : int or None, optional
+            The random seed for the sampler. If ``None``, uses ``0``.
+
+        Returns
+        -------
+        ClassBalancedShardSampler
+            The sampler
+
+        Raises
+        ------
+        ValueError
+            If "train" cannot be found in ``self.datasets.keys()``.
+        """
+        if not self.datasets:
+            self.create_datasets()
+
+        if "train" not in self.datasets.keys():
+            raise ValueError('[ERROR] "train" should be one the dataset names.')
+
+        patch_df = self.datasets["train"].patch_df
+        shard_ids = patch_df["parent_id"] if "parent_id" in patch_df.columns else None
+        return ClassBalancedShardSampler(
+            patch_df["label_index"].to_numpy(),
+            shard_ids=shard_ids,
+            seed=0 if seed is None else seed,
+        )
+
     def _get_label_index(self, label: str) -> int:
         """Gets the index of a label.
 
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+import numpy as np
+import torch
+
+
+class MetricsAccumulator:
+    """
+    Accumulate a confusion matrix (and, optionally, histograms of predicted
+    scores for ROC-AUC) batch by batch, on the same device as the model
+    outputs.
+
+    Precision, recall, F-score and support (per class and micro/macro/weighted
+    averages) are derived from the confusion matrix and so cost
+    ``O(n_classes ** 2)`` to compute, however many samples were seen.
+    ROC-AUC is approximated from histograms of the predicted scores.
+
+    Parameters
+    ----------
+    num_classes : int or None, optional
+        The number of classes. If ``None``, this is set from the shape of
+        the scores in the first call to ``update``. By default ``None``.
+    roc_auc_bins : int or None, optional
+        The number of histogram bins to use for approximating ROC-AUC. If
+        ``None``, ROC-AUC is not computed. By default ``1000``.
+
+    Attributes
+    ----------
+    confusion_matrix : torch.Tensor or None
+        The confusion matrix, of shape ``(num_classes, num_classes)``, with
+        true labels as rows and predicted labels as columns.
+    """
+
+    def __init__(
+        self,
+        num_classes: int | None = None,
+        roc_auc_bins: int | None = 1000,
+    ):
+        self.num_classes = num_classes
+        self.roc_auc_bins = roc_auc_bins
+        self.confusion_matrix = None
+        self._pos_hist = None
+        self._neg_hist = None
+        self._score_classes = None
+
+    def _init_counts(self, device: torch.device) -> None:
+        n = self.num_classes
+        self.confusion_matrix = torch.zeros(n * n, dtype=torch.int64, device=device)
+        if self.roc_auc_bins:
+            self._pos_hist = torch.zeros(
+                n * self.roc_auc_bins, dtype=torch.int64, device=device
+            )
+            self._neg_hist = torch.zeros_like(self._pos_hist)
+
+    def update(
+        self,
+        y_true: torch.Tensor,
+        y_pred: torch.Tensor,
+        y_score: torch.Tensor | None = None,
+    ) -> None:
+        """
+        Add a batch of labels, predictions and scores.
+
+        Parameters
+        ----------
+        y_true : torch.Tensor
+            The true label indices, shape ``(batch_size,)``. Negative label
+            indices (i.e. unlabelled samples) are ignored.
+        y_pred : torch.Tensor
+            The predicted label indices, shape ``(batch_size,)``.
+        y_score : torch.Tensor or None, optional
+            The predicted probabilities for each class, shape
+            ``(batch_size, n_classes)``. Only needed for ROC-AUC.
+            By default ``None``.
+        """
+        y_true = torch.as_tensor(y_true).long().flatten()
+        y_pred = torch.as_tensor(y_pred, device=y_true.device).long().flatten()
+
+        if self.num_classes is None:
+            self.num_classes = int(y_score.shape[1])
+        if self.confusion_matrix is None:
+            self._init_counts(y_true.device)
+
+        keep = y_true >= 0
+        y_true = y_true[keep]
+        y_pred = y_pred[keep]
+        n = self.num_classes
+        self.confusion_matrix += torch.bincount(y_true * n + y_pred, minlength=n * n)
+
+        if self.roc_auc_bins and y_score is not None:
+            y_score = torch.as_tensor(y_score, device=y_true.device)[keep]
+            if y_score.ndim != 2 or y_score.shape[1] != n:
+                # e.g. scores for only one class, cannot compute ROC-AUC
+                self._score_classes = y_score.shape[-1]
+                return
+            bins = (y_score.float() * self.roc_auc_bins).long()
+            bins = bins.clamp(0, self.roc_auc_bins - 1)
+            bins += torch.arange(n, device=bins.device) * self.roc_auc_bins
+            is_pos = torch.nn.functional.one_hot(y_true, n).bool()
+            self._pos_hist += torch.bincount(
+                bins[is_pos], minlength=n * self.roc_auc_bins
+            )
+            self._neg_hist += torch.bincount(
+                bins[~is_pos], minlength=n * self.roc_auc_bins
+            )
+
+    def compute(self) -> dict:
+        """
+        Compute the metrics from the accumulated counts.
+
+        Returns
+        -------
+        dict
+            A dictionary with keys ``"micro"``, ``"macro"``, ``"weighted"``
+            (each a tuple of precision, recall, F-score, support, as
+            returned by :func:`sklearn.metrics.precision_recall_fscore_support`
+            with ``average`` set to the key), ``"per_class"`` (a tuple of
+            the label indices and arrays of precision, recall, F-score and
+            support, for each label seen in either the true or predicted
+            labels) and ``"rocauc"`` (a dictionary mapping average type to
+            ROC-AUC, if computed).
+
+        Notes
+        -----
+        Precision/recall/F-score are set to ``0`` if undefined (i.e. if there
+        are no predicted/true samples for a label), matching the default
+        behaviour of ``scikit-learn``.
+        """
+        n = self.num_classes
+        cm = self.confusion_matrix.view(n, n).double().cpu().numpy()
+
+        tp = np.diag(cm)
+        true_count = cm.sum(axis=1)
+        pred_count = cm.sum(axis=0)
+        labels = np.flatnonzero((true_count + pred_count) > 0)
+
+        def _prf(tp, pred_count, true_count):
+            prec = np.divide(
+                tp, pred_count, out=np.zeros_like(tp), where=pred_count > 0
+            )
+            rcall = np.divide(
+                tp, true_count, out=np.zeros_like(tp), where=true_count > 0
+            )
+            denom = prec + rcall
+            fscore = np.divide(
+                2 * prec * rcall, denom, out=np.zeros_like(tp), where=denom > 0
+            )
+            return prec, rcall, fscore
+
+        prec, rcall, fscore = _prf(tp[labels], pred_count[labels], true_count[labels])
+        support = true_count[labels]
+
+        results = {
+            "per_class": (labels, prec, rcall, fscore, support.astype(int)),
+            "micro": tuple(
+                v.item()
+                for v in _prf(
+                    np.array([tp.sum()]),
+                    np.array([pred_count.sum()]),
+                    np.array([true_count.sum()]),
+                )
+            )
+            + (None,),
+            "macro": (
+                float(prec.mean()),
+                float(rcall.mean()),
+                float(fscore.mean()),
+                None,
+            ),
+        }
+        if support.sum() > 0:
+            weights = support / support.sum()
+            results["weighted"] = (
+                float((prec * weights).sum()),
+                float((rcall * weights).sum()),
+                float((fscore * weights).sum()),
+                None,
+            )
+        else:
+            results["weighted"] = (0.0, 0.0, 0.0, None)
+
+        results["rocauc"] = self._compute_roc_auc(true_count)
+        return results
+
+    def _compute_roc_auc(self, true_count: np.ndarray) -> dict:
+        """Approximate one-vs-rest ROC-AUC from the score histograms."""
+        if not self.roc_auc_bins or self._score_classes is not None:
+            return {}
+
+        n = self.num_classes
+        pos = self._pos_hist.view(n, self.roc_auc_bins).double().cpu().numpy()
+        neg = self._neg_hist.view(n, self.roc_auc_bins).double().cpu().numpy()
+
+        # each class needs both positive and negative samples
+        if np.any(pos.sum(axis=1) == 0) or np.any(neg.sum(axis=1) == 0):
+            return {}
+
+        # sweep thresholds from high to low scores, trapezoidal rule
+        tpr = np.cumsum(pos[:, ::-1], axis=1) / pos.sum(axis=1, keepdims=True)
+        fpr = np.cumsum(neg[:, ::-1], axis=1) / neg.sum(axis=1, keepdims=True)
+        tpr = np.concatenate([np.zeros((n, 1)), tpr], axis=1)
+        fpr = np.concatenate([np.zeros((n, 1)), fpr], axis=1)
+        aucs = (np.diff(fpr, axis=1) * (tpr[:, 1:] + tpr[:, :-1]) / 2).sum(axis=1)
+
+        if n == 2:
+            # binary case uses the score of the greater label
+            return {avrg: float(aucs[1]) for avrg in ["micro", "macro", "weighted"]}
+        return {
+            "macro": float(aucs.mean()),
+            "weighted": float((aucs * true_count).sum() / true_count.sum()),
+        }
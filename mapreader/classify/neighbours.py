@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+from collections.abc import Hashable
+
+import numpy as np
+
+from .feature_cache import FeatureCache
+
+
+class NearestNeighbourIndex:
+    """
+    A nearest-neighbour index over patch embeddings, for finding patches
+    which are similar to a given patch.
+
+    The index can either be exact ("flat"), comparing each query against all
+    vectors, or approximate ("IVF"), clustering the vectors using k-means
+    and only comparing each query against the vectors in its ``n_probe``
+    nearest clusters.
+
+    Vectors are stored as a contiguous float32 array, in the same layout as
+    FAISS's flat indexes (see ``to_faiss``).
+
+    Parameters
+    ----------
+    metric : str, optional
+        The distance metric to use, either ``"cosine"`` or ``"l2"`` (squared
+        Euclidean distance). By default ``"cosine"``.
+    n_lists : int or None, optional
+        The number of clusters (inverted lists) to use for an approximate
+        (IVF) index. If ``None``, an exact (flat) index is used.
+        By default ``None``.
+    n_probe : int, optional
+        The number of clusters to search for each query when using an IVF
+        index, by default ``8``.
+    seed : int, optional
+        The random seed used for k-means, by default ``0``.
+
+    Attributes
+    ----------
+    patch_ids : numpy.ndarray
+        The patch IDs, one per vector.
+    vectors : numpy.ndarray
+        The vectors (normalized if using cosine distance).
+    centroids : numpy.ndarray or None
+        The k-means cluster centroids (IVF index only).
+    """
+
+    def __init__(
+        self,
+        metric: str = "cosine",
+        n_lists: int | None = None,
+        n_probe: int = 8,
+        seed: int = 0,
+    ):
+        if metric not in ["cosine", "l2"]:
+            raise ValueError('[ERROR] ``metric`` must be one of "cosine" or "l2".')
+        if n_lists is not None and n_lists < 1:
+            raise ValueError("[ERROR] ``n_lists`` must be at least 1.")
+
+        self.metric = metric
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.seed = seed
+
+        self.patch_ids = np.array([], dtype=object)
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.centroids = None
+        self._list_order = None
+        self._list_offsets = None
+        self._positions = {}
+
+    def __len__(self) -> int:
+        return len(self.patch_ids)
+
+    @classmethod
+    def from_feature_cache(
+        cls,
+        feature_cache: FeatureCache,
+        patch_ids: list[Hashable] | None = None,
+        **kwargs,
+    ) -> NearestNeighbourIndex:
+        """
+        Build an index from the vectors in a ``FeatureCache``.
+
+        Parameters
+        ----------
+        feature_cache : FeatureCache
+            The feature cache (e.g. created by
+            ``ClassifierContainer.embed_patches``).
+        patch_ids : list or None, optional
+            The patch IDs to include. If ``None``, all patches in the cache
+            are included. By default ``None``.
+        **kwargs
+            Keyword arguments passed to ``NearestNeighbourIndex``.
+
+        Returns
+        -------
+        NearestNeighbourIndex
+            The index.
+        """
+        if patch_ids is None:
+            patch_ids = feature_cache.patch_ids
+        index = cls(**kwargs)
+        index.build(patch_ids, feature_cache.get(patch_ids))
+        return index
+
+    def build(self, patch_ids: list[Hashable], vectors: np.ndarray) -> None:
+        """
+        Build the index.
+
+        Parameters
+        ----------
+        patch_ids : list
+            The patch IDs, one per vector.
+        vectors : numpy.ndarray
+            Array of shape ``(len(patch_ids), dim)``.
+
+        Raises
+        ------
+        ValueError
+            If the number of vectors does not match the number of patch IDs.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(patch_ids):
+            raise ValueError(
+                "[ERROR] ``vectors`` must be a 2D array with one row per patch ID."
+            )
+
+        self.patch_ids = np.empty(len(patch_ids), dtype=object)
+        self.patch_ids[:] = list(patch_ids)
+        self.vectors = self._prepare(vectors)
+        self._positions = {patch_id: i for i, patch_id in enumerate(self.patch_ids)}
+
+        if self.n_lists is None:
+            self.centroids = None
+            self._list_order = None
+            self._list_offsets = None
+        else:
+            self._train_ivf()
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        """Normalize vectors if using cosine distance."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.metric == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, np.finfo(np.float32).eps)
+        return vectors
+
+    def _distances(self, queries: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """Distances between each query and each vector."""
+        dots = queries @ vectors.T
+        if self.metric == "cosine":
+            return 1 - dots
+        return (queries**2).sum(axis=1)[:, None] - 2 * dots + (vectors**2).sum(axis=1)
+
+    def _train_ivf(self, n_iter: int = 10) -> None:
+        """Cluster the vectors using k-means and build the inverted lists."""
+        rng = np.random.default_rng(self.seed)
+        n_lists = min(self.n_lists, len(self.vectors))
+
+        # as in FAISS, train on a sample of at most 256 vectors per list
+        n_train = min(len(self.vectors), 256 * n_lists)
+        train_vectors = self.vectors[
+            np.sort(rng.choice(len(self.vectors), size=n_train, replace=False))
+        ]
+        centroids = train_vectors[
+            rng.choice(n_train, size=n_lists, replace=False)
+        ].copy()
+
+        for _ in range(n_iter):
+            assignments = self._assign(train_vectors, centroids)
+            counts = np.bincount(assignments, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, train_vectors)
+            non_empty = counts > 0
+            centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+            if self.metric == "cosine":
+                centroids = self._prepare(centroids)
+
+        assignments = self._assign(self.vectors, centroids)
+        self.centroids = centroids
+        self._list_order = np.argsort(assignments, kind="stable")
+        self._list_offsets = np.searchsorted(
+            assignments[self._list_order], np.arange(n_lists + 1)
+        )
+
+    def _assign(
+        self, vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 4096
+    ) -> np.ndarray:
+        """Index of the nearest centroid to each vector."""
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            batch = vectors[start : start + batch_size]
+            assignments[start : start + batch_size] = self._distances(
+                batch, centroids
+            ).argmin(axis=1)
+        return assignments
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        n_probe: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the ``k`` nearest neighbours of each query vector.
+
+        Parameters
+        ----------
+        queries : numpy.ndarray
+            Array of shape ``(n_queries, dim)`` (or a single vector).
+        k : int, optional
+            The number of neighbours to return, by default ``10``.
+        n_probe : int or None, optional
+            The number of clusters to search (IVF index only). If ``None``,
+            ``self.n_probe`` is used. By default ``None``.
+
+        Returns
+        -------
+        tuple of numpy.ndarray
+            The distances and patch IDs of the nearest neighbours, each of
+            shape ``(n_queries, k)`` and sorted by distance. If fewer than
+            ``k`` neighbours are found, distances are padded with ``inf`` and
+            patch IDs with ``None``.
+        """
+        if not len(self):
+            raise ValueError("[ERROR] The index is empty. Use ``build`` first.")
+
+        queries = self._prepare(np.atleast_2d(queries))
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        positions = np.full((len(queries), k), -1, dtype=np.int64)
+
+        if self.centroids is None:
+            # exact search, one matrix product per batch of queries
+            n_found = min(k, len(self))
+            for start in range(0, len(queries), 256):
+                batch_distances = self._distances(
+                    queries[start : start + 256], self.vectors
+                )
+                top = np.argpartition(batch_distances, n_found - 1, axis=1)[:, :n_found]
+                top_distances = np.take_along_axis(batch_distances, top, axis=1)
+                order = np.argsort(top_distances, axis=1, kind="stable")
+                distances[start : start + 256, :n_found] = np.take_along_axis(
+                    top_distances, order, axis=1
+                )
+                positions[start : start + 256, :n_found] = np.take_along_axis(
+                    top, order, axis=1
+                )
+        else:
+            probe = min(n_probe or self.n_probe, len(self.centroids))
+            nearest_lists = np.argsort(
+                self._distances(queries, self.centroids), axis=1
+            )[:, :probe]
+            for i, query in enumerate(queries):
+                candidates = np.concatenate(
+                    [
+                        self._list_order[
+                            self._list_offsets[list_idx] : self._list_offsets[
+                                list_idx + 1
+                            ]
+                        ]
+                        for list_idx in nearest_lists[i]
+                    ]
+                )
+                if not len(candidates):
+                    continue
+                candidate_distances = self._distances(
+                    query[None], self.vectors[candidates]
+                )[0]
+                n_found = min(k, len(candidates))
+                top = np.argpartition(candidate_distances, n_found - 1)[:n_found]
+                top = top[np.argsort(candidate_distances[top], kind="stable")]
+                distances[i, :n_found] = candidate_distances[top]
+                positions[i, :n_found] = candidates[top]
+
+        patch_ids = np.where(positions >= 0, self.patch_ids[positions], None)
+        return distances, patch_ids
+
+    def search_by_id(
+        self,
+        patch_id: Hashable,
+        k: int = 10,
+        n_probe: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the ``k`` patches most similar to a patch in the index
+        (excluding the patch itself).
+
+        Parameters
+        ----------
+        patch_id : Hashable
+            The ID of the patch.
+        k : int, optional
+            The number of neighbours to return, by default ``10``.
+        n_probe : int or None, optional
+            The number of clusters to search (IVF index only). If ``None``,
+            ``self.n_probe`` is used. By default ``None``.
+
+        Returns
+        -------
+        tuple of numpy.ndarray
+            The distances and patch IDs of the nearest neighbours, each of
+            shape ``(k,)``.
+
+        Raises
+        ------
+        KeyError
+            If the patch ID is not in the index.
+        """
+        if patch_id not in self._positions:
+            raise KeyError(f"[ERROR] {patch_id} is not in the index.")
+
+        distances, patch_ids = self.search(
+            self.vectors[self._positions[patch_id]], k=k + 1, n_probe=n_probe
+        )
+        keep = patch_ids[0] != patch_id
+        return distances[0][keep][:k], patch_ids[0][keep][:k]
+
+    def save(self, save_path: str) -> None:
+        """
+        Save the index to a ``.npz`` file.
+
+        Integer patch IDs are saved as integers, all other patch IDs as
+        strings.
+
+        Parameters
+        ----------
+        save_path : str
+            The path to save the index to.
+        """
+        patch_ids = np.array(list(self.patch_ids))
+        if patch_ids.dtype.kind not in "iu":
+            patch_ids = patch_ids.astype(str)  # saved without pickling
+        arrays = {
+            "patch_ids": patch_ids,
+            "vectors": self.vectors,
+            "settings": np.array([self.metric, str(self.n_lists), str(self.n_probe)]),
+        }
+        if self.centroids is not None:
+            arrays.update(
+                centroids=self.centroids,
+                list_order=self._list_order,
+                list_offsets=self._list_offsets,
+            )
+        with open(save_path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, load_path: str) -> NearestNeighbourIndex:
+        """
+        Load an index saved using ``save``.
+
+        Parameters
+        ----------
+        load_path : str
+            The path to the ``.npz`` file.
+
+        Returns
+        -------
+        NearestNeighbourIndex
+            The index.
+        """
+        with np.load(load_path) as arrays:
+            metric, n_lists, n_probe = arrays["settings"].tolist()
+            index = cls(
+                metric=metric,
+                n_lists=None if n_lists == "None" else int(n_lists),
+                n_probe=int(n_probe),
+            )
+            index.patch_ids = arrays["patch_ids"].astype(object)
+            index.vectors = arrays["vectors"]
+            if "centroids" in arrays:
+                index.centroids = arrays["centroids"]
+                index._list_order = arrays["list_order"]
+                index._list_offsets = arrays["list_offsets"]
+        index._positions = {patch_id: i for i, patch_id in enumerate(index.patch_ids)}
+        return index
+
+    def to_faiss(self):
+        """
+        Create an equivalent exact FAISS index (requires ``faiss`` to be
+        installed).
+
+        Returns
+        -------
+        faiss.Index
+            An ``IndexFlatIP`` (cosine) or ``IndexFlatL2`` (l2) containing the
+            vectors. Positions in the FAISS index match ``patch_ids``.
+
+        Raises
+        ------
+        ImportError
+            If ``faiss`` is not installed.
+        """
+        try:
+            import faiss
+        except ImportError:
+            raise ImportError(
+                "[ERROR] faiss is not installed. Please install it (e.g. ``pip install faiss-cpu``)."
+            )
+
+        dim = self.vectors.shape[1]
+        index = (
+            faiss.IndexFlatIP(dim)
+            if self.metric == "cosine"
+            else faiss.IndexFlatL2(dim)
+        )
+        index.add(self.vectors)
+        return index
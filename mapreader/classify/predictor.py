@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+
+class ExportedPredictor:
+    """
+    A lightweight predictor for models exported using
+    ``ClassifierContainer.export_model``.
+
+    Exported models are run using ``torch.jit`` (TorchScript) or
+    ``onnxruntime`` (ONNX) on the CPU and do not need the model's class
+    definitions or the rest of the training code.
+
+    Parameters
+    ----------
+    model_path : str
+        The path to the exported model. The ``.json`` file saved alongside
+        it (i.e. ``model_path`` + ``".json"``) must also exist.
+    num_threads : int or None, optional
+        The number of CPU threads to use. If ``None``, uses the default.
+        By default ``None``.
+
+    Attributes
+    ----------
+    export_format : str
+        The format of the exported model ("torchscript" or "onnx").
+    labels_map : dict
+        A dictionary mapping label indices to their labels.
+    input_size : tuple of int
+        The input size of the model.
+    num_inputs : int
+        The number of inputs the model takes.
+    pred_conf : list
+        The predicted probabilities from the last call to ``predict``.
+    pred_label_indices : list
+        The predicted label indices from the last call to ``predict``.
+    pred_label : list
+        The predicted labels from the last call to ``predict``.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the model or its ``.json`` file cannot be found.
+    ImportError
+        If the model is an ONNX model and ``onnxruntime`` is not installed.
+    """
+
+    def __init__(self, model_path: str, num_threads: int | None = None):
+        for path in [model_path, f"{model_path}.json"]:
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f'[ERROR] "{path}" cannot be found.')
+
+        with open(f"{model_path}.json") as f:
+            metadata = json.load(f)
+        self.export_format = metadata["export_format"]
+        self.labels_map = {int(k): v for k, v in metadata["labels_map"].items()}
+        self.input_size = tuple(metadata["input_size"])
+        self.num_inputs = metadata["num_inputs"]
+
+        if self.export_format == "onnx":
+            try:
+                import onnxruntime
+            except ImportError:
+                raise ImportError(
+                    "[ERROR] Running ONNX models requires onnxruntime. Please install it using ``pip install onnxruntime``."
+                )
+            options = onnxruntime.SessionOptions()
+            if num_threads is not None:
+                options.intra_op_num_threads = num_threads
+            self.session = onnxruntime.InferenceSession(
+                model_path, options, providers=["CPUExecutionProvider"]
+            )
+            self.input_names = [i.name for i in self.session.get_inputs()]
+        else:
+            if num_threads is not None:
+                torch.set_num_threads(num_threads)
+            self.model = torch.jit.load(model_path, map_location="cpu").eval()
+
+        self.pred_conf = []
+        self.pred_label_indices = []
+        self.pred_label = []
+
+    def predict_batch(self, *inputs: torch.Tensor | np.ndarray) -> np.ndarray:
+        """
+        Predict the probabilities of each label for a batch of inputs.
+
+        Parameters
+        ----------
+        *inputs : torch.Tensor or numpy.ndarray
+            The (transformed) images, each of shape
+            ``(batch_size, 3, height, width)``. One per model input.
+
+        Returns
+        -------
+        numpy.ndarray
+            The predicted probabilities, of shape ``(batch_size, n_labels)``.
+        """
+        if self.export_format == "onnx":
+            logits = self.session.run(
+                None,
+                {
+                    name: np.asarray(input, dtype=np.float32)
+                    for name, input in zip(self.input_names, inputs)
+                },
+            )[0]
+            logits = torch.from_numpy(logits)
+        else:
+            with torch.no_grad():
+                logits = self.model(
+                    *(torch.as_tensor(input, dtype=torch.float32) for input in inputs)
+                )
+        return torch.nn.functional.softmax(logits.float(), dim=1).numpy()
+
+    def predict(
+        self,
+        dataset: Dataset,
+        batch_size: int = 64,
+        num_workers: int = 0,
+    ) -> pd.DataFrame:
+        """
+        Predict labels for all patches in a dataset.
+
+        Parameters
+        ----------
+        dataset : PatchDataset or PatchContextDataset
+            The dataset to predict labels for.
+        batch_size : int, optional
+            The batch size, by default ``64``.
+        num_workers : int, optional
+            The number of worker processes to use for loading data, by default
+            ``0``.
+
+        Returns
+        -------
+        pandas.DataFrame
+            A copy of the dataset's patch DataFrame with the
+            "predicted_label", "pred" and "conf" columns added (as in
+            ``ClassifierContainer.save_predictions``).
+        """
+        batch_transform = getattr(dataset, "batch_transform", None)
+        dataloader = DataLoader(
+            dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers
+        )
+
+        pred_conf = []
+        for inputs, _labels, _label_indices in dataloader:
+            if batch_transform is not None:
+                inputs = tuple(batch_transform(input) for input in inputs)
+            pred_conf.append(self.predict_batch(*inputs))
+
+        pred_conf = (
+            np.concatenate(pred_conf)
+            if len(pred_conf)
+            else np.empty((0, len(self.labels_map)))
+        )
+        self.pred_conf = pred_conf.tolist()
+        self.pred_label_indices = pred_conf.argmax(axis=1).tolist()
+        self.pred_label = [
+            self.labels_map.get(i, None) for i in self.pred_label_indices
+        ]
+
+        patch_df = dataset.patch_df.copy()
+        patch_df["predicted_label"] = self.pred_label
+        patch_df["pred"] = self.pred_label_indices
+        patch_df["conf"] = pred_conf.max(axis=1) if len(pred_conf) else []
+        return patch_df
+
+    def save_predictions(
+        self,
+        dataset: Dataset,
+        save_path: str = "predictions_patch_df.csv",
+        delimiter: str = ",",
+        **kwargs,
+    ) -> None:
+        """
+        Predict labels for all patches in a dataset and save the predictions
+        to a CSV file.
+
+        Parameters
+        ----------
+        dataset : PatchDataset or PatchContextDataset
+            The dataset to predict labels for.
+        save_path : str, optional
+            The path to save the predictions to, by default
+            ``"predictions_patch_df.csv"``.
+        delimiter : str, optional
+            The delimiter to use, by default ``","``.
+        **kwargs
+            Keyword arguments passed to ``predict``.
+        """
+        patch_df = self.predict(dataset, **kwargs)
+        patch_df.to_csv(save_path, sep=delimiter)
+        print(f"[INFO] Saved predictions to {save_path}.")
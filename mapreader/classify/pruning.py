@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.fx import Graph
+
+# layers which keep the channels of their input (so pruning can look through them)
+_CHANNELWISE_MODULES = (
+    nn.ReLU,
+    nn.ReLU6,
+    nn.LeakyReLU,
+    nn.ELU,
+    nn.GELU,
+    nn.SiLU,
+    nn.Hardswish,
+    nn.Sigmoid,
+    nn.Tanh,
+    nn.Dropout,
+    nn.Dropout2d,
+    nn.MaxPool2d,
+    nn.AvgPool2d,
+    nn.Identity,
+)
+_CHANNELWISE_FUNCTIONS = (
+    F.relu,
+    F.relu6,
+    F.leaky_relu,
+    F.gelu,
+    F.silu,
+    F.dropout,
+    F.max_pool2d,
+    F.avg_pool2d,
+    torch.relu,
+    torch.sigmoid,
+    torch.tanh,
+)
+
+
+def _prunable_convs(graph: Graph, modules: dict[str, nn.Module]) -> list[tuple]:
+    """
+    Find convolutional layers whose output only feeds one other
+    convolutional layer.
+
+    Returns
+    -------
+    list of tuple
+        The names of the convolutional layer, the batch norm layers in
+        between and the next convolutional layer.
+    """
+    chains = []
+    for node in graph.nodes:
+        if not _is_conv(node, modules):
+            continue
+        bn_names = []
+        current = node
+        while len(current.users) == 1:
+            (user,) = current.users
+            if user.op == "call_module":
+                module = modules[user.target]
+                if isinstance(module, nn.BatchNorm2d):
+                    bn_names.append(user.target)
+                elif _is_conv(user, modules):
+                    chains.append((node.target, bn_names, user.target))
+                    break
+                elif not isinstance(module, _CHANNELWISE_MODULES):
+                    break
+            elif user.op == "call_function" and user.target in _CHANNELWISE_FUNCTIONS:
+                pass
+            elif user.op == "call_method" and user.target in ["relu", "relu_"]:
+                pass
+            else:
+                break
+            if user.args[0] is not current:
+                break  # e.g. operator.add(other, current)
+            current = user
+    return chains
+
+
+def _is_conv(node, modules: dict[str, nn.Module]) -> bool:
+    if node.op != "call_module":
+        return False
+    module = modules[node.target]
+    return type(module) is nn.Conv2d and module.groups == 1
+
+
+def _set_module(model: nn.Module, name: str, module: nn.Module) -> None:
+    parent_name, _, attr = name.rpartition(".")
+    setattr(model.get_submodule(parent_name), attr, module)
+
+
+def _slice_conv(conv: nn.Conv2d, keep: torch.Tensor, dim: int) -> nn.Conv2d:
+    """Copy a convolutional layer, keeping only some output (dim=0) or input (dim=1) channels."""
+    new_conv = nn.Conv2d(
+        conv.in_channels if dim == 0 else len(keep),
+        len(keep) if dim == 0 else conv.out_channels,
+        conv.kernel_size,
+        stride=conv.stride,
+        padding=conv.padding,
+        dilation=conv.dilation,
+        bias=conv.bias is not None,
+        padding_mode=conv.padding_mode,
+        device=conv.weight.device,
+        dtype=conv.weight.dtype,
+    )
+    with torch.no_grad():
+        new_conv.weight.copy_(conv.weight.index_select(dim, keep))
+        if conv.bias is not None:
+            new_conv.bias.copy_(conv.bias if dim == 1 else conv.bias[keep])
+    new_conv.train(conv.training)
+    return new_conv
+
+
+def _slice_bn(bn: nn.BatchNorm2d, keep: torch.Tensor) -> nn.BatchNorm2d:
+    """Copy a batch norm layer, keeping only some channels."""
+    new_bn = nn.BatchNorm2d(
+        len(keep),
+        eps=bn.eps,
+        momentum=bn.momentum,
+        affine=bn.affine,
+        track_running_stats=bn.track_running_stats,
+        device=bn.weight.device if bn.affine else None,
+    )
+    with torch.no_grad():
+        if bn.affine:
+            new_bn.weight.copy_(bn.weight[keep])
+            new_bn.bias.copy_(bn.bias[keep])
+        if bn.track_running_stats:
+            new_bn.running_mean.copy_(bn.running_mean[keep])
+            new_bn.running_var.copy_(bn.running_var[keep])
+            new_bn.num_batches_tracked.copy_(bn.num_batches_tracked)
+    new_bn.train(bn.training)
+    return new_bn
+
+
+def prune_conv_channels(model: nn.Module, amount: float) -> int:
+    """
+    Remove the output channels with the smallest L2-norm from each prunable
+    convolutional layer of a model (in place), along with the matching
+    batch norm channels and input channels of the next convolutional layer.
+
+    Parameters
+    ----------
+    model : nn.Module
+        The model to prune. It must be traceable with ``torch.fx``.
+    amount : float
+        The fraction of output channels to remove from each layer.
+
+    Returns
+    -------
+    int
+        The number of convolutional layers pruned.
+    """
+    graph = torch.fx.symbolic_trace(model).graph
+    chains = _prunable_convs(graph, dict(model.named_modules()))
+
+    for conv_name, bn_names, next_name in chains:
+        # look layers up again, as a layer may be the next layer of a previous chain
+        conv = model.get_submodule(conv_name)
+        n_keep = max(conv.out_channels - int(amount * conv.out_channels), 1)
+        norms = conv.weight.detach().flatten(start_dim=1).norm(dim=1)
+        keep = norms.topk(n_keep).indices.sort().values
+
+        _set_module(model, conv_name, _slice_conv(conv, keep, dim=0))
+        for bn_name in bn_names:
+            _set_module(model, bn_name, _slice_bn(model.get_submodule(bn_name), keep))
+        next_conv = model.get_submodule(next_name)
+        _set_module(model, next_name, _slice_conv(next_conv, keep, dim=1))
+
+    return len(chains)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+from collections.abc import Iterator
+
+import numpy as np
+from torch.utils.data import Sampler
+
+
+class ClassBalancedShardSampler(Sampler[int]):
+    """
+    A class-balanced sampler which streams through a dataset one shard at a
+    time, for training sets too large to sample from at random.
+
+    Each epoch, every label is given an equal share of ``num_samples``. This
+    share is split between shards in proportion to how many patches with
+    that label each shard contains. Shards are then visited in a random
+    order and the samples drawn from each are passed through a fixed-size
+    shuffle buffer, so only one shard's indices (plus the buffer) are held
+    in memory at a time and reads stay local to a shard (e.g. one parent
+    map or one file/directory of patches).
+
+    Parameters
+    ----------
+    label_indices : array-like of int
+        The label index of each sample in the dataset.
+    shard_ids : array-like or None, optional
+        The shard (e.g. parent map) each sample belongs to. If ``None``,
+        contiguous blocks of ``shard_size`` samples are used as shards.
+        By default ``None``.
+    shard_size : int, optional
+        The number of samples per shard, if ``shard_ids`` is ``None``. By
+        default ``10000``.
+    buffer_size : int, optional
+        The size of the shuffle buffer, by default ``10000``.
+    num_samples : int or None, optional
+        The number of samples to draw each epoch. If ``None``, uses the
+        number of samples in the dataset. By default ``None``.
+    seed : int, optional
+        The random seed. Epoch ``e`` is drawn using ``seed + e`` so epochs
+        are reproducible. By default ``0``.
+
+    Notes
+    -----
+    Samples are drawn without replacement within a shard, unless a shard
+    has fewer samples of a label than it is asked for (i.e. for rare labels,
+    which are oversampled).
+
+    Each call to ``__iter__`` advances the epoch by one. Use ``set_epoch``
+    to choose the epoch explicitly (e.g. when resuming training).
+    """
+
+    def __init__(
+        self,
+        label_indices,
+        shard_ids=None,
+        shard_size: int = 10000,
+        buffer_size: int = 10000,
+        num_samples: int | None = None,
+        seed: int = 0,
+    ):
+        label_indices = np.asarray(label_indices)
+        if label_indices.ndim != 1:
+            raise ValueError("[ERROR] ``label_indices`` must be one-dimensional.")
+        if len(label_indices) and label_indices.min() < 0:
+            raise ValueError("[ERROR] ``label_indices`` must not be negative.")
+        if shard_size < 1 or buffer_size < 1:
+            raise ValueError("[ERROR] ``shard_size`` and ``buffer_size`` must be >= 1.")
+
+        self.label_indices = label_indices.astype(
+            np.min_scalar_type(max(int(label_indices.max(initial=0)), 1))
+        )
+        self.buffer_size = buffer_size
+        self.num_samples = len(label_indices) if num_samples is None else num_samples
+        self.seed = seed
+        self.epoch = 0
+
+        if shard_ids is None:
+            self._order = None
+            self._bounds = np.append(
+                np.arange(0, len(label_indices), shard_size), len(label_indices)
+            )
+        else:
+            shard_ids = np.asarray(shard_ids)
+            if len(shard_ids) != len(label_indices):
+                raise ValueError(
+                    "[ERROR] ``shard_ids`` and ``label_indices`` must be the same length."
+                )
+            _, shard_codes = np.unique(shard_ids, return_inverse=True)
+            self._order = np.argsort(shard_codes, kind="stable")
+            self._bounds = np.append(
+                0, np.cumsum(np.bincount(shard_codes, minlength=1))
+            )
+
+        # label counts per shard, shape (n_shards, n_labels)
+        n_labels = int(self.label_indices.max(initial=0)) + 1
+        self.shard_counts = (
+            np.stack(
+                [
+                    np.bincount(self._shard_labels(s), minlength=n_labels)
+                    for s in range(self.num_shards)
+                ]
+            )
+            if self.num_shards
+            else np.zeros((0, n_labels), dtype=int)
+        )
+
+    @property
+    def num_shards(self) -> int:
+        """The number of shards."""
+        return len(self._bounds) - 1
+
+    def _shard_indices(self, shard: int) -> np.ndarray:
+        start, end = self._bounds[shard], self._bounds[shard + 1]
+        if self._order is None:
+            return np.arange(start, end)
+        return self._order[start:end]
+
+    def _shard_labels(self, shard: int) -> np.ndarray:
+        if self._order is None:
+            return self.label_indices[self._bounds[shard] : self._bounds[shard + 1]]
+        return self.label_indices[self._shard_indices(shard)]
+
+    def set_epoch(self, epoch: int) -> None:
+        """
+        Set the epoch, which (with ``seed``) determines the samples drawn
+        by the next call to ``__iter__``.
+
+        Parameters
+        ----------
+        epoch : int
+            The epoch.
+        """
+        self.epoch = epoch
+
+    def _allocate(self, rng: np.random.Generator) -> np.ndarray:
+        """Split ``num_samples`` equally between labels, then between shards."""
+        label_totals = self.shard_counts.sum(axis=0)
+        present = np.flatnonzero(label_totals)
+        quotas = np.zeros(len(label_totals), dtype=int)
+        if len(present):
+            quotas[present] = self.num_samples // len(present)
+            remainder = self.num_samples % len(present)
+            quotas[rng.choice(present, size=remainder, replace=False)] += 1
+
+        allocation = np.zeros_like(self.shard_counts)
+        for label in present:
+            allocation[:, label] = rng.multinomial(
+                quotas[label], self.shard_counts[:, label] / label_totals[label]
+            )
+        return allocation
+
+    def __iter__(self) -> Iterator[int]:
+        rng = np.random.default_rng(self.seed + self.epoch)
+        self.epoch += 1
+        allocation = self._allocate(rng)
+
+        buffer = []
+        for shard in rng.permutation(self.num_shards):
+            if not allocation[shard].any():
+                continue
+            indices = self._shard_indices(shard)
+            labels = self._shard_labels(shard)
+            drawn = []
+            for label in np.flatnonzero(allocation[shard]):
+                members = indices[labels == label]
+                n = allocation[shard, label]
+                drawn.append(rng.choice(members, size=n, replace=n > len(members)))
+            drawn = np.concatenate(drawn)
+            rng.shuffle(drawn)
+
+            for index in drawn.tolist():
+                if len(buffer) < self.buffer_size:
+                    buffer.append(index)
+                else:
+                    i = rng.integers(self.buffer_size)
+                    yield buffer[i]
+                    buffer[i] = index
+
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def __len__(self) -> int:
+        return self.num_samples
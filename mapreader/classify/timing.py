@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+
+import torch
+
+
+class PhaseTimer:
+    """
+    Accumulate a breakdown of where time is spent in one phase of an epoch
+    (e.g. waiting for data, copying to the device, forward pass, backward
+    pass and metric bookkeeping).
+
+    Parameters
+    ----------
+    device : torch.device or str, optional
+        The device the model runs on. If this is a CUDA device and
+        ``synchronize`` is ``True``, CUDA is synchronised at the start and
+        end of each section so that asynchronous kernels are attributed to
+        the right section. By default ``"cpu"``.
+    synchronize : bool, optional
+        Whether to synchronise CUDA at section boundaries. This makes the
+        breakdown accurate at the cost of some throughput. By default
+        ``True``.
+
+    Attributes
+    ----------
+    totals : dict
+        A dictionary mapping section names to the total time (in seconds)
+        spent in each section.
+    n_samples : int
+        The number of samples seen.
+    """
+
+    sections = ["data", "transfer", "forward", "backward", "metrics"]
+
+    def __init__(
+        self,
+        device: torch.device | str = "cpu",
+        synchronize: bool = True,
+    ):
+        self._sync = synchronize and torch.device(device).type == "cuda"
+        self.totals = {section: 0.0 for section in self.sections}
+        self.n_samples = 0
+        self._start = time.perf_counter()
+        self._last = self._start
+
+    def _now(self) -> float:
+        if self._sync:
+            torch.cuda.synchronize()
+        return time.perf_counter()
+
+    @contextmanager
+    def section(self, name: str):
+        """
+        Time the body of a ``with`` block and add it to section ``name``.
+
+        Parameters
+        ----------
+        name : str
+            The name of the section.
+        """
+        start = self._now()
+        try:
+            yield
+        finally:
+            self._last = self._now()
+            self.totals[name] = self.totals.get(name, 0.0) + self._last - start
+
+    def data_ready(self, batch_size: int) -> None:
+        """
+        Record the time spent waiting for a batch since the end of the last
+        batch (or since the timer was created) as data loading time.
+
+        Parameters
+        ----------
+        batch_size : int
+            The number of samples in the batch.
+        """
+        now = time.perf_counter()
+        self.totals["data"] += now - self._last
+        self._last = now
+        self.n_samples += batch_size
+
+    def batch_done(self) -> None:
+        """
+        Mark the end of a batch, so that time spent on anything else in the
+        batch loop (e.g. printing progress) is not counted as data loading.
+        """
+        self._last = time.perf_counter()
+
+    def summary(self) -> dict:
+        """
+        Summarise the timings.
+
+        Returns
+        -------
+        dict
+            A dictionary with the total time in each section (in seconds),
+            the total elapsed time (``"total"``) and the throughput
+            (``"samples_per_sec"``).
+        """
+        total = self._now() - self._start
+        summary = dict(self.totals)
+        summary["total"] = total
+        summary["samples_per_sec"] = self.n_samples / total if total > 0 else 0.0
+        return summary
@@ -1,17 +1,39 @@
 from __future__ import annotations
 
+import json
 import pathlib
 import re
 from ast import literal_eval
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 from shapely import Geometry, from_wkt
 
 
+def _parse_int_tuples(series: pd.Series) -> list[tuple]:
+    """Parse a column of integer tuple strings (e.g. pixel bounds) in bulk."""
+    values = series.tolist()
+    n_values = values[0].count(",") + 1
+    if n_values < 2:
+        raise ValueError("Not a column of integer tuples.")
+    row = r"\(" + ",".join([r"\s*-?\d+\s*"] * n_values) + r"\)"
+    text = "\n".join(values)
+    if re.fullmatch(rf"{row}(?:\n{row})*", text) is None:
+        raise ValueError("Not a column of integer tuples.")
+    numbers = np.fromstring(
+        text.translate(str.maketrans("(),\n", "    ")), dtype=np.int64, sep=" "
+    )
+    return list(map(tuple, numbers.reshape(len(values), n_values).tolist()))
+
+
 def eval_dataframe(df: pd.DataFrame | gpd.GeoDataFrame):
     """Evaluates the columns of a DataFrame/GeoDataFrame and converts them to their respective types.
 
+    Only columns of strings are evaluated (the "geometry" column is left for
+    ``get_geodataframe``). Columns of integer tuples (e.g. pixel bounds) are
+    parsed in bulk, other columns with ``ast.literal_eval``.
+
     Parameters
     ----------
     df : pd.DataFrame | gpd.GeoDataFrame
@@ -23,6 +45,15 @@ def eval_dataframe(df: pd.DataFrame | gpd.GeoDataFrame):
         The evaluated DataFrame/GeoDataFrame.
     """
     for col in df.columns:
+        if col == "geometry" or df[col].dtype != object:
+            continue
+        if not len(df) or not isinstance(df[col].iloc[0], str):
+            continue
+        try:
+            df[col] = _parse_int_tuples(df[col])
+            continue
+        except (ValueError, TypeError, AttributeError):
+            pass
         try:
             df[col] = df[col].apply(literal_eval)
         except (ValueError, TypeError, SyntaxError):
@@ -76,6 +107,190 @@ def load_from_excel(
     return df
 
 
+_INDEX_METADATA_KEY = b"mapreader_index"
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError(
+            "[ERROR] Please install pyarrow to read and write Parquet/Arrow files, e.g. ``pip install mapreader[parquet]``."
+        )
+
+
+def _from_arrow(df: pd.DataFrame | gpd.GeoDataFrame):
+    """Convert columns read from a Parquet/Arrow file back to MapReader's in-memory types."""
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        elif df[col].dtype == object:
+            values = df[col].dropna()
+            if len(values) and isinstance(values.iloc[0], np.ndarray):
+                # list columns (e.g. pixel bounds) are read as arrays
+                df[col] = [
+                    tuple(x.tolist()) if isinstance(x, np.ndarray) else x
+                    for x in df[col]
+                ]
+    # columns are typed, so only WKT geometries (if any) need to be parsed
+    if not isinstance(df, gpd.GeoDataFrame):
+        df = get_geodataframe(df)
+    return df
+
+
+def load_from_parquet(
+    fpath: str,
+    **kwargs,
+):
+    """Load a DataFrame/GeoDataFrame from a Parquet or GeoParquet file.
+
+    Parameters
+    ----------
+    fpath : str
+        The path to the file.
+    **kwargs
+        Keyword arguments passed to ``pandas.read_parquet`` (or
+        ``geopandas.read_parquet`` for GeoParquet files).
+
+    Returns
+    -------
+    pd.DataFrame | gpd.GeoDataFrame
+        The loaded DataFrame/GeoDataFrame.
+    """
+    check_exists(fpath)
+    _import_pyarrow()
+    import pyarrow.parquet
+
+    metadata = pyarrow.parquet.read_schema(str(fpath)).metadata or {}
+    if b"geo" in metadata:
+        df = gpd.read_parquet(fpath, **kwargs)
+    else:
+        df = pd.read_parquet(fpath, **kwargs)
+    return _from_arrow(df)
+
+
+def load_from_feather(
+    fpath: str,
+    **kwargs,
+):
+    """Load a DataFrame/GeoDataFrame from an Arrow IPC (Feather) file.
+
+    Parameters
+    ----------
+    fpath : str
+        The path to the file.
+    **kwargs
+        Keyword arguments passed to ``pandas.read_feather`` (or
+        ``geopandas.read_feather`` for files with geometry metadata).
+
+    Returns
+    -------
+    pd.DataFrame | gpd.GeoDataFrame
+        The loaded DataFrame/GeoDataFrame.
+    """
+    check_exists(fpath)
+    _import_pyarrow()
+    import pyarrow.ipc
+
+    with pyarrow.memory_map(str(fpath)) as source:
+        metadata = pyarrow.ipc.open_file(source).schema.metadata or {}
+    if b"geo" in metadata:
+        df = gpd.read_feather(fpath, **kwargs)
+    else:
+        df = pd.read_feather(fpath, **kwargs)
+
+    # restore the index saved as columns by ``save_to_feather``
+    index = json.loads(metadata.get(_INDEX_METADATA_KEY, b"null"))
+    if index is not None and all(col in df.columns for col in index["columns"]):
+        df = df.set_index(index["columns"])
+        df.index.names = index["names"]
+    return _from_arrow(df)
+
+
+def save_to_parquet(
+    df: pd.DataFrame | gpd.GeoDataFrame,
+    fpath: str,
+    categorical: list[str] | None = None,
+    **kwargs,
+):
+    """Save a DataFrame/GeoDataFrame to a Parquet (or GeoParquet) file.
+
+    Tuple columns (e.g. pixel bounds) are saved as integer/float lists and
+    geometries as WKB, so no string parsing is needed when loading.
+
+    Parameters
+    ----------
+    df : pd.DataFrame | gpd.GeoDataFrame
+        The DataFrame/GeoDataFrame to save.
+    fpath : str
+        The path to save to.
+    categorical : list of str or None, optional
+        Columns to save as categories (e.g. labels), by default None.
+    **kwargs
+        Keyword arguments passed to ``DataFrame.to_parquet``.
+    """
+    _import_pyarrow()
+    _to_arrow(df, categorical).to_parquet(fpath, **kwargs)
+
+
+def save_to_feather(
+    df: pd.DataFrame | gpd.GeoDataFrame,
+    fpath: str,
+    categorical: list[str] | None = None,
+    **kwargs,
+):
+    """Save a DataFrame/GeoDataFrame to an Arrow IPC (Feather) file.
+
+    The index is saved as column(s), recorded in the file's schema metadata
+    so ``load_from_feather`` can restore it.
+
+    Parameters
+    ----------
+    df : pd.DataFrame | gpd.GeoDataFrame
+        The DataFrame/GeoDataFrame to save.
+    fpath : str
+        The path to save to.
+    categorical : list of str or None, optional
+        Columns to save as categories (e.g. labels), by default None.
+    **kwargs
+        Keyword arguments passed to ``DataFrame.to_feather``.
+    """
+    _import_pyarrow()
+    import pyarrow
+    import pyarrow.feather
+
+    # save the index as column(s), so the file can be read without pandas
+    df = _to_arrow(df, categorical)
+    reset_df = df.reset_index()
+    index = {
+        "columns": reset_df.columns[: df.index.nlevels].tolist(),
+        "names": list(df.index.names),
+    }
+
+    # write in memory first to let pandas/geopandas convert the columns
+    # (e.g. geometries to WKB), then add the index to the schema metadata
+    sink = pyarrow.BufferOutputStream()
+    reset_df.to_feather(sink, compression="uncompressed")
+    table = pyarrow.feather.read_table(pyarrow.BufferReader(sink.getvalue()))
+    metadata = dict(table.schema.metadata or {})
+    metadata[_INDEX_METADATA_KEY] = json.dumps(index).encode("utf-8")
+    pyarrow.feather.write_feather(
+        table.replace_schema_metadata(metadata), fpath, **kwargs
+    )
+
+
+def _to_arrow(df: pd.DataFrame | gpd.GeoDataFrame, categorical: list[str] | None):
+    df = df.copy()
+    for col in categorical or []:
+        df[col] = df[col].astype("category")
+    if "geometry" in df.columns and not isinstance(df, gpd.GeoDataFrame):
+        # shapely objects outside a GeoDataFrame cannot be converted
+        df["geometry"] = df["geometry"].apply(
+            lambda x: x.wkt if isinstance(x, Geometry) else x
+        )
+    return df
+
+
 def get_load_function(
     fpath: str | pathlib.Path,
     **kwargs,
@@ -85,7 +300,7 @@ def get_load_function(
     Parameters
     ----------
     fpath : str or pathlib.Path
-        The file path to load the DataFrame/GeoDataFrame from. Can be a CSV/TSV/etc., or Excel or JSON/GeoJSON file.
+        The file path to load the DataFrame/GeoDataFrame from. Can be a CSV/TSV/etc., Excel, JSON/GeoJSON, Parquet/GeoParquet or Arrow IPC (Feather) file.
     """
     check_exists(fpath)
 
@@ -95,6 +310,10 @@ def get_load_function(
         func = load_from_csv
     elif re.search(r"\..*?json$", str(fpath)):  # json, geojson
         func = load_from_geojson
+    elif re.search(r"\.(geo)?parquet$", str(fpath)):
+        func = load_from_parquet
+    elif re.search(r"\.(arrow|feather|ipc)$", str(fpath)):
+        func = load_from_feather
     else:
         raise ValueError(
             "[ERROR] File format not supported. Please load your file manually."
@@ -112,7 +331,7 @@ def get_geodataframe(df: pd.DataFrame):
     if "geometry" in df.columns:
         # convert geometry column to shapely objects
         if not isinstance(df.iloc[0]["geometry"], Geometry):
-            df["geometry"] = df["geometry"].apply(from_wkt)
+            df["geometry"] = from_wkt(df["geometry"].to_numpy())
         # get crs
         if "crs" in df.columns:
             if df["crs"].nunique() > 1:
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+
+class ThumbnailCache:
+    """
+    A size-bounded, thread-safe cache of resized images (thumbnails), for
+    displaying patches without re-reading and re-decoding full-size files.
+
+    Thumbnails are stored as encoded PNG or JPEG bytes, keyed by the image
+    path, its modification time and the thumbnail size. When the in-memory
+    cache is full, the least recently used thumbnails are evicted (and, if
+    ``cache_dir`` is set, spilled to disk so they can be reloaded quickly).
+    Images which would not be resized are not cached by ``get``, as reading
+    the original file is as fast as reading a copy of it.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        The maximum total size (in bytes) of the thumbnails kept in memory,
+        by default ``256 * 1024**2`` (256 MB).
+    cache_dir : str or None, optional
+        A directory to spill evicted thumbnails to. If ``None``, evicted
+        thumbnails are discarded. By default ``None``.
+    image_format : str, optional
+        The format to store thumbnails in, either ``"PNG"`` (lossless) or
+        ``"JPEG"``, by default ``"PNG"``.
+    quality : int, optional
+        The JPEG quality, by default ``90``.
+    max_workers : int, optional
+        The number of threads to use for ``prewarm``, by default ``4``.
+
+    Attributes
+    ----------
+    hits : int
+        The number of thumbnails found in the cache (in memory or on disk).
+    misses : int
+        The number of thumbnails created from the original images.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 256 * 1024**2,
+        cache_dir: str | None = None,
+        image_format: str = "PNG",
+        quality: int = 90,
+        max_workers: int = 4,
+    ):
+        image_format = image_format.upper()
+        if image_format not in ["PNG", "JPEG"]:
+            raise ValueError('[ERROR] ``image_format`` must be "PNG" or "JPEG".')
+
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.image_format = image_format
+        self.quality = quality
+        self.max_workers = max_workers
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._nbytes = 0
+        self._full_size = set()  # keys of images which are not resized
+        self._lock = threading.Lock()
+        self._executor = None
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    @property
+    def nbytes(self) -> int:
+        """The total size (in bytes) of the thumbnails kept in memory."""
+        return self._nbytes
+
+    def _key(self, path: str, size: int | None, upscale: bool) -> tuple:
+        return (os.fspath(path), os.path.getmtime(path), size, upscale)
+
+    def _disk_path(self, key: tuple) -> str:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        ext = "png" if self.image_format == "PNG" else "jpg"
+        return os.path.join(self.cache_dir, f"{digest}.{ext}")
+
+    @staticmethod
+    def _resizes(image_size: tuple, size: int | None, upscale: bool) -> bool:
+        return size is not None and (upscale or max(image_size) > size)
+
+    def _thumbnail(
+        self, image: Image.Image, size: int | None, upscale: bool
+    ) -> Image.Image:
+        if self._resizes(image.size, size, upscale):
+            image = ImageOps.contain(image, (size, size))
+        if self.image_format == "JPEG" and image.mode not in ["RGB", "L"]:
+            image = image.convert("RGB")
+        return image
+
+    def _encode_image(self, image: Image.Image) -> bytes:
+        buffer = io.BytesIO()
+        image.save(buffer, format=self.image_format, quality=self.quality)
+        return buffer.getvalue()
+
+    def _encode(self, path: str, size: int | None, upscale: bool) -> bytes:
+        with Image.open(path) as image:
+            return self._encode_image(self._thumbnail(image, size, upscale))
+
+    def _store(self, key: tuple, data: bytes) -> None:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = data
+            self._nbytes += len(data)
+            evicted = []
+            while self._nbytes > self.max_bytes and len(self._memory) > 1:
+                old_key, old_data = self._memory.popitem(last=False)
+                self._nbytes -= len(old_data)
+                evicted.append((old_key, old_data))
+
+        if self.cache_dir is not None:
+            for old_key, old_data in evicted:
+                disk_path = self._disk_path(old_key)
+                if not os.path.exists(disk_path):
+                    # write to a temporary file first, so readers never see
+                    # a partly written file
+                    tmp_path = f"{disk_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(old_data)
+                    os.replace(tmp_path, disk_path)
+
+    def _get_cached_bytes(self, key: tuple) -> bytes | None:
+        """Get a thumbnail from memory or ``cache_dir``, or None if it is not cached."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+
+        if self.cache_dir is not None and os.path.exists(self._disk_path(key)):
+            with open(self._disk_path(key), "rb") as f:
+                data = f.read()
+            with self._lock:
+                self.hits += 1
+            self._store(key, data)
+            return data
+        return None
+
+    def _get_bytes(self, path: str, size: int | None, upscale: bool) -> bytes:
+        key = self._key(path, size, upscale)
+        data = self._get_cached_bytes(key)
+        if data is None:
+            data = self._encode(path, size, upscale)
+            with self._lock:
+                self.misses += 1
+            self._store(key, data)
+        return data
+
+    def get(
+        self,
+        path: str,
+        size: int | None = None,
+        upscale: bool = False,
+    ) -> Image.Image:
+        """
+        Get the thumbnail of an image, creating it if it is not cached.
+
+        Parameters
+        ----------
+        path : str
+            The path to the image.
+        size : int or None, optional
+            The size (in pixels) of the longest side of the thumbnail. If
+            ``None``, the image is not resized. By default ``None``.
+        upscale : bool, optional
+            Whether to enlarge images smaller than ``size``, by default
+            ``False``.
+
+        Returns
+        -------
+        PIL.Image
+            The thumbnail.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the image cannot be found.
+
+        Notes
+        -----
+        If the image would not be resized, it is read from ``path`` and not
+        cached.
+        """
+        if size is None:
+            return _open_image(path)
+        key = self._key(path, size, upscale)
+        with self._lock:
+            full_size = key in self._full_size
+        if full_size:
+            return _open_image(path)
+
+        data = self._get_cached_bytes(key)
+        if data is not None:
+            return _open_image(io.BytesIO(data))
+
+        # decode the image once, then resize it (and cache the thumbnail)
+        image = _open_image(path)
+        with self._lock:
+            self.misses += 1
+            if not self._resizes(image.size, size, upscale):
+                self._full_size.add(key)
+                return image
+        image = self._thumbnail(image, size, upscale)
+        self._store(key, self._encode_image(image))
+        return image
+
+    def get_bytes(
+        self,
+        path: str,
+        size: int | None = None,
+        upscale: bool = False,
+    ) -> bytes:
+        """
+        Get the encoded (PNG or JPEG) bytes of the thumbnail of an image,
+        e.g. to send over HTTP without decoding it.
+
+        Parameters
+        ----------
+        path : str
+            The path to the image.
+        size : int or None, optional
+            The size of the thumbnail (see ``get``), by default ``None``.
+        upscale : bool, optional
+            Whether to enlarge images smaller than ``size``, by default
+            ``False``.
+
+        Returns
+        -------
+        bytes
+            The encoded thumbnail, in ``image_format``.
+        """
+        return self._get_bytes(path, size, upscale)
+
+    def prewarm(
+        self,
+        paths: list[str],
+        size: int | None = None,
+        upscale: bool = False,
+    ) -> list[Future]:
+        """
+        Create the thumbnails for a list of images in background threads.
+
+        Parameters
+        ----------
+        paths : list of str
+            The paths to the images.
+        size : int or None, optional
+            The size of the thumbnails (see ``get``), by default ``None``.
+        upscale : bool, optional
+            Whether to enlarge images smaller than ``size``, by default
+            ``False``.
+
+        Returns
+        -------
+        list of concurrent.futures.Future
+            One future per image. Missing or unreadable images are ignored
+            (their futures hold the exception).
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return [
+            self._executor.submit(self._get_bytes, path, size, upscale)
+            for path in paths
+        ]
+
+    def clear(self) -> None:
+        """Remove all thumbnails from memory (but not from ``cache_dir``)."""
+        with self._lock:
+            self._memory.clear()
+            self._nbytes = 0
+            self._full_size.clear()
+
+    def close(self) -> None:
+        """
+        Stop the background threads used by ``prewarm``, cancelling any
+        thumbnails not yet started. They are restarted by the next call to
+        ``prewarm``.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except AttributeError:
+            pass  # not fully initialised
+
+
+def _open_image(fp) -> Image.Image:
+    image = Image.open(fp)
+    image.load()
+    return image
+
+
+_default_cache = None
+
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    """
+    Get the thumbnail cache shared by MapReader's display methods, creating
+    it (with default settings) on first use.
+
+    Returns
+    -------
+    ThumbnailCache
+        The shared thumbnail cache.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ThumbnailCache()
+    return _default_cache
+
+
+def set_thumbnail_cache(cache: ThumbnailCache) -> None:
+    """
+    Replace the thumbnail cache shared by MapReader's display methods (e.g.
+    to change its size or add a ``cache_dir``). The background threads of
+    the old cache are stopped.
+
+    Parameters
+    ----------
+    cache : ThumbnailCache
+        The new thumbnail cache.
+    """
+    global _default_cache
+    if _default_cache is not None and _default_cache is not cache:
+        _default_cache.close()
+    _default_cache = cache
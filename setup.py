@@ -69,6 +69,10 @@ setuptools.setup(
             "transformers<5.0.0",
             "black>=23.7.0,<25.0.0",
             "flake8>=6.0.0,<8.0.0",
+            "pyarrow>=10.0.0",
+        ],
+        "parquet": [
+            "pyarrow>=10.0.0",
         ],
     },
     classifiers=[
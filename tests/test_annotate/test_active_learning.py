@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image
+from torchvision import models, transforms
+
+from mapreader import ClassifierContainer, PatchDataset
+from mapreader.annotate.active_learning import (
+    diverse_order,
+    predict_unlabelled,
+    uncertainty_scores,
+)
+
+
+def test_uncertainty_scores():
+    probs = [[0.5, 0.5, 0.0], [1.0, 0.0, 0.0], [0.6, 0.3, 0.1]]
+    entropy = uncertainty_scores(probs)
+    assert entropy[0] == pytest.approx(np.log(2))
+    assert entropy[1] == 0
+    margin = uncertainty_scores(probs, method="margin")
+    assert margin == pytest.approx([1.0, 0.0, 0.7])
+    least_confidence = uncertainty_scores(probs, method="least_confidence")
+    assert least_confidence == pytest.approx([0.5, 0.0, 0.4])
+    for scores in [entropy, margin, least_confidence]:
+        assert np.argmin(scores) == 1
+
+    with pytest.raises(ValueError, match="method"):
+        uncertainty_scores(probs, method="fake")
+    with pytest.raises(ValueError, match="shape"):
+        uncertainty_scores([0.5, 0.5])
+
+
+def test_diverse_order():
+    embeddings = [[1, 0], [1, 0.01], [0, 1], [0.01, 1], [-1, 0]]
+    order = diverse_order(embeddings, 3)
+    assert list(order) == [0, 4, 2, 1, 3]
+    assert list(diverse_order(embeddings, 1)) == [0, 1, 2, 3, 4]
+    assert sorted(diverse_order(embeddings, 10)) == [0, 1, 2, 3, 4]
+
+
+def test_predict_unlabelled(tmp_path):
+    ids = [f"patch-{i}" for i in range(3)]
+    for i, patch_id in enumerate(ids):
+        Image.new("RGB", (8, 8), (100 * i, 0, 0)).save(f"{tmp_path}/{patch_id}.png")
+    patch_df = pd.DataFrame(
+        {"image_path": [f"{tmp_path}/{patch_id}.png" for patch_id in ids]}, index=ids
+    )
+    classifier = ClassifierContainer(
+        models.resnet18(num_classes=2), labels_map={0: "a", 1: "b"}, device="cpu"
+    )
+
+    # default transform ("val") resizes to 224x224
+    predictions = predict_unlabelled(classifier, patch_df)
+    assert predictions.shape == (3, 2)
+    assert list(predictions.index) == ids
+    assert np.allclose(predictions.sum(axis=1), 1)
+    assert "active_learning" not in classifier.dataloaders
+
+    # otherwise, use the transform of the classifier's "val" dataset
+    sizes = []
+
+    def transform(img):
+        sizes.append(img.size)
+        return transforms.ToTensor()(img.resize((32, 32)))
+
+    classifier.load_dataset(PatchDataset(patch_df, transform=transform), "val")
+    predict_unlabelled(classifier, patch_df)
+    assert sizes == [(8, 8)] * 3
+    predict_unlabelled(classifier, patch_df, transform="val")
+    assert len(sizes) == 3
@@ -4,9 +4,11 @@ import os
 import pathlib
 import shutil
 
+import pandas as pd
 import pytest
 
 from mapreader import Annotator, loader
+from mapreader.utils.thumbnails import ThumbnailCache, set_thumbnail_cache
 
 
 @pytest.fixture
@@ -477,6 +479,191 @@ def test_filter_for(load_dfs):
     assert queue[-1] == "patch-6-0-9-3-#cropped_74488689.png#.png"
 
 
+def test_get_queue_excludes_labelled(load_dfs):
+    parent_df, patch_df, tmp_path = load_dfs
+    annotator = Annotator(
+        patch_df=patch_df,
+        parent_df=parent_df,
+        labels=["a", "b"],
+        annotations_dir=f"{tmp_path}/annotations/",
+        auto_save=False,
+        min_values={"min_x": 3},
+    )
+    labelled = annotator.patch_df.index[-1]
+    annotator.patch_df.loc[labelled, "label"] = "a"
+    queue = annotator._get_queue(as_type="index")
+    assert isinstance(queue, pd.Index)
+    assert len(queue) == 5
+    assert labelled not in queue
+    assert (annotator.patch_df.loc[queue, "min_x"] >= 3).all()
+    assert "eligible" not in annotator.patch_df.columns
+
+
+def test_context_prefetch(load_dfs):
+    parent_df, patch_df, tmp_path = load_dfs
+    annotator = Annotator(
+        patch_df=patch_df,
+        parent_df=parent_df,
+        labels=["a", "b"],
+        annotations_dir=f"{tmp_path}/annotations/",
+        auto_save=False,
+        show_context=True,
+        sortby="min_x",
+        prefetch=2,
+    )
+    annotator.annotate()
+    assert len(annotator._get_context_index()) == 9
+    assert annotator._context_image.size == (9, 9)
+    # current patch and next two patches
+    assert len(annotator._context_futures) == 3
+    for future in annotator._context_futures.values():
+        future.result()
+
+    annotator._next_example()
+    ix = annotator._queue[annotator.current_index]
+    expected = annotator._build_context(ix, 1, False, None, 1000)
+    assert list(annotator._context_image.getdata()) == list(expected.getdata())
+
+    # corner patch has empty (white) neighbours
+    corner = annotator.patch_df.index[annotator.patch_df["min_x"] == 0][0]
+    context = annotator._build_context(corner, 1, False, None, 1000)
+    assert context.getpixel((0, 0)) == (255, 255, 255)
+
+    # full-size contexts bypass the thumbnail cache, smaller ones use small thumbnails
+    cache = ThumbnailCache()
+    set_thumbnail_cache(cache)
+    try:
+        annotator._build_context(ix, 1, False, None, 1000)
+        assert len(cache) == 0
+        context = annotator._build_context(ix, 1, True, None, 6)
+        assert context.size == (6, 6)
+        assert len(cache) > 0
+        assert {key[2] for key in cache._memory} == {2}
+    finally:
+        set_thumbnail_cache(ThumbnailCache())
+
+    executor = annotator._executor
+    annotator.close()
+    assert executor._shutdown
+    assert annotator._executor is None
+    assert len(annotator._context_futures) == 0
+
+
+class _FakeClassifier:
+    """Predicts "b" with confidence increasing with ``min_x``."""
+
+    def __init__(self):
+        self.dataloaders = {}
+        self.pred_conf = []
+
+    def load_dataset(self, dataset, set_name, **kwargs):
+        self.dataloaders[set_name] = dataset
+
+    def inference(self, set_name):
+        patch_df = self.dataloaders[set_name].patch_df
+        conf = 0.5 + patch_df.index.str.extract(r"patch-(\d+)")[0].astype(int) / 20
+        self.pred_conf = [[1 - c, c] for c in conf]
+
+
+def test_active_learning_queue(load_dfs):
+    parent_df, patch_df, tmp_path = load_dfs
+    annotator = Annotator(
+        patch_df=patch_df,
+        parent_df=parent_df,
+        labels=["a", "b"],
+        annotations_dir=f"{tmp_path}/annotations/",
+        auto_save=False,
+    )
+    ids = annotator.patch_df.index
+    predictions = pd.DataFrame([[0.9, 0.1]] * 7 + [[0.5, 0.5], [0.6, 0.4]], index=ids)
+    annotator.set_active_learning(predictions=predictions, method="margin")
+    queue = annotator._get_queue(as_type="index")
+    assert list(queue[:2]) == [ids[7], ids[8]]
+
+    # diversity: identical embeddings are not picked twice in a row
+    embeddings = pd.DataFrame([[1.0, 0.0]] * 8 + [[0.0, 1.0]], index=ids)
+    annotator.set_active_learning(
+        predictions=predictions, embeddings=embeddings, diversity=2, pool_size=3
+    )
+    queue = annotator._get_queue(as_type="index")
+    assert list(queue[:2]) == [ids[7], ids[8]]
+
+    with pytest.raises(ValueError, match="classifier"):
+        annotator.set_active_learning()
+    with pytest.raises(ValueError, match="refresh_every"):
+        annotator.set_active_learning(predictions=predictions, refresh_every=2)
+
+
+def test_active_learning_refresh(load_dfs):
+    parent_df, patch_df, tmp_path = load_dfs
+    annotator = Annotator(
+        patch_df=patch_df,
+        parent_df=parent_df,
+        labels=["a", "b"],
+        annotations_dir=f"{tmp_path}/annotations/",
+        auto_save=False,
+    )
+    retrained = []
+    classifier = _FakeClassifier()
+    annotator.set_active_learning(
+        classifier=classifier,
+        refresh_every=2,
+        retrain_fn=lambda classifier, labelled: retrained.append(
+            (classifier, len(labelled))
+        ),
+    )
+    assert len(annotator._uncertainty) == 9
+    annotator.annotate()
+    first = annotator._queue[0]
+    assert first.startswith("patch-0-")  # least confident
+
+    annotator._add_annotation("a")
+    annotator._add_annotation("b")
+    annotator._refresh_future.result()
+    # the background thread only uses a copy of the classifier
+    assert len(retrained) == 1
+    assert retrained[0][0] is annotator._refresh_classifier
+    assert retrained[0][0] is not classifier
+    assert retrained[0][1] == 2
+    annotator._next_example()
+    assert annotator._refresh_future is None
+    assert len(annotator._uncertainty) == 7
+    assert len(annotator._queue) == 9
+    assert annotator._queue[0] == first
+
+    annotator._add_annotation("a")
+    annotator._add_annotation("b")
+    executor = annotator._refresh_executor
+    annotator.close()
+    assert executor._shutdown
+    assert annotator._refresh_future is None
+
+
+def test_serve_and_pull_annotations(load_dfs):
+    parent_df, patch_df, tmp_path = load_dfs
+    annotator = Annotator(
+        patch_df=patch_df,
+        parent_df=parent_df,
+        labels=["a", "b"],
+        annotations_dir=f"{tmp_path}/annotations/",
+        sortby="min_x",
+        username="me",
+    )
+    server = annotator.serve(port=0)
+    server.stop()
+    assert annotator.store_file.endswith(".sqlite")
+    assert "#me#" not in annotator.store_file
+
+    store = server.store
+    patch_ids = [patch_id for patch_id, _ in store.lease("alice", 2)]
+    assert patch_ids == [str(ix) for ix in annotator._get_queue()[:2]]
+    store.submit("alice", [(patch_ids[0], "a"), (patch_ids[1], "b")])
+
+    assert annotator.pull_annotations() == 2
+    assert annotator.patch_df.loc[patch_ids, "label"].tolist() == ["a", "b"]
+    assert len(pd.read_csv(annotator.annotations_file)) == 2
+
+
 def test_max_size(load_dfs):
     parent_df, patch_df, tmp_path = load_dfs
     annotator = Annotator(
@@ -542,4 +729,68 @@ def test_add_annotation(load_dfs):
     annotator._add_annotation("a")
     assert annotator.patch_df.loc[patch, "label"] == "a"
     assert annotator.current_index != patch_idx
+    assert os.path.isfile(annotator.journal_file)
+    annotator.save_annotations()
     assert os.path.isfile(annotator.annotations_file)
+    assert not os.path.isfile(annotator.journal_file)
+
+
+def test_journal_replay(load_dfs):
+    parent_df, patch_df, tmp_path = load_dfs
+    kwargs = {
+        "patch_df": patch_df,
+        "parent_df": parent_df,
+        "labels": ["a", "b"],
+        "annotations_dir": f"{tmp_path}/annotations/",
+        "username": "test",
+        "auto_save": True,
+    }
+    annotator = Annotator(**kwargs)
+    annotator.annotate()
+    first, second = annotator._queue[:2]
+    annotator._add_annotation("a")
+    annotator.save_annotations()
+    annotator._add_annotation("b")
+    annotator.current_index = 0
+    annotator._add_annotation("b")  # relabel first patch
+    assert os.path.isfile(annotator.journal_file)
+
+    annotator2 = Annotator(**kwargs)
+    assert annotator2.patch_df.loc[first, "label"] == "b"
+    assert annotator2.patch_df.loc[second, "label"] == "b"
+    assert annotator2.patch_df["label"].notna().sum() == 2
+
+
+def test_annotations_format_error(load_dfs):
+    parent_df, patch_df, _ = load_dfs
+    with pytest.raises(ValueError, match="annotations_format"):
+        Annotator(
+            patch_df=patch_df,
+            parent_df=parent_df,
+            labels=["a", "b"],
+            annotations_format="xlsx",
+        )
+
+
+@pytest.mark.parametrize("annotations_format", ["parquet", "arrow"])
+def test_annotations_format(load_dfs, annotations_format):
+    pytest.importorskip("pyarrow")
+    parent_df, patch_df, tmp_path = load_dfs
+    kwargs = {
+        "patch_df": patch_df,
+        "parent_df": parent_df,
+        "labels": ["a", "b"],
+        "annotations_dir": f"{tmp_path}/annotations/",
+        "username": "test",
+        "annotations_format": annotations_format,
+    }
+    annotator = Annotator(**kwargs)
+    assert annotator.annotations_file.endswith(f".{annotations_format}")
+    annotator.annotate()
+    first = annotator._queue[0]
+    annotator._add_annotation("b")
+    annotator.save_annotations()
+
+    annotator2 = Annotator(**kwargs)
+    assert annotator2.patch_df.loc[first, "label"] == "b"
+    assert annotator2.patch_df["label"].notna().sum() == 1
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+from PIL import Image
+
+from mapreader.annotate.server import AnnotationServer
+from mapreader.annotate.store import AnnotationStore
+
+
+@pytest.fixture
+def patch_df(tmp_path):
+    paths = []
+    for i in range(6):
+        path = f"{tmp_path}/patch #{i}.png"
+        Image.new("RGB", (20, 10), (i * 40, 0, 0)).save(path)
+        paths.append(path)
+    return pd.DataFrame(
+        {"image_path": paths, "label": [None] * 5 + ["a"]},
+        index=[f"patch #{i}" for i in range(6)],
+    )
+
+
+def test_lease_and_submit(patch_df, tmp_path):
+    store = AnnotationStore(f"{tmp_path}/store.sqlite", lease_seconds=60)
+    assert store.add_patches(patch_df) == 6
+    assert store.add_patches(patch_df) == 0  # already added
+    assert len(store) == 6
+
+    alice = store.lease("alice", 2)
+    bob = store.lease("bob", 2)
+    assert [patch_id for patch_id, _ in alice] == ["patch #0", "patch #1"]
+    assert [patch_id for patch_id, _ in bob] == ["patch #2", "patch #3"]
+    assert store.lease("alice", 2) == alice  # own leases come back first
+
+    # bob cannot label alice's patch
+    assert store.submit("bob", [("patch #0", "b"), ("patch #2", "b")]) == ["patch #2"]
+    assert store.progress()["by_user"] == {"bob": 1}
+
+    store.release("alice")
+    assert [patch_id for patch_id, _ in store.lease("carol", 1)] == ["patch #0"]
+
+    store.lease_seconds = 0
+    dave = store.lease("dave", 5)
+    assert [patch_id for patch_id, _ in dave] == ["patch #1", "patch #4"]
+    time.sleep(0.01)
+    assert store.lease("erin", 5) == dave  # dave's leases have expired
+
+    labelled = store.get_labelled_data()
+    assert labelled["label"].to_dict() == {"patch #2": "b", "patch #5": "a"}
+    assert labelled.loc["patch #2", "annotator"] == "bob"
+
+
+def test_submit_after_lease_expired(patch_df, tmp_path):
+    store = AnnotationStore(f"{tmp_path}/store.sqlite", lease_seconds=0.05)
+    store.add_patches(patch_df)
+    assert store.lease("alice", 1)[0][0] == "patch #0"
+    time.sleep(0.1)
+    assert store.lease("bob", 1)[0][0] == "patch #0"  # alice's lease expired
+    assert store.submit("bob", [("patch #0", "x")]) == ["patch #0"]
+
+    # alice's late label does not overwrite bob's
+    assert store.submit("alice", [("patch #0", "y")]) == []
+    labelled = store.get_labelled_data()
+    assert labelled.loc["patch #0", "label"] == "x"
+    assert labelled.loc["patch #0", "annotator"] == "bob"
+
+    # nor do labels of patches which were labelled when added
+    assert store.submit("alice", [("patch #5", "y")]) == []
+    assert store.get_labelled_data().loc["patch #5", "label"] == "a"
+
+
+def test_concurrent_leases(patch_df, tmp_path):
+    store = AnnotationStore(f"{tmp_path}/store.sqlite")
+    store.add_patches(patch_df)
+    leased = {}
+
+    def lease(user):
+        leased[user] = [patch_id for patch_id, _ in store.lease(user, 1)]
+
+    threads = [threading.Thread(target=lease, args=(f"user{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    patch_ids = sum(leased.values(), [])
+    assert len(patch_ids) == 5
+    assert len(set(patch_ids)) == 5
+
+
+def test_server(patch_df, tmp_path):
+    server = AnnotationServer(
+        f"{tmp_path}/store.sqlite", labels=["a", "b"], port=0, thumbnail_size=8
+    )
+    server.store.add_patches(patch_df)
+    server.start()
+
+    def post(path, body):
+        request = urllib.request.Request(
+            server.url + path.lstrip("/"),
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    try:
+        patches = post("/api/lease", {"user": "alice", "n": 2})
+        assert [patch["id"] for patch in patches] == ["patch #0", "patch #1"]
+
+        with urllib.request.urlopen(server.url + patches[0]["url"][1:]) as response:
+            etag = response.headers["ETag"]
+            assert "max-age" in response.headers["Cache-Control"]
+            assert response.headers["Content-Type"] == "image/png"
+            image = Image.open(response)
+            assert image.size == (8, 4)
+        request = urllib.request.Request(
+            server.url + patches[0]["url"][1:], headers={"If-None-Match": etag}
+        )
+        with pytest.raises(urllib.error.HTTPError, match="304"):
+            urllib.request.urlopen(request)
+
+        assert post(
+            "/api/annotate", {"user": "alice", "annotations": [["patch #0", "b"]]}
+        ) == {"saved": ["patch #0"], "rejected": []}
+        assert post(
+            "/api/annotate", {"user": "bob", "annotations": [["patch #0", "a"]]}
+        ) == {"saved": [], "rejected": ["patch #0"]}
+        with pytest.raises(urllib.error.HTTPError, match="400"):
+            post("/api/annotate", {"user": "alice", "annotations": [["patch #1", "c"]]})
+        with pytest.raises(urllib.error.HTTPError, match="400"):
+            post("/api/lease", {"n": 2})
+        with urllib.request.urlopen(server.url) as response:
+            assert b"MapReader annotation" in response.read()
+    finally:
+        server.stop()
+    assert server.store.progress()["labelled"] == 2
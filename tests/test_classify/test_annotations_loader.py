@@ -3,13 +3,17 @@ from __future__ import annotations
 import pathlib
 
 import geopandas as gpd
+import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import pytest
 from torch.utils.data import DataLoader, RandomSampler
 from torchvision import transforms
 
-from mapreader import AnnotationsLoader
+from mapreader import AnnotationsLoader, loader
 from mapreader.classify.datasets import PatchContextDataset, PatchDataset
+from mapreader.classify.samplers import ClassBalancedShardSampler
+from mapreader.utils.load_frames import load_from_csv, save_to_feather, save_to_parquet
 
 
 @pytest.fixture
@@ -161,6 +165,138 @@ def test_load_geojson(sample_dir):
     assert annots.labels_map == {0: "0", 1: "1"}
 
 
+def test_load_list(sample_dir, capsys):
+    annots = AnnotationsLoader()
+    annots.load(
+        [
+            f"{sample_dir}/test_annots.csv",
+            f"{sample_dir}/test_annots_append.csv",
+            f"{sample_dir}/test_annots.csv",  # e.g. a second annotator
+        ],
+        remove_broken=False,
+        ignore_broken=True,
+    )
+    assert len(annots.annotations) == 83
+    assert annots.annotations.index.is_unique
+    assert annots.labels_map == {0: "no", 1: "railspace", 2: "building"}
+
+    # appending already annotated patches keeps their first label
+    df = annots.annotations.iloc[:2][["image_path", "label"]].copy()
+    df["label"] = "building"
+    annots.load(df, remove_broken=False, ignore_broken=True)
+    assert len(annots.annotations) == 83
+    assert (annots.annotations.iloc[:2]["label"] != "building").all()
+    out = capsys.readouterr().out
+    assert "Ignoring 2 annotation(s)" in out
+    assert "[WARNING] 2 patch(es) have conflicting labels" in out
+
+    # or their last label
+    df.iloc[1, df.columns.get_loc("label")] = annots.annotations.iloc[1]["label"]
+    annots.load(df, remove_broken=False, ignore_broken=True, keep="last")
+    assert len(annots.annotations) == 83
+    assert annots.annotations.loc[df.index[0], "label"] == "building"
+    assert "[WARNING] 1 patch(es) have conflicting labels" in capsys.readouterr().out
+
+    with pytest.raises(ValueError, match="empty list"):
+        annots.load([])
+    with pytest.raises(ValueError, match="keep"):
+        annots.load(df, keep="none")
+
+
+@pytest.mark.parametrize("ext", ["parquet", "arrow"])
+def test_load_arrow(sample_dir, tmp_path, ext):
+    pytest.importorskip("pyarrow")
+    df = load_from_csv(f"{sample_dir}/test_annots.csv")
+    if ext == "parquet":
+        save_to_parquet(df, f"{tmp_path}/annots.{ext}", categorical=["label"])
+    else:
+        save_to_feather(df, f"{tmp_path}/annots.{ext}", categorical=["label"])
+    annots = AnnotationsLoader()
+    annots.load(f"{tmp_path}/annots.{ext}", remove_broken=False, ignore_broken=True)
+    assert len(annots.annotations) == 81
+    assert annots.annotations.index.tolist() == df.index.tolist()
+    assert annots.annotations["pixel_bounds"].tolist() == df["pixel_bounds"].tolist()
+    assert annots.labels_map == {0: "no", 1: "railspace"}
+
+
+def test_remove_broken_paths(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "patches").mkdir()
+    for name in ["a.png", "b.png"]:
+        (tmp_path / "patches" / name).touch()
+    df = pd.DataFrame(
+        {
+            "image_path": [
+                f"{tmp_path}/patches/a.png",
+                f"{tmp_path}/patches/missing.png",
+                f"{tmp_path}/patches/b.png",
+                f"{tmp_path}/no_dir/c.png",
+            ],
+            "label": ["no", "no", "railspace", "no"],
+        },
+        index=[0, 1, 1, 2],  # duplicate index
+    )
+    annots = AnnotationsLoader()
+    annots.load(df)
+    assert annots.annotations["image_path"].tolist() == [
+        f"{tmp_path}/patches/a.png",
+        f"{tmp_path}/patches/b.png",
+    ]
+    with open("broken_files.txt") as f:
+        assert f.read().splitlines() == [
+            f"{tmp_path}/patches/missing.png",
+            f"{tmp_path}/no_dir/c.png",
+        ]
+
+
+@pytest.fixture
+def patch_annots(sample_dir, tmp_path):
+    my_maps = loader(f"{sample_dir}/cropped_74488689.png")
+    my_maps.patchify_all(patch_size=3, path_save=f"{tmp_path}/patches/")
+    _, patch_df = my_maps.convert_images()
+    patch_df["label"] = ["no", "railspace"] * 4 + ["no"]
+    annots = AnnotationsLoader()
+    annots.load(patch_df)
+    return annots
+
+
+def test_apply_corrections(patch_annots):
+    annots = patch_annots
+    ids = annots.annotations.index[:2]
+    annots.apply_corrections({ids[0]: "railspace", ids[1]: "no"})
+    assert annots.annotations.loc[ids, "label"].tolist() == ["railspace", "no"]
+    assert annots.annotations.loc[ids, "label_index"].tolist() == [1, 0]
+    with pytest.raises(KeyError, match="IDs not found"):
+        annots.apply_corrections({"fake": "no"})
+    with pytest.raises(ValueError, match="labels_map"):
+        annots.apply_corrections({ids[0]: "fake"})
+
+
+def test_review_labels(patch_annots, monkeypatch):
+    annots = patch_annots
+    ids = annots.annotations.index
+    losses = pd.Series(np.arange(9.0), index=ids)
+    columns = annots.annotations.columns.tolist()
+    to_review = annots._get_annots2review(label_to_review="no", priority=losses)
+    assert to_review.index.tolist() == [ids[8], ids[6], ids[4], ids[2], ids[0]]
+    assert annots.annotations.columns.tolist() == columns  # not modified
+
+    grid = annots._render_review_grid(to_review.iloc[:3], 2, None)
+    assert grid.size == (6, 2 * (3 + 14))
+
+    inputs = iter([f"{ids[8]}, {ids[6]}", "railspace", "", "stop"])
+    monkeypatch.setattr("builtins.input", lambda *_: next(inputs))
+    monkeypatch.setattr(plt, "show", lambda: None)
+    annots.review_labels(label_to_review="no", chunks=2, num_cols=2, priority=losses)
+    assert annots.annotations.loc[[ids[8], ids[6]], "label"].tolist() == [
+        "railspace",
+        "railspace",
+    ]
+    assert annots.annotations.loc[ids[6], "label_index"] == 1
+    assert annots.reviewed.index.tolist() == [ids[8], ids[6], ids[4], ids[2]]
+    assert annots.reviewed.loc[ids[8], "label"] == "railspace"
+
+
 def test_init_images_dir(sample_dir):
     annots = AnnotationsLoader()
     annots.load(
@@ -209,6 +345,81 @@ def test_create_datasets_default_transforms(load_annots):
     assert isinstance(annots.datasets["train"].patch_df, pd.DataFrame)
 
 
+def test_create_datasets_stratified(load_annots):
+    annots = load_annots
+    annots.create_datasets(0.5, 0.3, 0.2)
+    counts = {
+        set_name: dataset.patch_df["label"].value_counts().to_dict()
+        for set_name, dataset in annots.datasets.items()
+    }
+    assert counts == {
+        "train": {"no": 30, "railspace": 10},
+        "val": {"no": 18, "railspace": 6},
+        "test": {"no": 13, "railspace": 4},
+    }
+    assert annots.splits.value_counts().to_dict() == {
+        "train": 40,
+        "val": 24,
+        "test": 17,
+    }
+    assert (
+        annots.datasets["val"].patch_df["label_index"]
+        == annots.datasets["val"].patch_df["label"].map({"no": 0, "railspace": 1})
+    ).all()
+
+
+def test_create_datasets_group_col(load_annots):
+    annots = load_annots
+    annots.annotations["group"] = np.arange(81) // 9
+    annots.create_datasets(0.6, 0.2, 0.2, group_col="group")
+    groups = {
+        set_name: set(dataset.patch_df["group"])
+        for set_name, dataset in annots.datasets.items()
+    }
+    assert not groups["train"] & groups["val"]
+    assert not groups["train"] & groups["test"]
+    assert not groups["val"] & groups["test"]
+    assert sum(annots.dataset_sizes.values()) == 81
+    assert all(annots.dataset_sizes.values())
+    with pytest.raises(ValueError, match="not a column"):
+        annots.create_datasets(group_col="fake")
+
+
+def test_create_datasets_split_file(load_annots, tmp_path):
+    annots = load_annots
+    split_file = f"{tmp_path}/split.csv"
+    annots.create_datasets(0.5, 0.3, 0.2, random_state=1, split_file=split_file)
+    saved = pd.read_csv(split_file)
+    assert saved["frac_train"].eq(0.5).all()
+    assert saved["random_state"].eq(1).all()
+    assert saved["group_col"].isna().all()
+
+    # the split is loaded from the file if the parameters are the same
+    saved.loc[0, "split"] = "test" if saved.loc[0, "split"] != "test" else "train"
+    saved.to_csv(split_file, index=False)
+    annots.create_datasets(0.5, 0.3, 0.2, random_state=1, split_file=split_file)
+    splits = annots.splits.copy()
+    assert splits.iloc[0] == saved.loc[0, "split"]
+
+    # and recomputed (and saved) if they have changed
+    for kwargs in [
+        {"random_state": 2},
+        {"frac_train": 0.6, "frac_val": 0.2},
+        {"group_col": "parent_id"},
+    ]:
+        params = {"frac_train": 0.5, "frac_val": 0.3, "frac_test": 0.2}
+        params.update(kwargs)
+        annots.create_datasets(**params, split_file=split_file)
+        assert not annots.splits.equals(splits)
+        annots.create_datasets(0.5, 0.3, 0.2, random_state=1, split_file=split_file)
+        splits = annots.splits.copy()
+
+    # the file is replaced if the annotations change
+    annots.annotations = annots.annotations.iloc[1:]
+    annots.create_datasets(0.5, 0.3, 0.2, split_file=split_file)
+    assert len(pd.read_csv(split_file)) == 80
+
+
 def test_create_context_datasets_default_transforms(load_annots):
     annots = load_annots
     annots.create_datasets(
@@ -261,6 +472,25 @@ def test_create_dataloaders_custom_sampler(load_annots):
     assert dataloaders["train"].sampler == sampler
 
 
+def test_create_dataloaders_streaming_sampler(load_annots):
+    annots = load_annots
+    dataloaders = annots.create_dataloaders(sampler="streaming", seed=0)
+    sampler = dataloaders["train"].sampler
+    assert isinstance(sampler, ClassBalancedShardSampler)
+    assert len(list(sampler)) == len(annots.datasets["train"])
+
+
+def test_define_sampler_weights(load_annots):
+    annots = load_annots
+    annots.create_datasets()
+    sampler = annots._define_sampler(seed=0)
+    label_indices = annots.datasets["train"].patch_df["label_index"]
+    counts = label_indices.value_counts()
+    expected = 1 / label_indices.map(counts).to_numpy()
+    assert np.allclose(sampler.weights.numpy(), expected)
+    assert list(sampler) == list(annots._define_sampler(seed=0))
+
+
 def test_create_dataloaders_no_sampler(load_annots):
     annots = load_annots
     dataloaders = annots.create_dataloaders(batch_size=8, sampler=None, shuffle=True)
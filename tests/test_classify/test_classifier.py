@@ -12,7 +12,14 @@ import transformers
 from torchvision import models
 from transformers import AutoFeatureExtractor, AutoModelForImageClassification
 
-from mapreader import AnnotationsLoader, ClassifierContainer
+from mapreader import (
+    AnnotationsLoader,
+    ClassifierContainer,
+    NearestNeighbourIndex,
+    loader,
+)
+from mapreader.classify.cascade import pixel_stats_rule
+from mapreader.classify.dataloader_tuning import tune_dataloader
 from mapreader.classify.datasets import PatchDataset
 
 
@@ -45,6 +52,19 @@ def infer_inputs(sample_dir):
     return infer
 
 
+@pytest.fixture
+def train_inputs(sample_dir, tmp_path):
+    my_maps = loader(f"{sample_dir}/cropped_74488689.png")
+    my_maps.patchify_all(patch_size=3, path_save=f"{tmp_path}/patches/")
+    _, patch_df = my_maps.convert_images()
+    patch_df["label"] = ["no", "railspace"] * 4 + ["no"]
+    annots = AnnotationsLoader()
+    annots.load(patch_df)
+    annots.create_datasets(frac_train=0.5, frac_val=0.5, frac_test=0)
+    dataloaders = annots.create_dataloaders(batch_size=2)
+    return annots, dataloaders
+
+
 @pytest.fixture
 def load_classifier(sample_dir):
     classifier = ClassifierContainer(
@@ -324,7 +344,438 @@ def test_scheduler_errors(load_classifier):
         classifier.initialize_scheduler("a fake scheduler type")
 
 
-# dont test train here due to fake file paths
+# dont test train here due to fake file paths (use train_inputs instead)
+
+
+def test_train_mixed_precision_accumulation(train_inputs, tmp_path):
+    annots, dataloaders = train_inputs
+    classifier = ClassifierContainer(
+        "resnet18",
+        labels_map=annots.labels_map,
+        dataloaders=dataloaders,
+        weights=None,
+    )
+    classifier.add_loss_fn()
+    classifier.initialize_optimizer()
+    classifier.train(
+        num_epochs=2,
+        save_model_dir=f"{tmp_path}/models",
+        mixed_precision="bf16",
+        accumulation_steps=2,
+    )
+    assert len(classifier.metrics["epoch_loss_train"]) == 2
+    assert len(classifier.pred_conf) == 2 * len(annots.annotations)
+    with pytest.raises(ValueError, match="mixed_precision"):
+        classifier.train(num_epochs=1, save_model_dir=None, mixed_precision="fake")
+    with pytest.raises(ValueError, match="accumulation_steps"):
+        classifier.train(num_epochs=1, save_model_dir=None, accumulation_steps=0)
+
+
+def test_train_accumulation_partial_group(train_inputs):
+    annots, _ = train_inputs
+    # deterministic transforms and one patch per batch
+    dataloader = torch.utils.data.DataLoader(annots.datasets["val"], batch_size=1)
+    assert len(dataloader) % 3 != 0
+    model = torch.nn.Sequential(torch.nn.Flatten(), torch.nn.Linear(3 * 224 * 224, 2))
+    classifier = ClassifierContainer(
+        model, labels_map=annots.labels_map, dataloaders={"train": dataloader}
+    )
+    classifier.add_loss_fn()
+
+    # record the parameters and gradients at each optimizer step
+    steps = []
+
+    class RecordingSGD(torch.optim.SGD):
+        def step(self, closure=None):
+            steps.append(
+                [(p.detach().clone(), p.grad.clone()) for p in model.parameters()]
+            )
+            return super().step(closure)
+
+    classifier.add_optimizer(RecordingSGD(model.parameters(), lr=0.1))
+    classifier.train(
+        phases=["train"], num_epochs=1, save_model_dir=None, accumulation_steps=3
+    )
+    assert len(steps) == 2
+
+    # the last (partial) group's gradient is the mean over its batches
+    last_group = list(dataloader)[3:]
+    expected = torch.nn.Sequential(
+        torch.nn.Flatten(), torch.nn.Linear(3 * 224 * 224, 2)
+    )
+    with torch.no_grad():
+        for param, (value, _) in zip(expected.parameters(), steps[-1]):
+            param.copy_(value)
+    loss = sum(
+        torch.nn.functional.cross_entropy(expected(inputs[0]), label_indices)
+        for inputs, _, label_indices in last_group
+    ) / len(last_group)
+    loss.backward()
+    for param, (_, grad) in zip(expected.parameters(), steps[-1]):
+        assert torch.allclose(param.grad, grad, atol=1e-6)
+
+
+def test_save_load_checkpoint(train_inputs, tmp_path):
+    annots, dataloaders = train_inputs
+    classifier = ClassifierContainer(
+        "resnet18",
+        labels_map=annots.labels_map,
+        dataloaders=dataloaders,
+        weights=None,
+    )
+    classifier.add_loss_fn()
+    classifier.initialize_optimizer()
+    classifier.initialize_scheduler()
+    classifier.train(num_epochs=1, save_model_dir=None, tmp_file_save_freq=None)
+    classifier.save_checkpoint(f"{tmp_path}/checkpoint.pt")
+    with pytest.raises(FileExistsError):
+        classifier.save_checkpoint(f"{tmp_path}/checkpoint.pt")
+
+    classifier2 = ClassifierContainer(
+        "resnet18",
+        labels_map={k: "fake" for k in annots.labels_map},
+        dataloaders=dataloaders,
+        weights=None,
+    )
+    classifier2.initialize_optimizer()
+    classifier2.initialize_scheduler()
+    classifier2.load_checkpoint(f"{tmp_path}/checkpoint.pt", remove_after_load=True)
+    assert not os.path.exists(f"{tmp_path}/checkpoint.pt")
+    assert classifier2.labels_map == annots.labels_map
+    assert classifier2.last_epoch == classifier.last_epoch == 1
+    assert classifier2.metrics == classifier.metrics
+    for k, v in classifier.model.state_dict().items():
+        assert torch.equal(v, classifier2.model.state_dict()[k])
+    with pytest.raises(FileNotFoundError):
+        classifier2.load_checkpoint(f"{tmp_path}/checkpoint.pt")
+
+
+def test_sample_losses(train_inputs):
+    annots, dataloaders = train_inputs
+    classifier = ClassifierContainer(
+        models.resnet18(num_classes=2),
+        labels_map=annots.labels_map,
+        dataloaders=dataloaders,
+    )
+    classifier.add_loss_fn()
+    classifier.initialize_optimizer()
+    classifier.train(num_epochs=1, save_model_dir=None, tmp_file_save_freq=None)
+
+    # "train" is shuffled by its sampler, "val" is not
+    assert list(classifier.sample_losses) == ["val"]
+    val_losses = classifier.sample_losses["val"]
+    assert val_losses.index.equals(annots.datasets["val"].patch_df.index)
+    assert (val_losses >= 0).all()
+
+    train_losses = classifier.compute_sample_losses("train")
+    assert train_losses.index.equals(annots.datasets["train"].patch_df.index)
+    assert classifier.sample_losses["train"] is train_losses
+    assert classifier.compute_sample_losses("val").to_numpy() == pytest.approx(
+        val_losses.to_numpy(), abs=1e-4
+    )
+    with pytest.raises(KeyError, match="cannot be found"):
+        classifier.compute_sample_losses("fake")
+
+
+def test_train_timing_profile(train_inputs, tmp_path, capsys):
+    annots, dataloaders = train_inputs
+    classifier = ClassifierContainer(
+        "resnet18",
+        labels_map=annots.labels_map,
+        dataloaders=dataloaders,
+        weights=None,
+    )
+    classifier.add_loss_fn()
+    classifier.initialize_optimizer()
+    classifier.train(
+        num_epochs=2,
+        save_model_dir=None,
+        tmp_file_save_freq=None,
+        tensorboard_path=f"{tmp_path}/tboard",
+        profile_steps=2,
+        profile_dir=f"{tmp_path}/profile",
+    )
+    for phase in ["train", "val"]:
+        for section in ["data", "transfer", "forward", "metrics", "total"]:
+            assert len(classifier.metrics[f"epoch_time_{section}_{phase}"]) == 2
+            assert all(
+                t >= 0 for t in classifier.metrics[f"epoch_time_{section}_{phase}"]
+            )
+        assert all(classifier.metrics[f"epoch_samples_per_sec_{phase}"])
+    assert all(classifier.metrics["epoch_time_backward_train"])
+    assert classifier.metrics["epoch_time_backward_val"] == [0.0, 0.0]
+    assert os.path.isfile(f"{tmp_path}/profile/trace.json")
+    assert "Self CPU" in capsys.readouterr().out
+
+
+def test_dataloader_auto_tune(train_inputs):
+    annots, _ = train_inputs
+    dataloaders = annots.create_dataloaders(
+        auto_tune={"batch_sizes": [2, 4], "num_workers": [0, 1], "num_batches": 2}
+    )
+    assert dataloaders["train"].batch_size in [2, 4]
+    assert dataloaders["val"].batch_size == dataloaders["train"].batch_size
+    assert dataloaders["train"].num_workers in [0, 1]
+
+    classifier = ClassifierContainer(
+        "resnet18", labels_map=annots.labels_map, weights=None
+    )
+    classifier.model.train()
+    classifier.load_dataset(
+        annots.datasets["val"],
+        "infer",
+        auto_tune={"batch_sizes": [1, 3], "num_workers": [0], "num_batches": 2},
+    )
+    assert classifier.model.training  # mode is restored after tuning
+    assert classifier.dataloaders["infer"].batch_size in [1, 3]
+    assert classifier.dataloaders["infer"].num_workers == 0
+
+    settings, results = tune_dataloader(
+        annots.datasets["val"], batch_sizes=[1, 2], num_workers=[0], num_batches=1
+    )
+    assert set(settings) == {"batch_size", "num_workers", "pin_memory"}
+    assert len(results) == 2
+    assert (results["samples_per_sec"] > 0).all()
+    with pytest.raises(ValueError, match="No DataLoader configuration"):
+        tune_dataloader(
+            annots.datasets["val"],
+            batch_sizes=[2],
+            num_workers=[0],
+            memory_budget_mb=1e-6,
+        )
+
+
+def test_extract_features(train_inputs, tmp_path):
+    annots, dataloaders = train_inputs
+    classifier = ClassifierContainer(
+        "resnet18",
+        labels_map=annots.labels_map,
+        dataloaders=dataloaders,
+        weights=None,
+    )
+    classifier.freeze_layers(["*"])
+    classifier.unfreeze_layers(["fc.*"])
+    classifier.add_loss_fn()
+    classifier.initialize_optimizer()
+    backbone_weights = classifier.model.conv1.weight.detach().clone()
+    fc_weights = classifier.model.fc.weight.detach().clone()
+
+    feature_cache = classifier.extract_features(cache_dir=f"{tmp_path}/features")
+    assert classifier.feature_head_name == "fc"
+    assert len(feature_cache) == len(annots.annotations)
+    assert feature_cache.dim == 512
+    assert set(classifier.feature_dataloaders.keys()) == {"train", "val"}
+
+    classifier.train(
+        num_epochs=2,
+        save_model_dir=None,
+        tmp_file_save_freq=None,
+        use_cached_features=True,
+    )
+    assert len(classifier.metrics["epoch_loss_train"]) == 2
+    assert torch.equal(classifier.model.conv1.weight, backbone_weights)
+    assert not torch.equal(classifier.model.fc.weight, fc_weights)
+    assert isinstance(classifier.model.fc, torch.nn.Linear)
+
+    # head on cached features gives the same predictions as the full model
+    classifier.inference("val", use_cached_features=True)
+    cached_conf = classifier.pred_conf
+    classifier.inference("val")
+    assert np.allclose(cached_conf, classifier.pred_conf, atol=1e-4)
+
+    # re-running only extracts features for new patches
+    classifier.extract_features(cache_dir=f"{tmp_path}/features")
+    assert len(list(Path(f"{tmp_path}/features").glob("features_*.npy"))) == 2
+    with pytest.raises(ValueError, match="different settings"):
+        classifier.extract_features(
+            cache_dir=f"{tmp_path}/features", head_name="layer4.1.conv2"
+        )
+    with pytest.raises(KeyError, match="No cached features"):
+        classifier.inference("fake", use_cached_features=True)
+
+
+def test_embed_patches(sample_dir, tmp_path):
+    maps = loader(f"{sample_dir}/cropped_74488689.png")
+    maps.patchify_all(patch_size=3, path_save=f"{tmp_path}/patches")
+    classifier = ClassifierContainer(
+        "resnet18", labels_map={0: "no", 1: "railspace"}, weights=None
+    )
+    embeddings = classifier.embed_patches(
+        maps, cache_dir=f"{tmp_path}/embeddings", batch_size=4
+    )
+    assert len(embeddings) == 9
+    assert embeddings.dim == 512
+    assert len(classifier.dataloaders["embed"].dataset) == 9
+
+    index = NearestNeighbourIndex.from_feature_cache(embeddings)
+    patch_id = embeddings.patch_ids[0]
+    _, ids = index.search_by_id(patch_id, k=3)
+    assert len(ids) == 3
+    assert patch_id not in ids
+
+
+def test_calculate_add_metrics_new_classifier():
+    classifier = ClassifierContainer(
+        "resnet18", labels_map={0: "no", 1: "railspace"}, weights=None
+    )
+    y_true = np.ones(10)
+    np.random.seed(0)
+    y_pred = np.random.randint(0, 2, 10)
+    y_score = np.random.random_sample((10, 1))
+    classifier.calculate_add_metrics(y_true, y_pred, y_score, phase="pytest")
+    assert len(classifier.metrics) == 20
+    assert "epoch_fscore_0_pytest" in classifier.metrics
+    assert classifier.metrics["epoch_recall_micro_pytest"][0] == pytest.approx(
+        100 * (y_pred == 1).mean()
+    )
+
+
+def test_infer_tta_ensemble(inputs, sample_dir, tmp_path):
+    annots, _ = inputs
+    infer_df = pd.DataFrame(
+        {
+            "image_id": ["cropped_74488689.png"],
+            "image_path": [f"{sample_dir}/cropped_74488689.png"],
+        }
+    )
+    classifier = ClassifierContainer(
+        "resnet18", labels_map=annots.labels_map, weights=None
+    )
+    classifier.add_loss_fn()
+    classifier.load_dataset(PatchDataset(infer_df, transform="val"), set_name="infer")
+
+    classifier.inference("infer", tta=["hflip"])
+    img = classifier.dataloaders["infer"].dataset[0][0][0][None]
+    classifier.model.eval()
+    with torch.no_grad():
+        expected = (
+            torch.softmax(classifier.model(img), dim=1)
+            + torch.softmax(classifier.model(torch.flip(img, dims=[-1])), dim=1)
+        ) / 2
+    assert np.allclose(classifier.pred_conf, expected.numpy(), atol=1e-5)
+
+    # ensembling with identical weights gives the same result
+    classifier.inference("infer")
+    single_conf = classifier.pred_conf
+    classifier.save_checkpoint(f"{tmp_path}/checkpoint.pt")
+    classifier.inference(
+        "infer",
+        ensemble=[f"{tmp_path}/checkpoint.pt", classifier.model],
+    )
+    assert np.allclose(classifier.pred_conf, single_conf, atol=1e-5)
+
+    classifier.inference("infer", tta=True)
+    assert len(classifier.pred_conf) == 1
+    assert sum(classifier.pred_conf[0]) == pytest.approx(1)
+
+    with pytest.raises(ValueError, match="``tta`` must be"):
+        classifier.inference("infer", tta=["fake"])
+    classifier.load_dataset(PatchDataset(infer_df, transform="val"), set_name="train")
+    with pytest.raises(ValueError, match="only be used for inference"):
+        classifier.train(phases=["train", "infer"], tta=True)
+    with pytest.raises(FileNotFoundError):
+        classifier.inference("infer", ensemble=["fake.pkl"])
+
+
+def test_cascade_inference(sample_dir, tmp_path):
+    maps = loader(f"{sample_dir}/cropped_74488689.png")
+    maps.patchify_all(patch_size=3, path_save=f"{tmp_path}/patches")
+    maps.calc_pixel_stats()
+    _, patch_df = maps.convert_images()
+    labels_map = {0: "no", 1: "railspace"}
+    classifier = ClassifierContainer("resnet18", labels_map=labels_map, weights=None)
+    classifier.load_dataset(PatchDataset(patch_df, transform="val"), set_name="infer")
+
+    # rule decides patches with low std
+    std = patch_df["std_pixel"].to_numpy()
+    max_std = np.median(std)
+    rule = pixel_stats_rule(labels_map, "no", max_std=max_std)
+    stats = classifier.cascade_inference(rule, set_name="infer", threshold=0.9)
+    assert stats["n_first_stage"] == (std <= max_std).sum()
+    assert stats["n_first_stage"] + stats["n_second_stage"] == 9
+    assert np.array_equal(np.array(classifier.pred_stage) == 1, std <= max_std)
+    assert all(classifier.pred_label[i] == "no" for i in np.flatnonzero(std <= max_std))
+    assert "infer_cascade" not in classifier.dataloaders
+
+    classifier.save_predictions("infer", save_path=f"{tmp_path}/preds.csv")
+    preds = pd.read_csv(f"{tmp_path}/preds.csv", index_col=0)
+    assert list(preds["cascade_stage"]) == classifier.pred_stage
+    assert np.allclose(preds["conf"], np.array(classifier.pred_conf).max(axis=1))
+
+    # model as first stage, nothing is passed on with threshold=0
+    stats = classifier.cascade_inference(
+        models.resnet18(num_classes=2), set_name="infer", threshold=0
+    )
+    assert stats["n_second_stage"] == 0
+
+    with pytest.raises(ValueError, match="must be one of"):
+        pixel_stats_rule(labels_map, "fake")
+    with pytest.raises(ValueError, match="returned predictions of shape"):
+        classifier.cascade_inference(lambda df: np.ones((1, 2)), set_name="infer")
+
+
+def test_quantize_prune_benchmark(train_inputs):
+    annots, dataloaders = train_inputs
+    classifier = ClassifierContainer(
+        models.resnet18(num_classes=2),
+        labels_map=annots.labels_map,
+        dataloaders=dataloaders,
+    )
+    dynamic = classifier.quantize_model("dynamic")
+    static = classifier.quantize_model("static", num_calibration_batches=2)
+    pruned = classifier.prune_model(amount=0.5)
+    assert isinstance(classifier.model.fc, torch.nn.Linear)
+
+    # inner block channels are removed, residual outputs are kept
+    block = pruned.layer1[0]
+    assert block.conv1.out_channels == block.bn1.num_features == 32
+    assert block.conv2.in_channels == 32
+    assert block.conv2.out_channels == 64
+    assert pruned.conv1.out_channels == 64
+    assert torch.equal(pruned.fc.weight, classifier.model.fc.weight)
+    n_params = sum(p.numel() for p in pruned.parameters())
+    assert n_params < sum(p.numel() for p in classifier.model.parameters())
+    pruned.eval()
+    assert pruned(torch.rand(1, 3, 64, 64)).shape == (1, 2)
+
+    num_threads = torch.get_num_threads()
+    report = classifier.benchmark_models(
+        {"dynamic": dynamic, "static": static, "pruned": pruned},
+        set_name="val",
+        num_threads=1,
+    )
+    assert torch.get_num_threads() == num_threads
+    assert list(report.index) == ["fp32", "dynamic", "static", "pruned"]
+    assert report.loc["fp32", "speedup"] == pytest.approx(1)
+    assert report.loc["static", "size_mb"] < report.loc["fp32", "size_mb"] / 2
+    assert (report["accuracy"].between(0, 100)).all()
+
+    with pytest.raises(ValueError, match="method"):
+        classifier.quantize_model("fake")
+
+
+def test_infer_fused_transform(inputs, sample_dir):
+    annots, _ = inputs
+    infer_df = pd.DataFrame(
+        {
+            "image_id": ["cropped_74488689.png"],
+            "image_path": [f"{sample_dir}/cropped_74488689.png"],
+        }
+    )
+    classifier = ClassifierContainer(
+        "resnet18", labels_map=annots.labels_map, weights=None
+    )
+    classifier.add_loss_fn()
+    classifier.load_dataset(PatchDataset(infer_df, transform="val"), set_name="infer")
+    classifier.inference("infer")
+    expected_conf = classifier.pred_conf
+    classifier.load_dataset(
+        PatchDataset(infer_df.copy(), transform="val", fused_transform=True),
+        set_name="infer_fused",
+    )
+    classifier.inference("infer_fused")
+    assert np.allclose(classifier.pred_conf, expected_conf, atol=0.05)
+
 
 # test inference w/ various models and model-types
 
@@ -4,7 +4,9 @@ import os
 import pathlib
 import shutil
 
+import numpy as np
 import pytest
+import torch
 from PIL import Image
 from torch.utils.data import DataLoader
 
@@ -329,3 +331,109 @@ def test_get_context_id(load_patch_df):
     img = patch_dataset.get_context_id(patch_df.index[0], return_image=True)
     assert isinstance(img, Image.Image)
     assert img.size == (9, 9)
+
+
+def test_get_context_id_neighbours(load_patch_df, sample_dir):
+    patch_df, tmp_path = load_patch_df
+    patch_dataset = PatchContextDataset(
+        patch_df=patch_df,
+        total_df=patch_df,
+        transform="test",
+        create_context=True,
+    )
+    # context of the central patch is the whole (9x9) parent image
+    central_id = patch_df[patch_df["pixel_bounds"] == (3, 3, 6, 6)].index[0]
+    img = patch_dataset.get_context_id(central_id, return_image=True)
+    parent = Image.open(f"{sample_dir}/cropped_74488689.png").convert("RGB")
+    assert (np.array(img) == np.array(parent)).all()
+    # corner patches are placed in the centre of the context image
+    corner_id = patch_df[patch_df["pixel_bounds"] == (0, 0, 3, 3)].index[0]
+    img = patch_dataset.get_context_id(corner_id, return_image=True)
+    assert (np.array(img)[3:6, 3:6] == np.array(parent)[0:3, 0:3]).all()
+    assert (np.array(img)[3:6, 6:] == np.array(parent)[0:3, 3:6]).all()
+
+
+def test_get_context_id_missing(load_patch_df):
+    patch_df, tmp_path = load_patch_df
+    patch_dataset = PatchContextDataset(
+        patch_df=patch_df,
+        total_df=patch_df,
+        transform="test",
+        create_context=True,
+    )
+    with pytest.raises(ValueError, match="not found"):
+        patch_dataset.get_context_id("fake_id", return_image=True)
+
+
+def test_save_context_from_parent(load_patch_df, sample_dir):
+    patch_df, tmp_path = load_patch_df
+    patch_dataset = PatchContextDataset(
+        patch_df=patch_df,
+        total_df=patch_df,
+        transform="test",
+        create_context=True,
+        context_dir=f"{tmp_path}/context_patches/",
+        parent_path=f"{sample_dir}",
+    )
+    patch_dataset.save_context(use_parhugin=False)
+    assert len(list(tmp_path.glob("context_patches/*"))) == 9
+    for id, patch_path in patch_df["image_path"].items():
+        context_path = f"{tmp_path}/context_patches/{os.path.basename(patch_path)}"
+        expected = patch_dataset.get_context_id(id, return_image=True)
+        assert (np.array(Image.open(context_path)) == np.array(expected)).all()
+
+
+def test_save_context_resume(load_patch_df):
+    patch_df, tmp_path = load_patch_df
+    patch_dataset = PatchContextDataset(
+        patch_df=patch_df,
+        total_df=patch_df,
+        transform="test",
+        create_context=True,
+        context_dir=f"{tmp_path}/context_patches/",
+    )
+    patch_dataset.get_context_id(patch_df.index[0], save_context=True)
+    existing = (
+        f"{tmp_path}/context_patches/{os.path.basename(patch_df.iloc[0]['image_path'])}"
+    )
+    mtime = os.path.getmtime(existing)
+    patch_dataset.save_context(use_parhugin=False)
+    assert len(list(tmp_path.glob("context_patches/*"))) == 9
+    assert os.path.getmtime(existing) == mtime
+
+
+# fused transforms
+
+
+def test_patch_dataset_fused_transform(load_patch_df):
+    patch_df, tmp_path = load_patch_df
+    patch_dataset = PatchDataset(patch_df, transform="val")
+    fused_dataset = PatchDataset(patch_df, transform="val", fused_transform=True)
+    assert patch_dataset.batch_transform is None
+    img = fused_dataset[0][0][0]
+    assert img.dtype == torch.uint8
+    assert img.shape == (3, 224, 224)
+    batch = fused_dataset.batch_transform(img.unsqueeze(0))
+    assert batch.dtype == torch.float32
+    expected = patch_dataset[0][0][0]
+    assert torch.allclose(batch[0], expected, atol=0.1)
+
+
+def test_patch_context_dataset_fused_transform(load_patch_df):
+    patch_df, tmp_path = load_patch_df
+    patch_dataset = PatchContextDataset(
+        patch_df,
+        total_df=patch_df,
+        transform="train",
+        create_context=True,
+        fused_transform=True,
+    )
+    img = patch_dataset[0][0][0]
+    assert img.dtype == torch.uint8
+    assert img.shape == (3, 224, 224)
+
+
+def test_patch_dataset_fused_transform_error(load_patch_df):
+    patch_df, tmp_path = load_patch_df
+    with pytest.raises(ValueError, match="default transforms"):
+        PatchDataset(patch_df, transform=lambda x: x, fused_transform=True)
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import pickle
+
+import numpy as np
+import pytest
+
+from mapreader.classify.feature_cache import FeatureCache
+
+
+def test_feature_cache(tmp_path):
+    cache = FeatureCache(tmp_path)
+    assert len(cache) == 0
+    assert cache.dim is None
+
+    features = np.arange(12, dtype=np.float32).reshape(3, 4)
+    cache.add(["a", "b", "c"], [features[:2], features[2:]])  # batches
+    assert len(cache) == 3
+    assert cache.dim == 4
+    assert "b" in cache
+    assert cache.missing(["a", "d"]) == ["d"]
+    assert np.array_equal(cache.get_one("b"), features[1])
+    assert np.array_equal(cache.get(["c", "a"]), features[[2, 0]])
+
+    cache.add(["d"], np.ones((1, 4)))
+    assert len(cache) == 4
+
+    # reload from disk
+    cache = FeatureCache(tmp_path)
+    assert len(cache) == 4
+    assert np.array_equal(cache.get(["a", "d"]), [features[0], np.ones(4)])
+    cache = pickle.loads(pickle.dumps(cache))
+    assert np.array_equal(cache.get_one("c"), features[2])
+
+
+def test_feature_cache_errors(tmp_path):
+    cache = FeatureCache(tmp_path)
+    cache.add(["a"], np.zeros((1, 4)))
+    with pytest.raises(ValueError, match="expected 4"):
+        cache.add(["b"], np.zeros((1, 3)))
+    with pytest.raises(ValueError, match="feature vectors"):
+        cache.add(["b", "c"], np.zeros((1, 4)))
+    with pytest.raises(KeyError):
+        cache.get_one("fake")
+
+
+def test_feature_cache_metadata(tmp_path):
+    cache = FeatureCache(tmp_path)
+    cache.check_metadata({"model": "ResNet", "head": "fc"})
+    cache.add(["a"], np.zeros((1, 4)))
+    cache.check_metadata({"model": "ResNet", "head": "fc"})
+    with pytest.raises(ValueError, match="different settings"):
+        cache.check_metadata({"model": "VGG", "head": "classifier.6"})
+    cache.check_metadata({"model": "VGG", "head": "classifier.6"}, overwrite=True)
+    assert len(cache) == 0
+    assert FeatureCache(tmp_path).metadata["model"] == "VGG"
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+import torch
+from sklearn.metrics import precision_recall_fscore_support, roc_auc_score
+
+from mapreader.classify.metrics import MetricsAccumulator
+
+
+def _accumulate(y_true, y_pred, y_score, batch_size=7):
+    accumulator = MetricsAccumulator()
+    for start in range(0, len(y_true), batch_size):
+        accumulator.update(
+            torch.tensor(y_true[start : start + batch_size]),
+            torch.tensor(y_pred[start : start + batch_size]),
+            torch.tensor(y_score[start : start + batch_size]),
+        )
+    return accumulator.compute()
+
+
+@pytest.mark.parametrize("num_classes", [2, 4])
+def test_matches_sklearn(num_classes):
+    rng = np.random.default_rng(0)
+    y_true = rng.integers(0, num_classes, 100)
+    y_score = rng.random((100, num_classes)).astype(np.float32)
+    y_score /= y_score.sum(axis=1, keepdims=True)
+    y_pred = y_score.argmax(axis=1)
+
+    results = _accumulate(y_true, y_pred, y_score)
+    for avrg in ["micro", "macro", "weighted"]:
+        expected = precision_recall_fscore_support(y_true, y_pred, average=avrg)
+        assert np.allclose(results[avrg][:3], expected[:3])
+        assert results[avrg][3] is None
+
+    expected = precision_recall_fscore_support(y_true, y_pred, average=None)
+    assert all(
+        np.allclose(res, exp) for res, exp in zip(results["per_class"][1:], expected)
+    )
+
+    if num_classes == 2:
+        expected_auc = roc_auc_score(y_true, y_score[:, 1])
+        assert set(results["rocauc"].keys()) == {"micro", "macro", "weighted"}
+    else:
+        expected_auc = roc_auc_score(
+            y_true, y_score, average="macro", multi_class="ovr"
+        )
+        assert set(results["rocauc"].keys()) == {"macro", "weighted"}
+    assert results["rocauc"]["macro"] == pytest.approx(expected_auc, abs=1e-2)
+
+
+def test_missing_labels():
+    # label 2 never seen, label 3 only predicted
+    y_true = np.array([0, 0, 1, 1, 1])
+    y_pred = np.array([0, 3, 1, 1, 0])
+    y_score = np.eye(4, dtype=np.float32)[y_pred]
+    results = _accumulate(y_true, y_pred, y_score)
+
+    assert list(results["per_class"][0]) == [0, 1, 3]
+    expected = precision_recall_fscore_support(
+        y_true, y_pred, average="macro", zero_division=0
+    )
+    assert np.allclose(results["macro"][:3], expected[:3])
+    assert results["rocauc"] == {}
+
+
+def test_ignores_unlabelled():
+    accumulator = MetricsAccumulator(roc_auc_bins=None)
+    accumulator.update(
+        torch.tensor([0, 1, -1]), torch.tensor([0, 1, 1]), torch.rand(3, 2)
+    )
+    assert accumulator.confusion_matrix.sum() == 2
+    assert accumulator.compute()["rocauc"] == {}
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from mapreader import NearestNeighbourIndex
+from mapreader.classify.feature_cache import FeatureCache
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(1)
+    return rng.normal(size=(200, 8)).astype(np.float32)
+
+
+@pytest.fixture
+def patch_ids():
+    return [f"patch-{i}.png" for i in range(200)]
+
+
+@pytest.mark.parametrize("metric", ["cosine", "l2"])
+def test_flat_search(vectors, patch_ids, metric):
+    index = NearestNeighbourIndex(metric=metric)
+    index.build(patch_ids, vectors)
+    assert len(index) == 200
+
+    distances, ids = index.search(vectors[:3], k=5)
+    assert distances.shape == ids.shape == (3, 5)
+    assert list(ids[:, 0]) == patch_ids[:3]
+    assert np.allclose(distances[:, 0], 0, atol=1e-4)
+    assert np.all(np.diff(distances, axis=1) >= 0)
+
+    # brute force check
+    if metric == "l2":
+        expected = ((vectors - vectors[10]) ** 2).sum(axis=1)
+    else:
+        normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        expected = 1 - normed @ normed[10]
+    distances, ids = index.search_by_id("patch-10.png", k=4)
+    assert list(ids) == [patch_ids[i] for i in np.argsort(expected)[1:5]]
+    assert np.allclose(distances, np.sort(expected)[1:5], atol=1e-4)
+
+
+def test_ivf_search(vectors, patch_ids):
+    flat = NearestNeighbourIndex()
+    flat.build(patch_ids, vectors)
+    ivf = NearestNeighbourIndex(n_lists=4, n_probe=4)
+    ivf.build(patch_ids, vectors)
+    # searching all lists is exact
+    assert np.array_equal(
+        ivf.search(vectors[:5], k=5)[1], flat.search(vectors[:5], k=5)[1]
+    )
+    distances, ids = ivf.search(vectors[:5], k=5, n_probe=1)
+    assert list(ids[:, 0]) == patch_ids[:5]
+
+
+def test_save_load(vectors, patch_ids, tmp_path):
+    index = NearestNeighbourIndex(n_lists=4)
+    index.build(patch_ids, vectors)
+    index.save(f"{tmp_path}/index.npz")
+    loaded = NearestNeighbourIndex.load(f"{tmp_path}/index.npz")
+    assert loaded.n_lists == 4
+    assert np.array_equal(
+        loaded.search(vectors[:5], k=5)[1], index.search(vectors[:5], k=5)[1]
+    )
+
+    # integer patch IDs keep their type
+    index = NearestNeighbourIndex()
+    index.build(list(range(200)), vectors)
+    index.save(f"{tmp_path}/index_int.npz")
+    loaded = NearestNeighbourIndex.load(f"{tmp_path}/index_int.npz")
+    distances, ids = loaded.search_by_id(10, k=3)
+    assert list(ids) == list(index.search_by_id(10, k=3)[1])
+    assert isinstance(ids[0], int)
+
+
+def test_from_feature_cache(vectors, patch_ids, tmp_path):
+    cache = FeatureCache(tmp_path)
+    cache.add(patch_ids[:100], vectors[:100])
+    cache.add(patch_ids[100:], vectors[100:])
+    index = NearestNeighbourIndex.from_feature_cache(cache, metric="l2")
+    assert len(index) == 200
+    assert index.search(vectors[150], k=1)[1][0, 0] == "patch-150.png"
+
+
+def test_errors(vectors, patch_ids):
+    with pytest.raises(ValueError, match="metric"):
+        NearestNeighbourIndex(metric="fake")
+    index = NearestNeighbourIndex()
+    with pytest.raises(ValueError, match="empty"):
+        index.search(vectors[0])
+    with pytest.raises(ValueError, match="one row per patch ID"):
+        index.build(patch_ids[:10], vectors)
+    index.build(patch_ids, vectors)
+    with pytest.raises(KeyError):
+        index.search_by_id("fake")
+    distances, ids = index.search(vectors[0], k=300)
+    assert ids[0, -1] is None and np.isinf(distances[0, -1])
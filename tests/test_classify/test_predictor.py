@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from torchvision import models
+
+from mapreader import ClassifierContainer
+from mapreader.classify.datasets import PatchDataset
+from mapreader.classify.predictor import ExportedPredictor
+
+
+@pytest.fixture
+def sample_dir():
+    return Path(__file__).resolve().parent.parent / "sample_files"
+
+
+@pytest.fixture
+def classifier(sample_dir):
+    infer_df = pd.DataFrame(
+        {
+            "image_id": ["cropped_74488689.png", "cropped_L.png"],
+            "image_path": [
+                f"{sample_dir}/cropped_74488689.png",
+                f"{sample_dir}/cropped_L.png",
+            ],
+        }
+    )
+    classifier = ClassifierContainer(
+        models.resnet18(num_classes=2), labels_map={0: "no", 1: "railspace"}
+    )
+    classifier.load_dataset(PatchDataset(infer_df, transform="val"), set_name="infer")
+    classifier.inference("infer")
+    return classifier
+
+
+@pytest.mark.parametrize(
+    "export_format,quantize,atol",
+    [
+        ("torchscript", False, 1e-5),
+        ("torchscript", True, 0.05),
+        ("onnx", False, 1e-4),
+        ("onnx", True, 0.05),
+    ],
+)
+def test_export_predict(classifier, tmp_path, export_format, quantize, atol):
+    if export_format == "onnx":
+        pytest.importorskip("onnx")
+        pytest.importorskip("onnxruntime")
+
+    save_path = classifier.export_model(
+        f"{tmp_path}/model.{export_format}",
+        export_format=export_format,
+        quantize=quantize,
+    )
+    predictor = ExportedPredictor(save_path)
+    assert predictor.labels_map == classifier.labels_map
+    assert predictor.num_inputs == 1
+
+    dataset = classifier.dataloaders["infer"].dataset
+    patch_df = predictor.predict(dataset, batch_size=1)  # dynamic batch size
+    assert np.allclose(predictor.pred_conf, classifier.pred_conf, atol=atol)
+    assert list(patch_df.columns[-3:]) == ["predicted_label", "pred", "conf"]
+    assert "conf" not in dataset.patch_df.columns
+
+    predictor.save_predictions(dataset, f"{tmp_path}/preds.csv")
+    preds = pd.read_csv(f"{tmp_path}/preds.csv", index_col=0)
+    assert list(preds["pred"]) == predictor.pred_label_indices
+
+
+def test_export_errors(classifier, tmp_path):
+    with pytest.raises(ValueError, match="export_format"):
+        classifier.export_model(f"{tmp_path}/model.pt", export_format="fake")
+    with pytest.raises(FileNotFoundError):
+        ExportedPredictor(f"{tmp_path}/fake.pt")
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from mapreader.classify.samplers import ClassBalancedShardSampler
+
+
+@pytest.fixture
+def label_indices():
+    # imbalanced: 90 of label 0, 10 of label 2 (no label 1)
+    return np.array([0] * 90 + [2] * 10)
+
+
+def test_balanced(label_indices):
+    sampler = ClassBalancedShardSampler(label_indices, shard_size=7, buffer_size=5)
+    indices = list(sampler)
+    assert len(indices) == len(sampler) == 100
+    counts = np.bincount(label_indices[indices], minlength=3)
+    assert counts.tolist() == [50, 0, 50]
+
+
+def test_deterministic(label_indices):
+    sampler = ClassBalancedShardSampler(label_indices, shard_size=7, seed=1)
+    epoch_0 = list(sampler)
+    epoch_1 = list(sampler)
+    assert epoch_0 != epoch_1
+    sampler.set_epoch(0)
+    assert list(sampler) == epoch_0
+    sampler2 = ClassBalancedShardSampler(label_indices, shard_size=7, seed=1)
+    assert list(sampler2) == epoch_0
+
+
+def test_shards(label_indices):
+    shard_ids = np.tile(["a", "b", "c", "d"], 25)
+    sampler = ClassBalancedShardSampler(
+        label_indices, shard_ids=shard_ids, buffer_size=1, num_samples=40
+    )
+    indices = list(sampler)
+    assert len(indices) == 40
+    # with a buffer of 1, each shard is read in one go
+    shards = shard_ids[indices]
+    changes = (shards[1:] != shards[:-1]).sum()
+    assert changes == len(set(shards)) - 1
+
+
+def test_errors(label_indices):
+    with pytest.raises(ValueError, match="same length"):
+        ClassBalancedShardSampler(label_indices, shard_ids=[0, 1])
+    with pytest.raises(ValueError, match="negative"):
+        ClassBalancedShardSampler([-1, 0, 1])
+    with pytest.raises(ValueError, match="buffer_size"):
+        ClassBalancedShardSampler(label_indices, buffer_size=0)
@@ -14,7 +14,11 @@ from mapreader.utils.load_frames import (
     get_load_function,
     load_from_csv,
     load_from_excel,
+    load_from_feather,
     load_from_geojson,
+    load_from_parquet,
+    save_to_feather,
+    save_to_parquet,
 )
 
 
@@ -193,14 +197,87 @@ def test_load_from_geojson(init_dataframes, tmp_path):
     )  # should be shapely Polygon (always)
 
 
-def test_get_load_function(sample_dir):
+def test_get_load_function(sample_dir, tmp_path):
     assert (
         get_load_function(f"{sample_dir}/post_processing_patch_df.csv") == load_from_csv
     )
     assert get_load_function(f"{sample_dir}/ts_downloaded_maps.tsv") == load_from_csv
     assert get_load_function(f"{sample_dir}/ts_downloaded_maps.xlsx") == load_from_excel
     assert get_load_function(f"{sample_dir}/land_annots.geojson") == load_from_geojson
+    for fname in ["patch_df.parquet", "patch_df.geoparquet"]:
+        (tmp_path / fname).touch()
+        assert get_load_function(tmp_path / fname) == load_from_parquet
+    for fname in ["patch_df.arrow", "patch_df.feather"]:
+        (tmp_path / fname).touch()
+        assert get_load_function(tmp_path / fname) == load_from_feather
     with pytest.raises(ValueError):
         get_load_function(f"{sample_dir}/cropped_geo.tif")
     with pytest.raises(FileNotFoundError):
         get_load_function(f"{sample_dir}/non_existent_file.csv")
+
+
+def test_eval_dataframe_int_tuples():
+    df = pd.DataFrame(
+        {
+            "pixel_bounds": ["(0, 0, 10, 10)", "(-5, 10,20,  30)"],
+            "ragged": ["(1, 2)", "(1, 2, 3)"],
+            "one": ["(1)", "(2,)"],
+            "missing": ["(1, 2)", None],
+            "label": ["a", "b"],
+        }
+    )
+    df = eval_dataframe(df)
+    assert df["pixel_bounds"].tolist() == [(0, 0, 10, 10), (-5, 10, 20, 30)]
+    assert isinstance(df["pixel_bounds"].iloc[0][0], int)
+    assert df["ragged"].tolist() == [(1, 2), (1, 2, 3)]
+    assert df["one"].tolist() == [1, (2,)]
+    assert df["missing"].tolist() == ["(1, 2)", None]  # not evaluated
+    assert df["label"].tolist() == ["a", "b"]
+
+
+@pytest.mark.parametrize(
+    "save_func,load_func,ext",
+    [
+        (save_to_parquet, load_from_parquet, "parquet"),
+        (save_to_feather, load_from_feather, "arrow"),
+    ],
+)
+def test_save_load_arrow(init_dataframes, tmp_path, save_func, load_func, ext):
+    pytest.importorskip("pyarrow")
+    _, patch_df = init_dataframes
+    patch_df["label"] = "a"
+
+    # geo df
+    save_func(patch_df, f"{tmp_path}/patch_df.{ext}", categorical=["label"])
+    df = load_func(f"{tmp_path}/patch_df.{ext}")
+    assert isinstance(df, gpd.GeoDataFrame)
+    assert df.index.name == "image_id"
+    assert df.index.tolist() == patch_df.index.tolist()
+    assert isinstance(df.iloc[0]["geometry"], Polygon)
+    assert df["pixel_bounds"].tolist() == patch_df["pixel_bounds"].tolist()
+    assert df["label"].dtype == object
+
+    # non-geo df
+    save_func(
+        pd.DataFrame(patch_df.drop(columns="geometry")), f"{tmp_path}/no_geo.{ext}"
+    )
+    df = load_func(f"{tmp_path}/no_geo.{ext}")
+    assert not isinstance(df, gpd.GeoDataFrame)
+    assert isinstance(df.iloc[0]["pixel_bounds"], tuple)
+    assert df.index.tolist() == patch_df.index.tolist()
+
+    # a RangeIndex is kept, even with an "image_id" column
+    range_df = pd.DataFrame(
+        {"image_id": ["a.png", "b.png"], "label": ["x", "y"]}, index=[0, 1]
+    )
+    save_func(range_df, pathlib.Path(f"{tmp_path}/range.{ext}"))
+    df = load_func(f"{tmp_path}/range.{ext}")
+    assert df.index.tolist() == [0, 1]
+    assert df["image_id"].tolist() == ["a.png", "b.png"]
+
+    # unnamed indexes are kept
+    save_func(range_df.set_index("label").rename_axis(None), f"{tmp_path}/x.{ext}")
+    df = load_func(f"{tmp_path}/x.{ext}")
+    assert df.index.name is None
+    assert df.index.tolist() == ["x", "y"]
+    assert df.columns.tolist() == ["image_id"]
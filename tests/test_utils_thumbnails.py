@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import os
+import pathlib
+
+import pytest
+from PIL import Image
+
+from mapreader.utils.thumbnails import (
+    ThumbnailCache,
+    get_thumbnail_cache,
+    set_thumbnail_cache,
+)
+
+
+@pytest.fixture
+def image_paths(tmp_path):
+    paths = []
+    for i in range(4):
+        path = f"{tmp_path}/image_{i}.png"
+        Image.new("RGB", (100, 50), color=(i * 50, 0, 0)).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_get(image_paths):
+    cache = ThumbnailCache()
+    thumb = cache.get(image_paths[0], size=20)
+    assert thumb.size == (20, 10)
+    assert thumb.getpixel((0, 0)) == (0, 0, 0)
+    assert cache.misses == 1
+    cache.get(image_paths[0], size=20)
+    assert cache.hits == 1
+    assert len(cache) == 1
+
+    # smaller images are not enlarged unless upscale=True
+    assert cache.get(image_paths[0], size=200, upscale=True).size == (200, 100)
+    assert len(cache) == 2
+
+    # images which are not resized are read from the file, not cached
+    for _ in range(2):
+        assert cache.get(image_paths[0], size=200).size == (100, 50)
+        assert cache.get(image_paths[0]).size == (100, 50)
+    assert len(cache) == 2
+    assert cache._full_size == {cache._key(image_paths[0], 200, False)}
+    assert cache.get_bytes(image_paths[0], size=200)  # still cached for HTTP
+    assert len(cache) == 3
+
+
+def test_eviction_and_spill(image_paths, tmp_path):
+    sizes = [len(ThumbnailCache()._encode(path, 20, False)) for path in image_paths]
+    max_bytes = sizes[-1] + sizes[-2]  # room for the last two thumbnails
+    cache = ThumbnailCache(max_bytes=max_bytes, cache_dir=f"{tmp_path}/cache")
+    for path in image_paths:
+        cache.get(path, size=20)
+    assert len(cache) == 2
+    assert cache.nbytes == max_bytes
+    assert len(os.listdir(f"{tmp_path}/cache")) == 2
+    assert not any(f.endswith(".tmp") for f in os.listdir(f"{tmp_path}/cache"))
+
+    # evicted thumbnail reloaded from disk
+    thumb = cache.get(image_paths[0], size=20)
+    assert cache.misses == 4
+    assert cache.hits == 1
+    assert thumb.getpixel((0, 0)) == (0, 0, 0)
+
+
+def test_prewarm_jpeg(image_paths):
+    cache = ThumbnailCache(image_format="jpeg")
+    futures = cache.prewarm(image_paths + ["fake.png"], size=20)
+    for future in futures[:-1]:
+        future.result()
+    with pytest.raises(FileNotFoundError):
+        futures[-1].result()
+    assert len(cache) == 4
+    assert cache.get(image_paths[1], size=20).format == "JPEG"
+    assert cache.hits == 1
+
+    executor = cache._executor
+    cache.close()
+    assert executor._shutdown
+    assert cache._executor is None
+    cache.prewarm(image_paths[:1], size=20)[0].result()
+    assert cache.hits == 2
+
+
+def test_default_cache():
+    default_cache = get_thumbnail_cache()
+    assert get_thumbnail_cache() is default_cache
+    cache = ThumbnailCache(max_bytes=1024)
+    set_thumbnail_cache(cache)
+    assert get_thumbnail_cache() is cache
+    set_thumbnail_cache(default_cache)
+
+
+def test_errors():
+    with pytest.raises(ValueError, match="image_format"):
+        ThumbnailCache(image_format="tif")
+    with pytest.raises(FileNotFoundError):
+        ThumbnailCache().get(pathlib.Path("fake.png"))
+
+
+def test_prewarm_counters(image_paths):
+    cache = ThumbnailCache(max_workers=8)
+    for future in cache.prewarm(image_paths * 50, size=20):
+        future.result()
+    assert cache.hits + cache.misses == 200
+    assert len(cache) == 4
+    cache.close()